@@ -22,63 +22,69 @@ import re
 import sys
 import time
 import settings
+import vm_mgmt_catalog
+import vm_mgmt_guest
+import vm_mgmt_log
+import vm_mgmt_properties
+import vm_mgmt_readiness
+import vm_mgmt_registry
+import vm_mgmt_session
+import vm_mgmt_spec
+import vm_mgmt_tasks
+import vm_mgmt_trace
+import vm_mgmt_transfer
+import vm_mgmt_workers
 from optparse import OptionParser
-from pysphere import VIServer, VIProperty
-from pysphere.resources import VimService_services as VI
-from pysphere.vi_task import VITask
-import logging
-import logging.handlers
+from pysphere import VIProperty
+from pysphere.vi_mor import MORTypes
+from pysphere.vi_virtual_machine import VIVirtualMachine, ToolsStatus
 
-# Reference to logging modules.
+# Reference to the logger.
 logger = None
-handler = None
-
-logging_levels = {
-    'debug': logging.DEBUG,
-    'info': logging.INFO,
-    'warning': logging.WARNING,
-    'error': logging.ERROR,
-    'critical': logging.CRITICAL
-}
 
 
 def setup_logger():
-    global logger, handler
-    # Setup logging.
-    logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s',
-                        datefmt='%Y-%m-%d %H:%M:%S')
-    logger = logging.getLogger('vm_mgmt_lib')
-    logger.setLevel(logging_levels.get(settings.LOG_LEVEL))
-
-    # Add the log message handler to the logger (1 MB per file and upto 10
-    # files)
-    handler = logging.handlers.RotatingFileHandler(
-        settings.LOG_FILE, maxBytes=1048576, backupCount=10)
-    handler.setFormatter(logging.Formatter(
-        fmt='%(asctime)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S'))
-    logger.addHandler(handler)
-
-
-def log(level='debug', msg=""):
     global logger
-    logger.log(logging_levels.get(level), msg)
+    # Queued to a writer thread; safe with many instances on one LOG_FILE.
+    logger = vm_mgmt_log.setup()
+
+
+def log(level='debug', msg="", progress=None):
+    # Messages with a 'progress' key are coalesced (one per
+    # LOG_PROGRESS_INTERVAL seconds per key).
+    global logger
+    if progress is None:
+        logger.log(vm_mgmt_log.LEVELS.get(level), msg)
+    else:
+        logger.log(vm_mgmt_log.LEVELS.get(level), msg, extra={"progress": progress})
 
 
 def options():
-    parser = OptionParser()
-    parser.add_option("--login", dest="login", choices=settings.GUEST_LOGIN_INFO.keys(
-    ), help="Product type of the VM. This has some defaults (login username and password) which can be overridden with the other options. Supported choices: " + str(settings.GUEST_LOGIN_INFO.keys()))
+    parser = OptionParser(option_class=vm_mgmt_catalog.Option)
+    parser.add_option("--login", dest="login", type="key", mapping=settings.GUEST_LOGIN_INFO, help="Product type of the VM. This has some defaults (login username and password) which can be overridden with the other options. " + vm_mgmt_catalog.choices_help(settings.GUEST_LOGIN_INFO))
     parser.add_option(
-        "--vcenter", dest="vcenter", type="choice", choices=settings.VCENTER_SERVERS.keys(), help="Choose a vCenter configuration. Supported choices: " + str(settings.VCENTER_SERVERS.keys()))
+        "--vcenter", dest="vcenter", type="key", mapping=settings.VCENTER_SERVERS, help="Choose a vCenter configuration. " + vm_mgmt_catalog.choices_help(settings.VCENTER_SERVERS))
     parser.add_option("--name", dest="name", help="Name of the VM.")
     parser.add_option("--guest_login_username", dest="username",
                       help="Username to be used to login to the Guest.")
     parser.add_option(
         "--guest_login_password", dest="password", help="Password for the username that is used to login to the Guest.")
     parser.add_option("--get_ip", action="store_true", dest="fetch_ip")
+    parser.add_option("--expected-install-time", dest="expected_install_time", type="int", default=1200,
+                      help="Expected duration of the OS installation (in seconds). The guest is probed most often around this time. Default=1200.")
+    parser.add_option("--deadline", dest="deadline", type="int", default=3600,
+                      help="Give up if the OS installation has not completed after this many seconds. Default=3600.")
+    parser.add_option("--min-probe-interval", dest="min_probe_interval", type="int", default=5,
+                      help="Minimum time between two probes of the guest (in seconds). Around --expected-install-time probes are also at least 5%% of it apart. Default=5.")
+    parser.add_option("--max-probe-interval", dest="max_probe_interval", type="int", default=180,
+                      help="Maximum time between two probes of the guest (in seconds). Default=180.")
+    parser.add_option("--manifest", dest="manifest",
+                      help="File listing one VM per line as '<name> <login>', where <login> is a --login choice (" + vm_mgmt_catalog.choices_help(settings.GUEST_LOGIN_INFO) + "). All of them are watched by this one process. Replaces --name and --login.")
+    parser.add_option("--workers", dest="workers", type="int", default=16,
+                      help="Number of guest operations run in parallel with --manifest. Default=16.")
     opts, args = parser.parse_args()
 
-    if not opts.login:
+    if not opts.login and not opts.manifest:
         log(level="error",
             msg="Cannot continue without Guest Login Information. Use --login.")
         sys.exit(1)
@@ -88,9 +94,9 @@ def options():
             msg="Cannot continue without vCenter or ESXi host Information. Use --vcenter.")
         sys.exit(1)
 
-    if not opts.name:
+    if not opts.name and not opts.manifest:
         log(level="error",
-            msg="Cannot continue without Guest VM Name. Use --name.")
+            msg="Cannot continue without Guest VM Name. Use --name or --manifest.")
         sys.exit(1)
 
     if not opts.fetch_ip:
@@ -119,70 +125,30 @@ def options():
     return opts
 
 
-def change_cdrom_type(dev, dev_type, value=""):
-    if dev_type == "ISO":
-        iso = VI.ns0.VirtualCdromIsoBackingInfo_Def("iso").pyclass()
-        iso.set_element_fileName(value)
-        dev.set_element_backing(iso)
-    elif dev_type == "HOST DEVICE":
-        host = VI.ns0.VirtualCdromAtapiBackingInfo_Def("host").pyclass()
-        host.set_element_deviceName(value)
-        dev.set_element_backing(host)
-    elif dev_type == "CLIENT DEVICE":
-        client = VI.ns0.VirtualCdromRemoteAtapiBackingInfo_Def(
-            "client").pyclass()
-        client.set_element_deviceName("")
-        dev.set_element_backing(client)
-
-
-def disconnect_vm_cdroms(vm, server):
-    connected_cdroms = []
-
-    for dev in vm.properties.config.hardware.device:
-        if dev._type == "VirtualCdrom":
-        # and dev.connectable.connected:
-        # if dev._type == "VirtualCdrom" and dev.connectable.startConnected:
-            d = dev._obj
-            try:
-                d.Connectable.set_element_connected(False)
-                d.Connectable.set_element_startConnected(False)
-                connected_cdroms.append(d)
-            except:
-                log(level="warning", msg="%s: no virtual cd roms found." %
-                    vm.properties.name)
-
-    if not connected_cdroms:
-        log(level="info", msg="%s: has no connected cd roms" %
-            vm.properties.name)
+def disconnect_vm_cdroms(s, vm_mor, vmname):
+    # Switch every CD-ROM to a client device and disconnect it, with one
+    # reconfiguration. Only the CD-ROMs of the VM are fetched.
+    config = vm_mgmt_spec.for_vm_mor(s, vm_mor, ["VirtualCdrom"])
+    if not config.set_cdrom_backing("CLIENT DEVICE"):
+        log(level="info", msg="%s: has no connected cd roms" % vmname)
         return
+    config.set_cdrom_connected(False)
 
-    request = VI.ReconfigVM_TaskRequestMsg()
-    _this = request.new__this(vm._mor)
-    _this.set_attribute_type(vm._mor.get_attribute_type())
-    request.set_element__this(_this)
-    spec = request.new_spec()
-    dev_changes = []
-
-    for dev in connected_cdroms:
-        change_cdrom_type(dev, "CLIENT DEVICE")
-        dev_change = spec.new_deviceChange()
-        dev_change.set_element_device(dev)
-        dev_change.set_element_operation("edit")
-        dev_changes.append(dev_change)
-
-    spec.set_element_deviceChange(dev_changes)
-    request.set_element_spec(spec)
-    ret = server._proxy.ReconfigVM_Task(request)._returnval
     # Wait for the task to finish
-    # Remove all this section if you don't wish to wait for the task to finish
-    task = VITask(ret, server)
+    ret = vm_mgmt_spec.reconfigure(s, vm_mor, config)
+    task = vm_mgmt_tasks.track_task(ret, s)
     status = task.wait_for_state([task.STATE_SUCCESS, task.STATE_ERROR])
     if status == task.STATE_SUCCESS:
-        log(level="info", msg="%s: successfully reconfigured" %
-            vm.properties.name)
+        log(level="info", msg="%s: successfully reconfigured" % vmname)
     elif status == task.STATE_ERROR:
-        log(level="error", msg="%s: Error reconfiguring vm" %
-            vm.properties.name)
+        log(level="error", msg="%s: Error reconfiguring vm" % vmname)
+
+
+def power_state(s, vm_mor):
+    # runtime.powerState alone, e.g. "poweredOff". (VIVirtualMachine's
+    # is_powered_off() also looks for the pending tasks of the VM.)
+    return vm_mgmt_properties.vm_properties(s, [vm_mor], ["runtime.powerState"]).get(vm_mor, {}).get(
+        "runtime.powerState")
 
 
 def check_count(count, wait_for):
@@ -191,6 +157,445 @@ def check_count(count, wait_for):
         log(level="error", msg="Aborted.")
 
 
+def save_vm_ip(s, vm_mor, vmname, vcenter_key):
+    # Only guest.net is fetched, not all the properties of the VM.
+    props = vm_mgmt_properties.vm_properties(s, [vm_mor], ["guest.net"]).get(vm_mor, {})
+    mac, ip_addresses = vm_mgmt_properties.guest_nics(props.get("guest.net"))[0]
+    vm_ip = ip_addresses[0]
+    log(level="info", msg="%s: IP address of the deployed VM: %s" % (vmname, str(vm_ip)))
+    vm_mgmt_registry.record(vcenter_key, vmname, ip=vm_ip, mac=mac)
+    log(level="info", msg="%s: Saved the IP of the deployed machine in the VM registry." % vmname)
+
+    if not settings.DEPLOYED_VM_IP_SAVE_FOLDER:
+        return
+    ip_file_path = settings.DEPLOYED_VM_IP_SAVE_FOLDER + "/%s.txt" % vmname
+    try:
+        with open(ip_file_path, 'w') as f:
+            f.write(vm_ip)
+            log(level="info", msg="%s: Saved the IP of the deployed machine in: %s" %
+                (vmname, ip_file_path))
+            f.close()
+    except:
+        log(level="error", msg="%s: Failed to save the IP information in %s. Please try again." %
+            (vmname, ip_file_path))
+
+
+def install_network_fix(guest_vm, vmname):
+    try:
+        # Skipped when the guest already holds the same content, or holds a
+        # vm_network_fix not uploaded by us.
+        uploaded = vm_mgmt_transfer.upload_file(guest_vm, 'vm_network_fix', '/etc/init.d/vm_network_fix',
+                                                keep_existing=True)
+    except Exception as e:
+        log(level="error", msg="%s: Failed to upload vm_network_fix. Exception: %s" % (vmname, str(e)))
+        return
+    if not uploaded:
+        log(level="info", msg="%s: Network fix already exists. Nothing needs to be done." % vmname)
+    else:
+        try:
+            log(level="info", msg="%s: Upload of vm_network_fix successful. Changing permissions, adding the daemon to start-up sequence and starting it." % vmname)
+            # One script for the three steps; it stops at the first failure.
+            exit_code = vm_mgmt_guest.run_script(guest_vm, [
+                ['/bin/chmod', '755', '/etc/init.d/vm_network_fix'],
+                ['/sbin/chkconfig', '--add', 'vm_network_fix'],
+                ['/sbin/service', 'vm_network_fix', 'start']], cwd='/etc/init.d')
+            if exit_code == 0:
+                log(level="info", msg="%s: Daemon process started successfully." % vmname)
+            else:
+                log(level="error", msg="%s: Failed to set up the vm_network_fix daemon. Exit code: %s" %
+                    (vmname, str(exit_code)))
+        except Exception as e:
+            log(level="error", msg="%s: Failed to start the vm_network_fix daemon. Exception: %s" %
+                (vmname, str(e)))
+
+
+def services_started(guest_vm):
+    # The vm_network_fix service just started by install_network_fix() is
+    # running. (The rc.local lock of the boot sequence would not do: it is
+    # there since the boot that preceded the check.)
+    try:
+        return guest_vm.list_files(SERVICE_STARTED_FLAG_FILE)[0]['path'] == SERVICE_STARTED_FLAG_FILE
+    except Exception:
+        return False
+
+
+def request_shutdown(guest_vm, vmname):
+    # Returns True if the guest accepted the shutdown request.
+    log(level="info",
+        msg="%s: Issuing a graceful shutdown request to the Guest." % vmname)
+    try:
+        guest_vm.start_process('/sbin/shutdown', args=[
+                               '-h', 'now'], cwd='/root')
+        return True
+    except Exception as e:
+        log(level="error",
+            msg="%s: Could not issue a graceful shutdown request to the guest." % vmname)
+        log(level="warning",
+            msg="OVFTool may hard-poweroff the VM while attempting to create an OVA of it.")
+        log(level="error", msg="Exception: %s" % str(e))
+        return False
+
+
+def power_off_overdue(vmname):
+    log(level="warning",
+        msg="%s: Its been 30 minutes and yet the system did not poweroff. This not expected." % vmname)
+    log(level="warning",
+        msg="OVFTool may hard-poweroff the VM while attempting to create an OVA of it.")
+
+
+def release_cdroms(s, vm_mor, vmname):
+    # Disconnect CDROM device from the VM.
+    try:
+        disconnect_vm_cdroms(s, vm_mor, vmname)
+        log(level="info", msg="Disconnected Virtual CDROM from %s successfully." %
+            vmname)
+    except Exception as e:
+        log(level="error", msg="Exception while attempting to disconnect the virtual CD rom of %s." %
+            vmname)
+        log(level="error", msg="Exception: %s" % str(e))
+
+
+def post_install(s, guest_vm, vmname, fetch_ip, vcenter_key):
+    if fetch_ip is True:
+        save_vm_ip(s, guest_vm._mor, vmname, vcenter_key)
+        return
+
+    install_network_fix(guest_vm, vmname)
+
+    def progress(elapsed, interval):
+        log(level="info", msg="%s: Elapsed %s seconds ..." % (vmname, str(int(elapsed))), progress=vmname)
+
+    log(level="info",
+        msg="Waiting (60 seconds at most) for all services to start successfully.")
+    sleeper = vm_mgmt_readiness.SleepWatcher()
+    start = time.time()
+    sleeper.wait(SETTLE_MIN_TIME)
+    if vm_mgmt_readiness.wait_until(lambda: services_started(guest_vm), sleeper, 0, 60, 2, 5,
+                                    start=start, progress=progress):
+        log(level="info", msg="All services are up and running now ...")
+    else:
+        log(level="info", msg="All services should be up and running now ...")
+
+    if request_shutdown(guest_vm, vmname):
+        wait_for = 900  # 30 minutes.
+        log(level="info", msg="Waiting for the Guest to power-off ...")
+        # Woken up by the power state change of the VM.
+        watcher = vm_mgmt_readiness.watch_guest_state(s, [guest_vm._mor])
+
+        def powered_off():
+            values = watcher.values(guest_vm._mor)
+            if "runtime.powerState" in values:
+                return values["runtime.powerState"] == "poweredOff"
+            return power_state(s, guest_vm._mor) == "poweredOff"
+
+        try:
+            if vm_mgmt_readiness.wait_until(powered_off, watcher, 0, wait_for, 1, 30, progress=progress):
+                log(level="info", msg="%s powered off successfully." % vmname)
+            else:
+                power_off_overdue(vmname)
+        finally:
+            watcher.close()
+
+    release_cdroms(s, guest_vm._mor, vmname)
+
+
+# States of an Installation, in the order they are normally visited. With
+# --get_ip an installation is DONE right after POST_INSTALL. Any state that
+# runs out of time moves it to FAILED.
+LOCATE = "locate"
+TOOLS = "tools"
+LOGIN = "login"
+FLAG = "flag-file"
+POST_INSTALL = "post-install"
+SETTLE = "settle"
+SHUTDOWN = "shutdown"
+POWER_OFF = "power-off"
+CDROM = "cdrom"
+DONE = "done"
+FAILED = "failed"
+
+INSTALLATION_FLAG_FILE = "/etc/INSTALLATION_COMPLETED"
+# Created by the init script of vm_network_fix when the service starts.
+SERVICE_STARTED_FLAG_FILE = "/var/lock/subsys/vm_network_fix"
+# Seconds given to the services after vm_network_fix was set up, however
+# early its lock file shows up.
+SETTLE_MIN_TIME = 10
+
+
+class Installation(object):
+    # One VM watched by watch_installations().
+
+    def __init__(self, name, username, password):
+        self.name = name
+        self.username = username
+        self.password = password
+        self.mor = None
+        self.vm = None          # VIVirtualMachine, loaded when first needed.
+        self.busy = False       # A worker is running a step for it.
+        self.error = None       # Last exception of a step, for the report.
+        self.started = time.time()
+        self.enter(LOCATE)
+
+    def enter(self, state, delay=0):
+        if hasattr(self, "state"):
+            # The time spent in the state, probes and waits included.
+            vm_mgmt_trace.record(self.state, self.entered, vm=self.name)
+        self.state = state
+        self.entered = time.time()
+        self.last_probe = 0
+        self.next_probe = self.entered + delay
+        self.earliest = self.next_probe     # Not probed before, even when woken up.
+
+    def finished(self):
+        return self.state in [DONE, FAILED]
+
+    def guest(self, s):
+        if not self.vm:
+            self.vm = VIVirtualMachine(s, self.mor)
+        return self.vm
+
+
+def locate_vms(s, names):
+    # Returns {name: moref} for the VMs in 'names' that exist, with a single
+    # traversal of the inventory however many names are given.
+    found = {}
+    for mor, name in s._get_managed_objects(MORTypes.VirtualMachine).items():
+        if name in names:
+            found[name] = mor
+    return found
+
+
+def run_step(s, opts, install):
+    # Runs the blocking part of the current state of 'install' in a worker
+    # thread. Returns True once the state is complete.
+    with vm_mgmt_trace.span("probe-" + install.state, vm=install.name):
+        guest_vm = install.guest(s)
+        if install.state == TOOLS:
+            return guest_vm.get_tools_status() in [ToolsStatus.RUNNING, ToolsStatus.RUNNING_OLD]
+        if install.state == LOGIN:
+            guest_vm.login_in_guest(install.username, install.password)
+            return True
+        if install.state == FLAG:
+            try:
+                flag_file = guest_vm.list_files(INSTALLATION_FLAG_FILE)
+                return flag_file[0]['path'] == INSTALLATION_FLAG_FILE
+            except Exception:
+                return False
+        if install.state == POST_INSTALL:
+            if opts.fetch_ip is True:
+                save_vm_ip(s, install.mor, install.name, opts.vcenter)
+            else:
+                install_network_fix(guest_vm, install.name)
+            return True
+        if install.state == SETTLE:
+            return services_started(guest_vm)
+        if install.state == SHUTDOWN:
+            return request_shutdown(guest_vm, install.name)
+        if install.state == POWER_OFF:
+            return power_state(s, guest_vm._mor) == "poweredOff"
+        if install.state == CDROM:
+            release_cdroms(s, install.mor, install.name)
+            return True
+
+
+def watch_installations(s, installs, opts):
+    # Drives every installation through its states from a single thread. The
+    # guest state of all the VMs arrives through one property-update stream,
+    # and the blocking guest operations run on a bounded pool of workers, so
+    # hundreds of installations cost one session and a handful of threads.
+    #
+    # state -> (timeout, expected completion, max probe interval). A timeout
+    # of None means the --deadline of the whole installation.
+    schedules = {
+        TOOLS: (None, 0, 30),
+        LOGIN: (300, 0, 30),
+        FLAG: (None, opts.expected_install_time, opts.max_probe_interval),
+        SETTLE: (60, 0, 5),
+        POWER_OFF: (900, 0, 30),
+    }
+    by_mor = {}
+    watcher = vm_mgmt_readiness.watch_guest_state(s)
+    # A finished step wakes the main loop up to act on its result.
+    pool = vm_mgmt_workers.WorkerPool(opts.workers, on_finished=lambda: watcher.wake())
+
+    def fail(install, message):
+        log(level="error", msg="%s: %s" % (install.name, message))
+        log(level="info", msg="Please login to the EXSi server and fix the issue.")
+        vm_mgmt_registry.failed(opts.vcenter, install.name, message)
+        if install.mor:
+            watcher.remove(install.mor)
+        install.enter(FAILED)
+
+    def not_yet(install):
+        # Schedules the next probe of the current state, or gives up.
+        timeout, expected, max_interval = schedules[install.state]
+        origin = install.entered if timeout else install.started
+        deadline = timeout or opts.deadline
+        elapsed = install.last_probe - origin
+        if elapsed >= deadline:
+            if install.state == POWER_OFF:
+                power_off_overdue(install.name)
+                install.enter(CDROM)
+            elif install.state == SETTLE:
+                log(level="info", msg="%s: All services should be up and running now ..." % install.name)
+                install.enter(SHUTDOWN)
+            elif install.state == TOOLS:
+                fail(install, "Failed to get OS installation status even after %s seconds." % str(deadline))
+            elif install.state == LOGIN:
+                fail(install, "Failed to login to the Guest even after %s seconds. Exception: %s" %
+                     (str(deadline), str(install.error or "")))
+            else:
+                fail(install, "OS installation is still in progress even after %s seconds. This is not expected." %
+                     str(deadline))
+            return
+        interval = min(vm_mgmt_readiness.probe_interval(elapsed, expected, opts.min_probe_interval,
+                                                        max_interval), deadline - elapsed)
+        log(level="info", msg="%s: %s: elapsed %s seconds, next check in %s seconds ..." %
+            (install.name, install.state, str(int(install.last_probe - install.started)), str(int(interval))),
+            progress=install.name)
+        install.next_probe = install.last_probe + interval
+
+    def complete(install, done):
+        if not done:
+            if install.state in schedules:
+                not_yet(install)
+            elif install.state == SHUTDOWN:
+                # The guest did not take the request. Nothing to wait for.
+                install.enter(CDROM)
+            else:
+                fail(install, "The %s step failed. Exception: %s" % (install.state, str(install.error or "")))
+            return
+
+        if install.state == TOOLS:
+            log(level="info", msg="%s: Received response from the Guest OS. Logging in." % install.name)
+            install.enter(LOGIN)
+        elif install.state == LOGIN:
+            log(level="info", msg="%s: Successfully logged into guest." % install.name)
+            install.enter(FLAG)
+        elif install.state == FLAG:
+            log(level="info", msg="%s: OS installation has completed. Successfully." % install.name)
+            vm_mgmt_registry.installed(opts.vcenter, install.name, install.started)
+            install.enter(POST_INSTALL)
+        elif install.state == POST_INSTALL:
+            if opts.fetch_ip is True:
+                install.enter(DONE)
+            else:
+                log(level="info",
+                    msg="%s: Waiting (60 seconds at most) for all services to start successfully." % install.name)
+                install.enter(SETTLE, SETTLE_MIN_TIME)
+        elif install.state == SETTLE:
+            log(level="info", msg="%s: All services are up and running now ..." % install.name)
+            install.enter(SHUTDOWN)
+        elif install.state == SHUTDOWN:
+            log(level="info", msg="%s: Waiting for the Guest to power-off ..." % install.name)
+            install.enter(POWER_OFF)
+        elif install.state == POWER_OFF:
+            log(level="info", msg="%s powered off successfully." % install.name)
+            install.enter(CDROM)
+        elif install.state == CDROM:
+            watcher.remove(install.mor)
+            install.enter(DONE)
+
+    def advance(install):
+        # Called when the next probe of 'install' is due.
+        install.last_probe = time.time()
+        # Answer from the update stream when it already knows.
+        values = watcher.values(install.mor)
+        if install.state == TOOLS and "guest.toolsRunningStatus" in values:
+            complete(install, values["guest.toolsRunningStatus"] == "guestToolsRunning")
+        elif install.state == POWER_OFF and "runtime.powerState" in values:
+            complete(install, values["runtime.powerState"] == "poweredOff")
+        else:
+            install.busy = True
+            pool.submit(lambda i: run_step(s, opts, i), install)
+
+    try:
+        while True:
+            active = [i for i in installs if not i.finished()]
+            if not active:
+                break
+
+            now = time.time()
+            lost = [i for i in active if i.state == LOCATE and i.next_probe <= now]
+            if lost:
+                try:
+                    with vm_mgmt_trace.span("locate", vms=len(lost)):
+                        found = locate_vms(s, set([i.name for i in lost]))
+                except Exception as e:
+                    found = {}
+                    for install in lost:
+                        install.error = e
+                for install in lost:
+                    if install.name in found:
+                        log(level="info", msg="Located VM: %s" % install.name)
+                        install.mor = found[install.name]
+                        by_mor[str(install.mor)] = install
+                        watcher.add(install.mor)
+                        install.started = time.time()
+                        install.enter(TOOLS)
+                    elif now - install.entered >= 10:
+                        fail(install, "Failed to locate the VM even after 10 seconds. Exception: %s" %
+                             str(install.error or ""))
+                    else:
+                        install.next_probe = now + 1
+
+            for install in active:
+                if not install.busy and install.state != LOCATE and install.next_probe <= now:
+                    advance(install)
+
+            for install, done, error in pool.collect():
+                install.busy = False
+                if error:
+                    install.error = error
+                complete(install, bool(done))
+
+            # Sleep until the next probe is due, a worker finishes or the
+            # guest state of one of the VMs changes.
+            idle = [i.next_probe for i in installs if not i.finished() and not i.busy]
+            timeout = min(idle or [now + opts.min_probe_interval]) - time.time()
+            timeout = max(0, min(timeout, opts.min_probe_interval))
+            try:
+                changed = watcher.wait(timeout)
+            except Exception:
+                # The stream is gone (e.g. the session was re-established).
+                # Probe the guests directly from now on.
+                watcher = vm_mgmt_readiness.SleepWatcher()
+                changed = set()
+            for key in changed:
+                install = by_mor.get(key)
+                if install and not install.busy and install.state in schedules:
+                    # Probe right away, but never more often than min_probe_interval.
+                    install.next_probe = max(min(install.next_probe,
+                                                 install.last_probe + opts.min_probe_interval),
+                                             install.earliest)
+    finally:
+        pool.shutdown()
+        watcher.close()
+
+
+def watch_manifest(s, opts):
+    installs = []
+    for fields in vm_mgmt_workers.read_manifest(opts.manifest):
+        if len(fields) != 2 or fields[1] not in settings.GUEST_LOGIN_INFO:
+            log(level="error", msg="Invalid manifest entry '%s'. Expected '<name> <login>' with <login> a --login choice (%s)." %
+                (" ".join(fields), vm_mgmt_catalog.choices_help(settings.GUEST_LOGIN_INFO)))
+            sys.exit(1)
+        logintype = settings.GUEST_LOGIN_INFO[fields[1]]
+        installs.append(Installation(fields[0], opts.username or logintype.username,
+                                     opts.password or logintype.password))
+
+    log(level="info", msg="Watching the OS installation in %s VMs ..." % str(len(installs)))
+    watch_installations(s, installs, opts)
+
+    log(level="info", msg="Summary:")
+    for install in installs:
+        log(level="info", msg="    %s: %s after %s seconds" %
+            (install.name, install.state == DONE and "OK" or "FAILED",
+             str(int(install.entered - install.started))))
+    return not [i for i in installs if i.state == FAILED]
+
+
+@vm_mgmt_trace.traced_run("detect_installation_completion")
 def main():
 
     setup_logger()
@@ -201,19 +606,20 @@ def main():
 
     opts = options()
 
-    # CONNECTION PARAMTERS
-    server = opts.esx_host
-    user = opts.user
-    password = opts.passwd
+    # CONNECT TO THE SERVER (or borrow the session already open to it)
+    with vm_mgmt_trace.span("connect"):
+        s = vm_mgmt_session.connect(opts.vcenter)
+
+    if opts.manifest:
+        succeeded = watch_manifest(s, opts)
+        vm_mgmt_session.release(s)
+        sys.exit(0 if succeeded else 1)
 
     # REQUIRED PARAMETERS
     vmname = opts.name
 
-    # CONNECT TO THE SERVER
-    s = VIServer()
-    s.connect(server, user, password)
-
     log(level="info", msg="Attempting to locate the guest VM: %s" % vmname)
+    located = time.time()
     count = 1
     wait_for = 10
     while count < wait_for:
@@ -231,173 +637,100 @@ def main():
                 sys.exit(1)
 
         time.sleep(1)
-        log(level="info", msg="Elapsed %s seconds ..." % str(count))
+        log(level="info", msg="Elapsed %s seconds ..." % str(count), progress=vmname)
 
     check_count(count, wait_for)
+    vm_mgmt_trace.record("locate", located, vm=vmname)
     log(level="info", msg="Located VM: %s" % vmname)
     log(level="info", msg="Waiting for the OS installation to complete...")
-    log(level="info", msg="Will wait for about 60 minutes (at max) ...")
-
-    wait_for = 3600  # 1 hour.
-    log(level="info",
-        msg="Note: There will be no output as the process would be blocked in waiting state until the Guest OS responds.")
-    log(level="info",
-        msg="Will automatically timeout after an hour (at max) ...")
-    try:
-        guest_vm.wait_for_tools(timeout=wait_for)
-    except Exception as e:
-        if count >= wait_for:
-            log(level="error", msg="Failed to get OS installation status in the new VM (%s) even after %s seconds." %
-                (vmname, str(wait_for)))
-            log(level="info", msg="Please login to the EXSi server and fix the issue. Exception: %s" %
-                str(e))
-            sys.exit(1)
+    log(level="info", msg="Will wait for about %s minutes (at max) ..." % str(opts.deadline / 60))
+    start = time.time()
+
+    # Changes of the tools, guest or power state of the VM wake the waits
+    # below up immediately. Otherwise the guest is probed on an adaptive
+    # schedule: rarely at first, often around the expected completion time.
+    watcher = vm_mgmt_readiness.watch_guest_state(s, [guest_vm._mor])
+
+    def progress(elapsed, interval):
+        log(level="info", msg="Elapsed %s seconds, next check in %s seconds ..." %
+            (str(int(elapsed)), str(int(interval))), progress=vmname)
+
+    def tools_running():
+        values = watcher.values(guest_vm._mor)
+        if "guest.toolsRunningStatus" in values:
+            return values["guest.toolsRunningStatus"] == "guestToolsRunning"
+        return guest_vm.get_tools_status() in [ToolsStatus.RUNNING, ToolsStatus.RUNNING_OLD]
+
+    with vm_mgmt_trace.span("tools", vm=vmname):
+        ready = vm_mgmt_readiness.wait_until(tools_running, watcher, 0, opts.deadline,
+                                             opts.min_probe_interval, 30, start=start, progress=progress)
+    if not ready:
+        log(level="error", msg="Failed to get OS installation status in the new VM (%s) even after %s seconds." %
+            (vmname, str(opts.deadline)))
+        log(level="info", msg="Please login to the EXSi server and fix the issue.")
+        vm_mgmt_registry.failed(opts.vcenter, vmname, "Failed to get OS installation status even after %s seconds." %
+                                str(opts.deadline))
+        sys.exit(1)
 
     log(level="info", msg="Received response from the Guest OS.")
     log(level="info",
         msg="Attempting to login in the Guest to check the status of the OS instalaltion (timeout 5 minutes) ...")
-    count = 1
-    wait_for = 300  # 5 minutes
-    while count < wait_for:
+    login_errors = []
+
+    def login():
         try:
             guest_vm.login_in_guest(opts.username, opts.password)
-            break
+            return True
         except Exception as e:
-            if count >= wait_for:
-                log(level="error", msg="Failed to login to the Guest (%s) even after %s seconds." %
-                    (vmname, str(wait_for)))
-                log(level="info", msg="Please login to the EXSi server and fix the issue. Exception: %s" %
-                    str(e))
-                sys.exit(1)
-        count += 1
-        time.sleep(1)
-        log(level="info", msg="Elapsed %s seconds ..." % str(count))
+            login_errors.append(e)
+            return False
+
+    wait_for = 300  # 5 minutes
+    with vm_mgmt_trace.span("login", vm=vmname):
+        logged_in = vm_mgmt_readiness.wait_until(login, watcher, 0, wait_for,
+                                                 opts.min_probe_interval, 30, progress=progress)
+    if not logged_in:
+        log(level="error", msg="Failed to login to the Guest (%s) even after %s seconds." %
+            (vmname, str(wait_for)))
+        log(level="info", msg="Please login to the EXSi server and fix the issue. Exception: %s" %
+            (login_errors and str(login_errors[-1]) or ""))
+        vm_mgmt_registry.failed(opts.vcenter, vmname, "Failed to login to the Guest even after %s seconds." %
+                                str(wait_for))
+        sys.exit(1)
 
-    check_count(count, wait_for)
     log(level="info", msg="Successfully logged into guest.")
     log(level="info",
-        msg="Checking the progress of the OS installation (will timeout after 30 minutes (at max)) ...")
-    log(level="info", msg="OS installation is still in progress.")
-    log(level="info",
-        msg="Waiting for it to complete (will timeout after 60 minutes (at max)) ...")
-    count = 1
-    wait_for = 3600  # 60 minutes
-    filename = "/etc/INSTALLATION_COMPLETED"
+        msg="Checking the progress of the OS installation (will timeout after %s minutes (at max)) ..." %
+        str(opts.deadline / 60))
 
-    while count < wait_for:
+    def installation_completed():
         try:
-            flag_file = guest_vm.list_files(filename)
-            if flag_file[0]['path'] == filename:
-                log(level="info",
-                    msg="OS installation has completed. Successfully.")
-                break
-        except Exception as e:
-            if count >= wait_for:
-                log(level="error", msg="OS installation is still in progress in %s even after %s seconds. This is not expected." %
-                    (vmname, str(wait_for)))
-                log(level="info", msg="Please login to the EXSi server and fix the issue. Exception: %s" %
-                    str(e))
-                sys.exit(1)
-
-        count += 180
-        time.sleep(180)
-        log(level="info", msg="Elapsed %s seconds ..." % str(count))
-
-    check_count(count, wait_for)
-
-    if opts.fetch_ip is True:
-
-        vm_ip = guest_vm.get_property(
-            'net', from_cache=False)[0]['ip_addresses'][0]
-        log(level="info", msg="IP address of the deployed VM: %s" % str(vm_ip))
-
-        ip_file_path = settings.DEPLOYED_VM_IP_SAVE_FOLDER + "/%s.txt" % vmname
-        try:
-            with open(ip_file_path, 'w') as f:
-                f.write(vm_ip)
-                log(level="info", msg="Saved the IP of the deployed machine in: %s" %
-                    ip_file_path)
-                f.close()
-        except:
-            log(level="error", msg="Failed to save the IP information in %s. Please try again." %
-                ip_file_path)
+            flag_file = guest_vm.list_files(INSTALLATION_FLAG_FILE)
+            return flag_file[0]['path'] == INSTALLATION_FLAG_FILE
+        except Exception:
+            return False
+
+    with vm_mgmt_trace.span("flag-file", vm=vmname):
+        completed = vm_mgmt_readiness.wait_until(installation_completed, watcher, opts.expected_install_time,
+                                                 opts.deadline, opts.min_probe_interval, opts.max_probe_interval,
+                                                 start=start, progress=progress)
+    if not completed:
+        log(level="error", msg="OS installation is still in progress in %s even after %s seconds. This is not expected." %
+            (vmname, str(opts.deadline)))
+        log(level="info", msg="Please login to the EXSi server and fix the issue.")
+        vm_mgmt_registry.failed(opts.vcenter, vmname, "OS installation is still in progress even after %s seconds." %
+                                str(opts.deadline))
+        sys.exit(1)
 
-    else:  # if opts.fetch_ip == False
+    log(level="info", msg="OS installation has completed. Successfully.")
+    vm_mgmt_registry.installed(opts.vcenter, vmname, start)
+    watcher.close()
 
-        try:
-            network_fix = guest_vm.list_files('/etc/init.d/vm_network_fix')
-            log(level="info", msg="Network fix already exists. Nothing needs to be done.")
-        except:
-            try:
-                # Network fix does not exist.
-                log(level="info", msg="Network fix does not exist. Uploading vm_network_fix.")
-                guest_vm.send_file('vm_network_fix', '/etc/init.d/vm_network_fix', overwrite=True)
-                log(level="info", msg="Upload of vm_network_fix successful. Changing permissions.")
-                guest_vm.start_process('/bin/chmod', args=[
-                                   '755', 'vm_network_fix'], cwd='/etc/init.d')
-                time.sleep(1)
-                log(level="info", msg="Changing permissions successful. Adding the daemon to start-up sequence.")
-                guest_vm.start_process('/sbin/chkconfig', args=[
-                                   '--add', 'vm_network_fix'], cwd='/etc/init.d')
-                time.sleep(1)
-                log(level="info", msg="Updating start-up sequence successful. Starting the daemon.")
-                guest_vm.start_process('/sbin/service', args=[
-                                   'vm_network_fix', 'start'], cwd='/etc/init.d')
-                time.sleep(1)
-                log(level="info", msg="Daemon process started successfully.")
-            except Exception as e:
-                log(level="error", msg="Failed to upload vm_network_fix and start the daemon. Exception: " + str(e))
-
-        log(level="info",
-            msg="Waiting for 60 seconds so that all services start successfully.")
-        count = 1
-        wait_for = 60
-        while count < wait_for:
-            count += 2
-            time.sleep(2)
-            log(level="info", msg="Elapsed %s seconds ..." % str(count))
+    with vm_mgmt_trace.span("post-install", vm=vmname):
+        post_install(s, guest_vm, vmname, opts.fetch_ip, opts.vcenter)
 
-        log(level="info", msg="All services should be up and running now ...")
-        log(level="info",
-            msg="Issuing a graceful shutdown request to the Guest.")
-        try:
-            guest_vm.start_process('/sbin/shutdown', args=[
-                                   '-h', 'now'], cwd='/root')
-            time.sleep(1)
-            count = 1
-            wait_for = 900  # 30 minutes.
-            log(level="info", msg="Waiting for the Guest to power-off ...")
-            while guest_vm.is_powered_off() is False:
-                time.sleep(1)
-                count += 1
-                log(level="info", msg="Elapsed %s seconds ..." % str(count))
-                if count >= wait_for:
-                    log(level="warning",
-                        msg="Its been 30 minutes and yet the system did not poweroff. This not expected.")
-                    log(level="warning",
-                        msg="OVFTool may hard-poweroff the VM while attempting to create an OVA of it.")
-                    break
-            if count < wait_for:
-                log(level="info", msg="%s powered off successfully." % vmname)
-        except Exception as e:
-            log(level="error",
-                msg="Could not issue a graceful shutdown request to the guest.")
-            log(level="warning",
-                msg="OVFTool may hard-poweroff the VM while attempting to create an OVA of it.")
-            log(level="error", msg="Exception: %s" % str(e))
-
-        # Disconnect CDROM device from the VM.
-        try:
-            disconnect_vm_cdroms(guest_vm, s)
-            log(level="info", msg="Disconnected Virtual CDROM from %s successfully." %
-                vmname)
-        except:
-            log(level="error", msg="Exception while attempting to disconnect the virtual CD rom of %s." %
-                vmname)
-            log(level="error", msg="Exception: %s" % str(e))
-
-    # disconnect from the server
-    s.disconnect()
+    # release the session
+    vm_mgmt_session.release(s)
 
     sys.exit(0)
 
@@ -3,9 +3,12 @@
 # ==============================================================================
 # Name          :   fabfile.py
 #
-# Description   :   A fabric script to delete the ISO file from the ESXi host.
-#                   If you prefer to reuse this library, the values in the file
-#                   like the name of the server should be updated.
+# Description   :   A fabric script to manage the ISO files on the ESXi hosts
+#                   of all the VCENTER_SERVERS, in parallel: upload an ISO,
+#                   delete one, or prune old ones in one SSH session per host.
+#                   E.g. fab upload_iso:path=/tmp/a.iso,product=my-product
+#                        fab prune_isos:product=my-product,days=7
+#                   Use -H <ip> to work on a single host.
 #
 # Version       :   1.0.0
 #
@@ -14,6 +17,8 @@
 # Change log    :
 #   25-Feb-2013 :    Santhoshkumar Settipalli (santhosh.settipalli@gmail.com)
 #                    Initial version.
+#   17-Oct-2026 :    Santhoshkumar Settipalli (santhosh.settipalli@gmail.com)
+#                    All configured hosts in parallel. Upload and prune tasks.
 #
 # ==============================================================================
 
@@ -21,12 +26,38 @@ from fabric.api import *
 from fabric.state import env
 from fabric.contrib import files
 import settings
+import vm_mgmt_iso
 
-env.user = settings.VCENTER_SERVERS['VM-Server-Name-Key'].username
-env.password = settings.VCENTER_SERVERS['VM-Server-Name-Key'].password
-env.hosts = [settings.VCENTER_SERVERS['VM-Server-Name-Key'].ip, ]
+env.hosts = ["%s@%s" % (vcenter.username, vcenter.ip) for vcenter in settings.VCENTER_SERVERS.values()]
+env.passwords = dict([("%s@%s:22" % (vcenter.username, vcenter.ip), vcenter.password)
+                      for vcenter in settings.VCENTER_SERVERS.values()])
 env.shell = "/bin/sh -c"
 
+
+def current_vcenter():
+    # The VCENTER_SERVERS key and entry of the host the task runs on.
+    for key, vcenter in settings.VCENTER_SERVERS.items():
+        if vcenter.ip == env.host:
+            return key, vcenter
+    abort("%s is not in VCENTER_SERVERS." % env.host)
+
+
+@parallel
+def upload_iso(path=None, product=None):
+    # Streamed over HTTP rather than SSH. Skipped when the datastore holds
+    # the same content under the same name already.
+    if path == None or product == None:
+        print "Nothing to upload. Use upload_iso:path=<local-iso>,product=<product>."
+        return
+
+    key, vcenter = current_vcenter()
+    if vm_mgmt_iso.upload(key, path, product):
+        print "Uploaded %s to [%s] %s." % (path, vcenter.datastore, vm_mgmt_iso.iso_path(product, ""))
+    else:
+        print "[%s] already holds %s. Nothing to upload." % (vcenter.datastore, path)
+
+
+@parallel
 def delete_iso_file(product=None, filename=None):
     if product == None:
         print "Nothing to delete. Empty product name."
@@ -36,13 +67,25 @@ def delete_iso_file(product=None, filename=None):
         print "Nothing to delete. Empty filename."
         return
 
-    if env.host_string == settings.VCENTER_SERVERS['VM-Server-Name-Key'].ip:
-        path = "/vmfs/volumes/datastore1/iso/%s/%s" % (product, filename) 
-        
-        if not files.exists(path):
-            print "Could not find %s. Nothing to delete." % path
+    key, vcenter = current_vcenter()
+    path = "%s/%s/%s" % (settings.ISO_DATASTORE_PATH, vcenter.datastore,
+                         vm_mgmt_iso.iso_path(product, filename))
+
+    if not files.exists(path):
+        print "Could not find %s. Nothing to delete." % path
+        return
+
+    cmd = "rm -f %s %s.sha256" % (path, path)
+    print "About to execute %s" % cmd
+    run(cmd)
+    print "Deleted %s successfully." % path
+
 
-        cmd = "rm -f %s" % path
-        print "About to execute %s" % cmd
-        run(cmd)
-        print "Deleted %s successfully." % path
+@parallel
+def prune_isos(product=None, days=None):
+    # ISOs of the product (all products by default) older than 'days'
+    # (ISO_RETENTION_DAYS by default), with a single command per host.
+    key, vcenter = current_vcenter()
+    deleted = run(vm_mgmt_iso.prune_command(vcenter.datastore, product, days))
+    count = len([line for line in deleted.splitlines() if line.strip()])
+    print "Deleted %d ISO file(s) from [%s]." % (count, vcenter.datastore)
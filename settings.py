@@ -15,6 +15,8 @@
 #
 # ==============================================================================
 
+import os
+
 DISK_20GB = 20971520  # In KB (20 GB).
 DISK_40GB = 41943040  # In KB.
 DISK_100GB = 104857600  # In KB.
@@ -33,9 +35,68 @@ VIRTUAL_CPU_16NOS = 16
 LOG_FOLDER = "/var/log/vm_mgmt_lib"
 LOG_FILE = LOG_FOLDER + "/vm_mgmt_lib.log"
 LOG_LEVEL = "debug" # Supported value: 'debug', 'info', 'warning', 'error', 'critical'
-
-# Location to save the IP address of the deployed VM.
-DEPLOYED_VM_IP_SAVE_FOLDER="/tmp"
+LOG_MAX_BYTES = 1048576  # Rotated at 1 MB ...
+LOG_BACKUP_COUNT = 10  # ... keeping 10 old files.
+LOG_PROGRESS_INTERVAL = 30  # In seconds. At most one progress message per VM (or wait) in this time.
+
+# Registry of the deployed VMs (vm_mgmt_registry.py), holding their IP addresses.
+REGISTRY_DB = "/var/lib/vm_mgmt_lib/vm_registry.db"
+REGISTRY_BUSY_TIMEOUT = 30  # In seconds. How long a write waits for the other writers.
+
+# Set (e.g. to "/tmp") to also save the IP address of the deployed VM in
+# <folder>/<vmname>.txt, for consumers not reading the registry yet.
+DEPLOYED_VM_IP_SAVE_FOLDER = None
+
+# Location of the caches shared by the scripts (e.g. inventory morefs).
+CACHE_FOLDER = "/var/tmp/vm_mgmt_lib"
+INVENTORY_CACHE_TTL = 86400  # In seconds (1 day).
+CONFIG_QUERY_CACHE_TTL = 1800  # In seconds. QueryConfigTarget/QueryConfigOption responses.
+
+# How often (in seconds) idle vSphere sessions are checked and kept alive.
+SESSION_KEEPALIVE_INTERVAL = 300
+
+# Snapshot of the template that linked clones (--linked-clone) are based on.
+# It is taken automatically when the template VM does not have it yet.
+LINKED_CLONE_SNAPSHOT = "vm-mgmt-linked-clone-base"
+
+# Warm pool (vm-mgmt-create.py --pool-fill/--pool-take): number of powered off
+# VMs kept ready per VM type, named <WARM_POOL_PREFIX>-<vm-type>-<id>.
+WARM_POOL_SIZE = 2
+WARM_POOL_PREFIX = "vm-mgmt-pool"
+
+# vm-mgmt-delete.py asks for confirmation (or --yes) before deleting more
+# than this many VMs selected by --glob or --regex.
+DELETE_CONFIRM_THRESHOLD = 5
+
+# Guest file uploads (vm_mgmt_transfer.py). The digest of every file uploaded
+# to a guest is recorded in GUEST_TRANSFER_MANIFEST inside the guest.
+GUEST_TRANSFER_MANIFEST = "/var/tmp/.vm_mgmt_lib.manifest"
+TRANSFER_WORKERS = 8  # Concurrent uploads per process.
+TRANSFER_BANDWIDTH = 0  # In bytes per second, shared by all uploads. 0 = unlimited.
+TRANSFER_CHUNK_SIZE = 1048576  # In bytes.
+
+# Guest commands (vm_mgmt_guest.py): how long to wait for a command to exit,
+# and where scripts of several steps are uploaded to in the guest.
+GUEST_COMMAND_TIMEOUT = 300  # In seconds.
+GUEST_SCRIPT_FOLDER = "/var/tmp"
+
+# ISO management (vm_mgmt_iso.py, fabfile.py). ISOs are kept under
+# <datastore>/ISO_FOLDER/<product>/ on the datastore of every vCenter and
+# uploaded to ISO_DATASTORE_URL, where %(host)s is the ip of the vCenter
+# (e.g. "http://127.0.0.1:8989/folder" for vm_mgmt_fakevc.py run standalone).
+ISO_FOLDER = "iso"
+ISO_DATASTORE_URL = "https://%(host)s/folder"
+ISO_DATASTORE_PATH = "/vmfs/volumes"  # Mount point of the datastores on the ESXi hosts.
+ISO_UPLOAD_RETRIES = 3
+ISO_RETENTION_DAYS = 14
+
+# Tracing (vm_mgmt_trace.py). Every run of a script appends its phases (spans)
+# with their SOAP calls and bytes to TRACE_FILE as JSON lines, and exports them
+# to TRACE_PROMETHEUS_FILE for the node exporter textfile collector. Both are
+# relative to LOG_FOLDER.
+TRACE_ENABLED = True
+TRACE_FILE = "vm_mgmt_trace.jsonl"
+TRACE_PROMETHEUS_FILE = "vm_mgmt_trace_%(script)s.prom"
 
 try:
     from collections import namedtuple
@@ -64,6 +125,16 @@ except:
             self.hostname = hostname
             self.template = template
 
+try:
+    hardware_profile = namedtuple("hardware_profile", ["nic", "scsi_controller", "cores_per_socket", "disk_provisioning"])
+except:
+    class hardware_profile(object):
+        def __init__(self, nic, scsi_controller, cores_per_socket, disk_provisioning):
+            self.nic = nic
+            self.scsi_controller = scsi_controller
+            self.cores_per_socket = cores_per_socket
+            self.disk_provisioning = disk_provisioning
+
 try:
     supported_actions = namedtuple("supported_actions", ["action"])
 except:
@@ -97,6 +168,7 @@ VCENTER_SERVERS = {
     # "Key": vcenter_type('vcenter-ip', "root", "<password>", "Data-Center", "Data-Store", "exsi-hostname-connected-to-this-vcenter", "template-to-be-used-to-create-a-vm-clone"),    
 }
 
+# Actions of vm-mgmt.py -> the function of vm-mgmt.py running them.
 SUPPORTED_ACTIONS = {
     "create-vm" : "create_vm",
     "delete-vm" : "delete_vm",
@@ -115,3 +187,35 @@ NETWORK_ADAPTER = {
     "VMXNET3": vm_network_adapter("VMXNET3"),
 }
 
+# Virtual hardware of the VMs created from scratch by vm-mgmt-create.py.
+#   nic               : a NETWORK_ADAPTER key (--network-adapter overrides it).
+#   scsi_controller   : "pvscsi", "lsilogic", "lsilogic-sas" or "buslogic".
+#   cores_per_socket  : vCPUs per virtual socket. 0 puts all vCPUs in one socket.
+#   disk_provisioning : "thin", "thick" (lazy zeroed) or "eagerzeroedthick".
+HARDWARE_PROFILES = {
+    "paravirtual": hardware_profile("VMXNET3", "pvscsi", 0, "thin"),
+    "compatible": hardware_profile("E1000", "lsilogic", 1, "thin"),
+}
+DEFAULT_HARDWARE_PROFILE = "paravirtual"
+
+VM_HARDWARE_PROFILES = {
+    # Hardware profile of a VM type. Types not listed here use DEFAULT_HARDWARE_PROFILE.
+    # The 'VM-Key' should match the VM-Key used for VMs defined under VM_TYPES.
+    # "VM-Key": "compatible",
+}
+
+# External catalog (vm_mgmt_catalog.py) adding VM types, vCenters, guest logins,
+# network adapters and hardware profiles to the ones above, e.g.
+# "/etc/vm_mgmt_lib/catalog.json". The VM_MGMT_CATALOG environment variable
+# overrides it. It is read on first use, through an index kept in CACHE_FOLDER.
+CATALOG_FILE = os.environ.get("VM_MGMT_CATALOG") or None
+
+if CATALOG_FILE:
+    import vm_mgmt_catalog
+    catalog = vm_mgmt_catalog.Catalog(CATALOG_FILE, CACHE_FOLDER)
+    VM_TYPES = vm_mgmt_catalog.Section(catalog, "vm_types", vm_type, VM_TYPES)
+    VCENTER_SERVERS = vm_mgmt_catalog.Section(catalog, "vcenter_servers", vcenter_type, VCENTER_SERVERS)
+    GUEST_LOGIN_INFO = vm_mgmt_catalog.Section(catalog, "guest_login_info", vm_login_info, GUEST_LOGIN_INFO)
+    NETWORK_ADAPTER = vm_mgmt_catalog.Section(catalog, "network_adapter", vm_network_adapter, NETWORK_ADAPTER)
+    HARDWARE_PROFILES = vm_mgmt_catalog.Section(catalog, "hardware_profiles", hardware_profile, HARDWARE_PROFILES)
+    VM_HARDWARE_PROFILES = vm_mgmt_catalog.Section(catalog, "vm_hardware_profiles", None, VM_HARDWARE_PROFILES)
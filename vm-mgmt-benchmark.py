@@ -0,0 +1,304 @@
+#!/usr/bin/env python
+
+# ==============================================================================
+# Name          :   vm-mgmt-benchmark.py
+#
+# Description   :   Measures the scripts end to end against the local fake
+#                   vCenter of vm_mgmt_fakevc.py: creates a fleet of VMs
+#                   (vm-mgmt-create.py --manifest), watches their OS
+#                   installations (detect_installation_completion.py
+#                   --manifest) and deletes them (vm-mgmt-delete.py --glob),
+#                   for several batch sizes. The iso scenario uploads a batch
+#                   of ISOs to the datastore of the fake vCenter through
+#                   vm_mgmt_iso.py and checks that uploading them again sends
+#                   nothing and that a failed upload is retried. Reports the
+#                   wall time, the round trips, the bytes exchanged and the
+#                   throughput of every run.
+#                   E.g. python vm-mgmt-benchmark.py --batch-sizes 1,10,50 --latency 0.02
+#
+#                   The scripts run in this process, against a configuration
+#                   pointing at the fake vCenter only. Their output is kept
+#                   in <work-dir>/<scenario>-<batch size>.log.
+#
+# Version       :   1.0.0
+#
+# Author        :   Santhoshkumar Settipalli
+#
+# Change log    :
+#   17-Oct-2026 :    Santhoshkumar Settipalli (santhosh.settipalli@gmail.com)
+#                    Initial version.
+#
+# ==============================================================================
+
+import os
+import sys
+import imp
+import time
+import logging
+import shutil
+import tempfile
+import settings
+import vm_mgmt_iso
+import vm_mgmt_config
+import vm_mgmt_session
+import vm_mgmt_fakevc
+from optparse import OptionParser
+
+SCRIPTS = {
+    "create": "vm-mgmt-create.py",
+    "detect": "detect_installation_completion.py",
+    "delete": "vm-mgmt-delete.py",
+}
+SCENARIOS = ["create", "detect", "delete", "iso"]
+ISO_SIZE = 1024 ** 2    # Bytes of every ISO of the iso scenario.
+
+VCENTER = "bench"
+VM_TYPE = "bench"
+VM_PREFIX = "bench-"
+
+
+def options():
+    parser = OptionParser()
+    parser.add_option("--batch-sizes", dest="batch_sizes", default="1,5,20",
+                      help="Comma separated numbers of VMs per run. Default=1,5,20.")
+    parser.add_option("--scenarios", dest="scenarios", default=",".join(SCENARIOS),
+                      help="Comma separated scenarios to run, in this order: " + ", ".join(SCENARIOS) + ". Default=all.")
+    parser.add_option("--latency", dest="latency", type="float", default=0.0,
+                      help="Seconds added to every SOAP call by the fake vCenter. Default=0.")
+    parser.add_option("--task-time", dest="task_time", type="float", default=0.2,
+                      help="Seconds every task runs. Default=0.2.")
+    parser.add_option("--boot-time", dest="boot_time", type="float", default=1.0,
+                      help="Seconds from power on until the VMware Tools of a guest run. Default=1.")
+    parser.add_option("--install-time", dest="install_time", type="int", default=3,
+                      help="Seconds from the first power on of a VM to the end of its OS installation. Default=3.")
+    parser.add_option("--hosts", dest="hosts", type="int", default=4, help="Number of ESXi hosts. Default=4.")
+    parser.add_option("--workers", dest="workers", type="int", default=8,
+                      help="Workers of every script. Default=8.")
+    parser.add_option("--schedule-hosts", dest="schedule_hosts", default=False, action="store_true",
+                      help="Create the VMs with vm-mgmt-create.py --schedule-hosts.")
+    parser.add_option("--work-dir", dest="work_dir",
+                      help="Folder for the manifests, caches and logs of the runs. Default=a temporary folder, removed afterwards.")
+    opts, args = parser.parse_args()
+
+    try:
+        opts.batch_sizes = [int(b) for b in opts.batch_sizes.split(",") if b.strip()]
+    except ValueError:
+        print "Invalid --batch-sizes:", opts.batch_sizes
+        sys.exit(1)
+    opts.scenarios = [s.strip() for s in opts.scenarios.split(",") if s.strip()]
+    unknown = [s for s in opts.scenarios if s not in SCENARIOS]
+    if unknown or not opts.batch_sizes:
+        print "Nothing to run. Use --batch-sizes <n,...> and --scenarios with some of %s." % ", ".join(SCENARIOS)
+        sys.exit(1)
+    return opts
+
+
+def configure(url, work_dir):
+    # Points the settings of this process at the fake vCenter and keeps
+    # everything the scripts write inside 'work_dir'.
+    settings.VCENTER_SERVERS = {
+        VCENTER: settings.vcenter_type(url, "root", "vmware", "DC", "datastore1", "esx-1.local", "template"),
+    }
+    settings.VM_TYPES = {
+        VM_TYPE: settings.vm_type("bench", "bench", "datastore1", settings.RAM_2GB,
+                                  settings.VIRTUAL_CPU_2NOS, settings.DISK_20GB),
+    }
+    settings.GUEST_LOGIN_INFO = {VM_TYPE: settings.vm_login_info("root", "password")}
+    settings.LOG_FOLDER = work_dir
+    settings.LOG_FILE = os.path.join(work_dir, "vm_mgmt_lib.log")
+    settings.CACHE_FOLDER = os.path.join(work_dir, "cache")
+    settings.REGISTRY_DB = os.path.join(work_dir, "vm_registry.db")
+    settings.ISO_DATASTORE_URL = url.replace("/sdk", "/folder")
+    # Uploaded to every guest after its installation (relative to the
+    # current folder, see detect_installation_completion.py).
+    with open(os.path.join(work_dir, "vm_network_fix"), "w") as f:
+        f.write("#!/bin/sh\n")
+
+
+def load_scripts():
+    base = os.path.dirname(os.path.abspath(__file__))
+    scripts = {}
+    for scenario, filename in SCRIPTS.items():
+        scripts[scenario] = imp.load_source("bench_" + scenario, os.path.join(base, filename))
+    return scripts
+
+
+def write_manifest(path, lines):
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    return path
+
+
+def arguments(scenario, opts, work_dir, batch):
+    names = ["%s%d-%d" % (VM_PREFIX, batch, i) for i in range(batch)]
+    if scenario == "create":
+        manifest = write_manifest(os.path.join(work_dir, "create-%d.manifest" % batch),
+                                  ["%s %s bench.iso" % (name, VM_TYPE) for name in names])
+        args = ["--vcenter", VCENTER, "--manifest", manifest, "--workers", str(opts.workers)]
+        if opts.schedule_hosts:
+            args.append("--schedule-hosts")
+        return args
+    if scenario == "detect":
+        manifest = write_manifest(os.path.join(work_dir, "detect-%d.manifest" % batch),
+                                  ["%s %s" % (name, VM_TYPE) for name in names])
+        return ["--vcenter", VCENTER, "--manifest", manifest, "--workers", str(opts.workers),
+                "--expected-install-time", str(opts.install_time), "--min-probe-interval", "1",
+                "--max-probe-interval", "5", "--deadline", str(opts.install_time * 10 + 120)]
+    return ["--vcenter", VCENTER, "--glob", "%s%d-*" % (VM_PREFIX, batch), "--yes", "--workers", str(opts.workers),
+            "--shutdown-timeout", "30"]
+
+
+def iso_checks(vc, work_dir, batch):
+    # main() of the iso scenario: uploads 'batch' ISOs to every vCenter with
+    # upload_everywhere(), uploads them again, which has to send nothing,
+    # then changes one and uploads it while the datastore answers the first
+    # PUT with HTTP 503, which has to be retried.
+    def main():
+        folder = os.path.join(work_dir, "iso-%d" % batch)
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        product = "bench-%d" % batch
+        paths = []
+        for i in range(batch):
+            paths.append(os.path.join(folder, "bench-%d.iso" % i))
+            with open(paths[-1], "wb") as f:
+                f.write(os.urandom(ISO_SIZE))
+
+        failed = []
+        for path in paths:
+            for key, uploaded, error in vm_mgmt_iso.upload_everywhere(path, product):
+                if error or not uploaded:
+                    failed.append("%s was not uploaded to %s: %s" % (path, key, error))
+        puts = vc.stats()["calls"].get("datastorePUT", 0)
+        for path in paths:
+            if vm_mgmt_iso.upload(VCENTER, path, product):
+                failed.append("%s was uploaded again with the same content" % path)
+        if vc.stats()["calls"].get("datastorePUT", 0) != puts:
+            failed.append("unchanged ISOs were sent again")
+
+        with open(paths[0], "ab") as f:
+            f.write("changed")
+        vc.datastore_failures = 1
+        try:
+            if not vm_mgmt_iso.upload(VCENTER, paths[0], product):
+                failed.append("the changed %s was not uploaded" % paths[0])
+        except Exception as e:
+            failed.append("the upload of %s was not retried: %s" % (paths[0], str(e)))
+        if vc.datastore_failures:
+            failed.append("the datastore did not fail the upload of %s" % paths[0])
+        vcenter = settings.VCENTER_SERVERS[VCENTER]
+        status, headers, content = vm_mgmt_iso.request(
+            vcenter, "GET", vm_mgmt_iso.iso_path(product, os.path.basename(paths[0])))
+        with open(paths[0], "rb") as f:
+            if status != 200 or content != f.read():
+                failed.append("the datastore does not hold the changed %s" % paths[0])
+
+        for failure in failed:
+            print "FAILED:", failure
+        if failed:
+            sys.exit(1)
+        print "%d ISO(s) uploaded, skipped when unchanged and retried after HTTP 503." % batch
+    return main
+
+
+def console_handlers():
+    # The console handlers of the root logger. logging.basicConfig() binds
+    # them to the sys.stderr of the first run, so every run re-points them.
+    return [h for h in logging.getLogger().handlers
+            if isinstance(h, logging.StreamHandler) and not isinstance(h, logging.FileHandler)]
+
+
+def run(main, name, args, vc, log_path):
+    # Runs main() of a script as if from the command line, with a fresh
+    # session as a new process would. Returns (seconds, exit code, stats).
+    vm_mgmt_session.close_all()
+    vm_mgmt_config.evict()
+    before = vc.stats()
+    stdout, stderr, argv = sys.stdout, sys.stderr, sys.argv
+    code = 0
+    start = time.time()
+    with open(log_path, "w") as log:
+        sys.stdout = sys.stderr = log
+        sys.argv = [name] + args
+        for handler in console_handlers():
+            handler.stream = log
+        try:
+            main()
+        except SystemExit as e:
+            code = e.code or 0
+        except Exception as e:
+            print "Exception:", str(e)
+            code = 1
+        finally:
+            sys.stdout, sys.stderr, sys.argv = stdout, stderr, argv
+            for handler in console_handlers():
+                handler.stream = stderr
+    elapsed = time.time() - start
+    after = vc.stats()
+    calls = dict([(method, count - before["calls"].get(method, 0))
+                  for method, count in after["calls"].items() if count > before["calls"].get(method, 0)])
+    return elapsed, code, {"calls": calls,
+                           "round_trips": after["round_trips"] - before["round_trips"],
+                           "bytes_in": after["bytes_in"] - before["bytes_in"],
+                           "bytes_out": after["bytes_out"] - before["bytes_out"]}
+
+
+def report(rows):
+    print
+    print "%-8s %6s %10s %6s %8s %10s %10s %8s" % (
+        "Scenario", "Batch", "Wall (s)", "Exit", "Calls", "KB sent", "KB recv", "Per min")
+    for scenario, batch, elapsed, code, stats in rows:
+        print "%-8s %6d %10.2f %6d %8d %10.1f %10.1f %8.1f" % (
+            scenario, batch, elapsed, code, stats["round_trips"], stats["bytes_in"] / 1024.0,
+            stats["bytes_out"] / 1024.0, batch * 60.0 / max(elapsed, 0.001))
+    print
+    print "Calls per method (SOAP and HTTP):"
+    for scenario, batch, elapsed, code, stats in rows:
+        print "  %s/%d: %s" % (scenario, batch, ", ".join(
+            ["%s=%d" % (method, count) for method, count in sorted(stats["calls"].items())]))
+
+
+def main():
+    opts = options()
+
+    work_dir = opts.work_dir or tempfile.mkdtemp(prefix="vm-mgmt-benchmark-")
+    if not os.path.isdir(work_dir):
+        os.makedirs(work_dir)
+    vc = vm_mgmt_fakevc.FakeVCenter(hosts=opts.hosts, latency=opts.latency, task_time=opts.task_time,
+                                    boot_time=opts.boot_time, install_time=opts.install_time)
+    url = vc.start()
+    print "Fake vCenter listening on", url
+    configure(url, work_dir)
+    scripts = load_scripts()
+
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    rows = []
+    try:
+        for batch in opts.batch_sizes:
+            for scenario in opts.scenarios:
+                log_path = os.path.join(work_dir, "%s-%d.log" % (scenario, batch))
+                if scenario == "iso":
+                    elapsed, code, stats = run(iso_checks(vc, work_dir, batch), "iso", [], vc, log_path)
+                    print "iso of %d ISO(s): %.2f seconds, exit code %d, %d datastore calls." % (
+                        batch, elapsed, code, stats["round_trips"])
+                else:
+                    elapsed, code, stats = run(scripts[scenario].main, SCRIPTS[scenario],
+                                               arguments(scenario, opts, work_dir, batch), vc, log_path)
+                    print "%s of %d VM(s): %.2f seconds, exit code %d, %d SOAP calls." % (
+                        scenario, batch, elapsed, code, stats["round_trips"])
+                rows.append((scenario, batch, elapsed, code, stats))
+    finally:
+        os.chdir(cwd)
+        vm_mgmt_session.close_all()
+        vc.stop()
+
+    report(rows)
+    if not opts.work_dir:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if [row for row in rows if row[3]]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -15,22 +15,38 @@
 #
 # ==============================================================================
 
+import os
 import re
 import sys
+import uuid
+import fcntl
+import socket
 import settings
+import subprocess
+import vm_mgmt_catalog
+import vm_mgmt_config
+import vm_mgmt_inventory
+import vm_mgmt_placement
+import vm_mgmt_properties
+import vm_mgmt_registry
+import vm_mgmt_session
+import vm_mgmt_spec
+import vm_mgmt_tasks
+import vm_mgmt_trace
+import vm_mgmt_workers
+from collections import namedtuple
+from contextlib import contextmanager
 from optparse import OptionParser
-from pysphere import VIServer, VIProperty
+from pysphere.vi_mor import MORTypes
 from pysphere.resources import VimService_services as VI
-from pysphere.vi_task import VITask
 
 
 def options():
-    parser = OptionParser()
-    parser.add_option("--type", dest="type", choices=settings.VM_TYPES.keys(
-    ), help="Type of the VM. This has some defaults (name, hostname, datastore) which can be overridden with the other options. Supported choices: " + str(settings.VM_TYPES.keys()))
+    parser = OptionParser(option_class=vm_mgmt_catalog.Option)
+    parser.add_option("--type", dest="type", type="key", mapping=settings.VM_TYPES, help="Type of the VM. This has some defaults (name, hostname, datastore) which can be overridden with the other options. " + vm_mgmt_catalog.choices_help(settings.VM_TYPES))
     parser.add_option(
-        "--vcenter", dest="vcenter", type="choice", choices=settings.VCENTER_SERVERS.keys(), help="Choose a vCenter configuration. Supported choices: " + str(settings.VCENTER_SERVERS.keys()))
-    parser.add_option("--disksize", dest="disksize", default="41943040", help="Disk size for VM (in KB.). Default=40GB.")
+        "--vcenter", dest="vcenter", type="key", mapping=settings.VCENTER_SERVERS, help="Choose a vCenter configuration. " + vm_mgmt_catalog.choices_help(settings.VCENTER_SERVERS))
+    parser.add_option("--disksize", dest="disksize", type="int", help="Disk size for VM (in KB.). Default=the disk size of --type, else 40GB.")
     parser.add_option("--mac", dest="mac", default=None, help="MAC address to use - for example in the case of a rebuild.")
     parser.add_option("--name", dest="name", help="Name for this VM.")
     parser.add_option("--notes", dest="notes", help="Description of this VM.")
@@ -39,17 +55,43 @@ def options():
     parser.add_option("--ram", dest="ram", type="int", help="RAM size for this VM.")
     parser.add_option("--cpus", dest="cpus", type="int", help="Number of CPUs for this VM.")
     parser.add_option("--datastore", dest="datastore",
-                      help="Datastore to use for this VM (a substring can be supplied, the first match will be used.)")
+                      help="Datastore holding the ISO. Unless --datastore-filter or --datastore-regex is given, VMs created from scratch are stored on it too and clones stay on the datastore of the template.")
+    parser.add_option("--datastore-filter", dest="datastore_filter",
+                      help="Store the VM on the best datastore (most free space, least provisioned, fewest VMs being placed by this run) whose name contains this substring.")
+    parser.add_option("--datastore-regex", dest="datastore_regex",
+                      help="Like --datastore-filter, with a regular expression searched in the datastore names.")
+    parser.add_option("--schedule-hosts", dest="schedule_hosts", default=False, action="store_true",
+                      help="Choose the ESXi host of every VM by weighing its RAM and CPUs against the CPU and memory load of the hosts (the host left with the most headroom wins), instead of using the configured host (clones: the template's host). Clones stay within the cluster of the template.")
     parser.add_option("--iso", dest="iso",
                       help="ISO file path relateive to Datastore.")
     parser.add_option("-t", "--test", dest="test", default=False, action="store_true", help="Test")
     parser.add_option("--user", dest="user", help="Username to connect to ESX Server.")
     parser.add_option("--pass", dest="passwd", help="Password to connect to ESX Server.")
     parser.add_option("--esx-host", dest="esx_host", help="Hostname of ESX Server to connect to.")
-    parser.add_option("--network-adapter", dest="vm_network_adapter", help="Name of the Network interface to which the VM has to be connected to. Supported choices: " +
-                      str(settings.NETWORK_ADAPTER.keys()))
+    parser.add_option("--network-adapter", dest="vm_network_adapter", type="key", mapping=settings.NETWORK_ADAPTER,
+                      help="Type of the network adapter of the VM. Default=the one of its hardware profile. " +
+                      vm_mgmt_catalog.choices_help(settings.NETWORK_ADAPTER))
+    parser.add_option("--hardware-profile", dest="hardware_profile", type="key", mapping=settings.HARDWARE_PROFILES,
+                      help="Virtual hardware (network adapter, SCSI controller, CPU topology, disk provisioning) of VMs created from scratch. Default=the profile of --type in VM_HARDWARE_PROFILES, else " +
+                      settings.DEFAULT_HARDWARE_PROFILE + ". " + vm_mgmt_catalog.choices_help(settings.HARDWARE_PROFILES))
+    parser.add_option("--from-scratch", dest="from_scratch", default=False, action="store_true",
+                      help="Create the VM from scratch, with the virtual hardware of its profile, instead of cloning the template.")
     parser.add_option("--datacentername", dest="datacentername", help="Name of the datacenter.")
     parser.add_option("--template", dest="template", help="Name of the template.")
+    parser.add_option("--manifest", dest="manifest",
+                      help="Fleet mode: file listing the VMs to be cloned, one per line as '<name> <vm-type> <iso-path> [<vcenter>]'. Lines starting with '#' are ignored.")
+    parser.add_option("--workers", dest="workers", type="int", default=8,
+                      help="Fleet mode: number of VMs provisioned in parallel. Default=8.")
+    parser.add_option("--linked-clone", dest="linked_clone", default=False, action="store_true",
+                      help="Create a linked clone (delta disks) from a snapshot of the template instead of copying its disks. Falls back to a full clone when that is not possible.")
+    parser.add_option("--snapshot", dest="snapshot", default=settings.LINKED_CLONE_SNAPSHOT,
+                      help="Snapshot of the template the linked clones are based on. It is taken if the template does not have it. Default=" + settings.LINKED_CLONE_SNAPSHOT + ".")
+    parser.add_option("--pool-fill", dest="pool_fill", default=False, action="store_true",
+                      help="Warm pool: clone powered off VMs until the pool of every VM type (or only --type) holds --pool-size VMs, then exit.")
+    parser.add_option("--pool-take", dest="pool_take", default=False, action="store_true",
+                      help="Warm pool: hand out a pooled VM of --type as --name, booting it from --iso. A regular clone is made when the pool is empty. The pool is refilled in the background.")
+    parser.add_option("--pool-size", dest="pool_size", type="int", default=settings.WARM_POOL_SIZE,
+                      help="Warm pool: number of VMs kept ready per VM type. Default=" + str(settings.WARM_POOL_SIZE) + ".")
 
     opts, args = parser.parse_args()
 
@@ -79,13 +121,31 @@ def options():
         opts.cpus = opts.cpus or vmtype.cpus
         opts.disksize = opts.disksize or vmtype.disksize
 
+    if not opts.hardware_profile:
+        opts.hardware_profile = settings.VM_HARDWARE_PROFILES.get(opts.type, settings.DEFAULT_HARDWARE_PROFILE)
     if not opts.vm_network_adapter:
-        opts.vm_network_adapter = "VMXNET3"
+        opts.vm_network_adapter = settings.HARDWARE_PROFILES[opts.hardware_profile].nic
 
     opts.ram = opts.ram or 4096
     opts.cpus = opts.cpus or 2
+    opts.disksize = opts.disksize or settings.DISK_40GB
 
-    if not opts.iso:
+    if opts.datastore_regex:
+        try:
+            re.compile(opts.datastore_regex)
+        except re.error as e:
+            print "Invalid --datastore-regex:", str(e)
+            sys.exit(1)
+
+    if opts.from_scratch and (opts.manifest or opts.pool_fill or opts.pool_take):
+        print "--from-scratch cannot be combined with --manifest, --pool-fill or --pool-take."
+        sys.exit(1)
+
+    if opts.pool_take and not type_present:
+        print "Cannot take a VM from the warm pool without its type. Use --type."
+        sys.exit(1)
+
+    if not opts.iso and not opts.manifest and not opts.pool_fill:
         print "Cannot continue without ISO path. Use --iso <iso-path-relative-to-datastore>."
         sys.exit(1)
 
@@ -103,105 +163,87 @@ def options():
     return opts
 
 
-def connect_vm_cdroms(vm, server):
-    connected_cdroms = []
-    for dev in vm.properties.config.hardware.device:
-        if dev._type == "VirtualCdrom":
-        # and dev.connectable.connected:
-        # if dev._type == "VirtualCdrom" and dev.connectable.startConnected:
-            d = dev._obj
-            d.Connectable.set_element_connected(True)
-            d.Connectable.set_element_startConnected(True)
-            connected_cdroms.append(d)
+def power_on_vm(s, vm_mor):
+    # Powers the VM on without loading all of its properties first.
+    request = VI.PowerOnVM_TaskRequestMsg()
+    _this = request.new__this(vm_mor)
+    _this.set_attribute_type(vm_mor.get_attribute_type())
+    request.set_element__this(_this)
+    with vm_mgmt_trace.span("power-on"):
+        vm_mgmt_tasks.wait_for_task(s._proxy.PowerOnVM_Task(request)._returnval, s)
 
-    if not connected_cdroms:
-        print "%s: has no connected cd roms" % vm.properties.name
-        return
 
-    request = VI.ReconfigVM_TaskRequestMsg()
-    _this = request.new__this(vm._mor)
-    _this.set_attribute_type(vm._mor.get_attribute_type())
-    request.set_element__this(_this)
-    spec = request.new_spec()
-    dev_changes = []
-
-    for dev in connected_cdroms:
-        dev_change = spec.new_deviceChange()
-        dev_change.set_element_device(dev)
-        dev_change.set_element_operation("edit")
-        dev_changes.append(dev_change)
-
-    spec.set_element_deviceChange(dev_changes)
-    request.set_element_spec(spec)
-    ret = server._proxy.ReconfigVM_Task(request)._returnval
-    # Wait for the task to finish
-    # Remove all this section if you don't wish to wait for the task to finish
-    task = VITask(ret, server)
-    status = task.wait_for_state([task.STATE_SUCCESS, task.STATE_ERROR])
-    if status == task.STATE_SUCCESS:
-        print "%s: successfully reconfigured" % vm.properties.name
-    elif status == task.STATE_ERROR:
-        print "%s: Error reconfiguring vm" % vm.properties.name
-
-
-def change_cdrom_type(dev, dev_type, value=""):
-    if dev_type == "ISO":
-        iso = VI.ns0.VirtualCdromIsoBackingInfo_Def("iso").pyclass()
-        iso.set_element_fileName(value)
-        dev.set_element_backing(iso)
-    elif dev_type == "HOST DEVICE":
-        host = VI.ns0.VirtualCdromAtapiBackingInfo_Def("host").pyclass()
-        host.set_element_deviceName(value)
-        dev.set_element_backing(host)
-    elif dev_type == "CLIENT DEVICE":
-        client = VI.ns0.VirtualCdromRemoteAtapiBackingInfo_Def("client").pyclass()
-        client.set_element_deviceName("")
-        dev.set_element_backing(client)
-
-
-def get_valid_host_devices(vm):
+def get_valid_host_devices(vm, server):
     env_browser = vm.properties.environmentBrowser._obj
-    request = VI.QueryConfigTargetRequestMsg()
-    _this = request.new__this(env_browser)
-    _this.set_attribute_type(env_browser.get_attribute_type())
-    request.set_element__this(_this)
-    ret = server._proxy.QueryConfigTarget(request)._returnval
+    ret = vm_mgmt_config.query_config_target(server, env_browser)
     return [cd.Name for cd in ret.CdRom]
 
 
-def apply_changes(vm, server, cdrom):
-    request = VI.ReconfigVM_TaskRequestMsg()
-    _this = request.new__this(vm._mor)
-    _this.set_attribute_type(vm._mor.get_attribute_type())
-    request.set_element__this(_this)
-    spec = request.new_spec()
-    dev_change = spec.new_deviceChange()
-    dev_change.set_element_device(cdrom)
-    dev_change.set_element_operation("edit")
-    spec.set_element_deviceChange([dev_change])
-    request.set_element_spec(spec)
-    ret = server._proxy.ReconfigVM_Task(request)._returnval
-    task = VITask(ret, server)
-    status = task.wait_for_state([task.STATE_SUCCESS, task.STATE_ERROR])
-    if status == task.STATE_SUCCESS:
-        print "%s: successfully reconfigured" % vm.properties.name
-    elif status == task.STATE_ERROR:
-        print "%s: Error reconfiguring vm" % vm.properties.name
-
-
-def create_vm():
-    opts = options()
-
-    # CONNECTION PARAMTERS
-    server = opts.esx_host
-    user = opts.user
-    password = opts.passwd
+def query_host_config(s, placement):
+    # get config target and default devices (memoized per host)
+    envmor = placement["environment_browser"]
+    hostmor = placement["host"]
+    config_target = vm_mgmt_config.query_config_target(s, envmor, hostmor)
+    config_option = vm_mgmt_config.query_config_option(s, envmor, hostmor)
+    return config_target, config_option
+
+
+NIC_DEVICES = {
+    "E1000": "VirtualE1000",
+    "VMXNET2": "VirtualVmxnet2",
+    "VMXNET3": "VirtualVmxnet3",
+}
+
+SCSI_CONTROLLERS = {
+    "pvscsi": "ParaVirtualSCSIController",
+    "lsilogic": "VirtualLsiLogicController",
+    "lsilogic-sas": "VirtualLsiLogicSASController",
+    "buslogic": "VirtualBusLogicController",
+}
+
+
+def cores_per_socket(cpus, cores):
+    # The largest number of cores per socket up to 'cores' (0: all vCPUs)
+    # that divides the vCPUs into whole sockets.
+    cores = min(cores or cpus, cpus)
+    while cpus % cores:
+        cores -= 1
+    return cores
+
+
+def schedule_hosts(s, vcenter_key, datacentername, requests, compute_resource=None):
+    # Spreads the VMs of 'requests', (key, ram MB, vCPUs) tuples, over the
+    # hosts of the datacenter (or of one compute resource of it) by their
+    # current load. Returns {key: (host_info, placement)}; VMs no host has
+    # room for are left out.
+    with vm_mgmt_trace.span("schedule-hosts", vms=len(requests)):
+        for refresh in (False, True):
+            index = vm_mgmt_inventory.get_placement_index(s, vcenter_key, refresh).get(datacentername, {})
+            placements = dict([(str(p["host"]), p) for p in index.values()
+                               if not compute_resource or str(p["compute_resource"]) == str(compute_resource)])
+            if not placements and not refresh:
+                # The hosts may have been added after the index was cached.
+                continue
+            try:
+                hosts = vm_mgmt_placement.host_loads(s, [p["host"] for p in placements.values()])
+                break
+            except Exception as e:
+                if refresh or not vm_mgmt_inventory.is_stale_moref_error(e):
+                    raise
+                vm_mgmt_inventory.invalidate(vcenter_key)
+        plan = vm_mgmt_placement.host_scheduler.plan(hosts, requests)
+        return dict([(key, (host, placements[str(host.mor)])) for key, host in plan.items() if host])
+
+
+def create_vm(s, opts):
+    # Creates the VM from scratch, with the virtual hardware of its profile,
+    # instead of cloning the template, and boots it from the ISO.
 
     # REQUIRED PARAMETERS
     vmname = opts.name
     # datacentername = "ha-datacenter"
     datacentername = opts.datacenter
-    hostname = opts.hostname
+    hostname = opts.esx_hostname  # the ESXi host the VM is created on
     annotation = "My Product Product Virtual Machine"
     memorysize = opts.ram
     cpucount = opts.cpus
@@ -212,79 +254,42 @@ def create_vm():
     guestosid = "centos64Guest"
     # find your os in
     # http://www.vmware.com/support/developer/vc-sdk/visdk41pubs/ApiReference/vim.vm.GuestOsDescriptor.GuestOsIdentifier.html
-    disksize = (1024 ** 2) * 100  # In Kb: 1024 ** 2 (power) = 1GB; 1GB * 100 = 100GB.
+    disksize = int(opts.disksize)  # In KB.
+    profile = settings.HARDWARE_PROFILES[opts.hardware_profile]
 
     # OPTIONAL PARAMETERS
 
     datastorename = opts.datastore  # if None, will use the first datastore available
 
-    # CONNECT TO THE SERVER
-    s = VIServer()
-    s.connect(server, user, password)
-
     # GET INITIAL PROPERTIES AND OBJECTS
-
-     # get datacenter
-    dcmor = s._get_datacenters()[datacentername]
-    dcprops = VIProperty(s, dcmor)
-     # get host folder
-    hfmor = dcprops.hostFolder._obj
-
-     # get computer resources
-    crmors = s._retrieve_properties_traversal(property_names=['name',
-                                                              'host'], from_node=hfmor, obj_type='ComputeResource')
-
-     # get host
-    for hosts in s.get_hosts().items():
-        try:
-            if hosts.index(hostname) == 1:
-                hostmor = hosts[0]
-        except:
-            pass
-
-    # get computer resource of this host
-    crmor = None
-    for cr in crmors:
-        if crmor:
-            break
-        for p in cr.PropSet:
-            # print 'p.Name:', p.Name
-            if p.Name == "host":
-                for h in p.Val.get_element_ManagedObjectReference():
-                    if h == hostmor:
-                        crmor = cr.Obj
-                        break
-                if crmor:
-                    break
-    crprops = VIProperty(s, crmor)
-
-     # get resource pool
-    rpmor = crprops.resourcePool._obj
-
-     # get vmFolder
-    vmfmor = dcprops.vmFolder._obj
+    # (from the inventory cache when available)
+    scheduled_host = None
+    with vm_mgmt_trace.span("placement"):
+        if opts.schedule_hosts:
+            scheduled = schedule_hosts(s, opts.vcenter, datacentername, [(vmname, memorysize, cpucount)])
+            if vmname not in scheduled:
+                raise Exception("no host of datacenter %s has room for %s" % (datacentername, vmname))
+            scheduled_host, placement = scheduled[vmname]
+            hostname = scheduled_host.name
+        else:
+            placement = vm_mgmt_inventory.get_placement(s, opts.vcenter, datacentername, hostname)
 
     # CREATE VM CONFIGURATION
-
-     # get config target
-    request = VI.QueryConfigTargetRequestMsg()
-    _this = request.new__this(crprops.environmentBrowser._obj)
-    _this.set_attribute_type(crprops.environmentBrowser._obj.get_attribute_type())
-    request.set_element__this(_this)
-    h = request.new_host(hostmor)
-    h.set_attribute_type(hostmor.get_attribute_type())
-    request.set_element_host(h)
-    config_target = s._proxy.QueryConfigTarget(request)._returnval
-
-     # get default devices
-    request = VI.QueryConfigOptionRequestMsg()
-    _this = request.new__this(crprops.environmentBrowser._obj)
-    _this.set_attribute_type(crprops.environmentBrowser._obj.get_attribute_type())
-    request.set_element__this(_this)
-    h = request.new_host(hostmor)
-    h.set_attribute_type(hostmor.get_attribute_type())
-    request.set_element_host(h)
-    config_option = s._proxy.QueryConfigOption(request)._returnval
+    with vm_mgmt_trace.span("config-query"):
+        try:
+            config_target, config_option = query_host_config(s, placement)
+        except Exception as e:
+            if not vm_mgmt_inventory.is_stale_moref_error(e):
+                raise
+            # The cached morefs are stale. Rediscover them and try again.
+            vm_mgmt_inventory.invalidate(opts.vcenter)
+            vm_mgmt_config.evict(placement["environment_browser"])
+            placement = vm_mgmt_inventory.get_placement(s, opts.vcenter, datacentername, hostname, refresh=True)
+            config_target, config_option = query_host_config(s, placement)
+
+    hostmor = placement["host"]
+    rpmor = placement["resource_pool"]
+    vmfmor = placement["vm_folder"]
     defaul_devs = config_option.DefaultDevice
 
     # get network name
@@ -298,18 +303,23 @@ def create_vm():
     # can hard-code it as 'VM Network'
 
     # get datastore
-    # Just verifies that the datastorename mentioned at the top matches with the
-    # available list of datastores.
-    ds = None
-    for d in config_target.Datastore:
-        if d.Datastore.Accessible and (datastorename and d.Datastore.Name
-                                       == datastorename) or (not datastorename):
-            ds = d.Datastore.Datastore
-            datastorename = d.Datastore.Name
-            break
-    if not ds:
+    # The best of the candidate datastores by free space, provisioned ratio
+    # and VMs still being placed on it by this process.
+    datastores = vm_mgmt_placement.datastores_from_config_target(config_target)
+    if opts.datastore_filter or opts.datastore_regex:
+        candidates = vm_mgmt_placement.matching(datastores, substring=opts.datastore_filter,
+                                                regex=opts.datastore_regex)
+    else:
+        candidates = vm_mgmt_placement.matching(datastores, name=datastorename)
+    disk_bytes = disksize * 1024
+    chosen = vm_mgmt_placement.datastore_placer.choose(
+        vm_mgmt_placement.refresh_datastores(s, candidates), disk_bytes)
+    if not chosen:
         raise Exception("couldn't find datastore")
-    volume_name = "[%s]" % datastorename
+    volume_name = "[%s]" % chosen.name
+
+    # The ISO stays where it is, on the datastore given by --datastore.
+    iso_ds = ([d for d in datastores if d.name == datastorename] or [chosen])[0]
 
      # add parameters to the create vm task
     create_vm_request = VI.CreateVM_TaskRequestMsg()
@@ -321,6 +331,7 @@ def create_vm():
     config.set_element_annotation(annotation)
     config.set_element_memoryMB(memorysize)
     config.set_element_numCPUs(cpucount)
+    config.set_element_numCoresPerSocket(cores_per_socket(cpucount, profile.cores_per_socket))
     config.set_element_guestId(guestosid)
     devices = []
 
@@ -328,7 +339,7 @@ def create_vm():
     disk_ctrl_key = 1
     scsi_ctrl_spec = config.new_deviceChange()
     scsi_ctrl_spec.set_element_operation('add')
-    scsi_ctrl = VI.ns0.VirtualLsiLogicController_Def("scsi_ctrl").pyclass()
+    scsi_ctrl = getattr(VI.ns0, SCSI_CONTROLLERS[profile.scsi_controller] + "_Def")("scsi_ctrl").pyclass()
     scsi_ctrl.set_element_busNumber(0)
     scsi_ctrl.set_element_key(disk_ctrl_key)
     scsi_ctrl.set_element_sharedBus("noSharing")
@@ -348,12 +359,14 @@ def create_vm():
         cd_spec.set_element_operation('add')
         cd_ctrl = VI.ns0.VirtualCdrom_Def("cd_ctrl").pyclass()
         cd_device_backing = VI.ns0.VirtualCdromIsoBackingInfo_Def("cd_device_backing").pyclass()
-        ds_ref = cd_device_backing.new_datastore(ds)
-        ds_ref.set_attribute_type(ds.get_attribute_type())
+        ds_ref = cd_device_backing.new_datastore(iso_ds.mor)
+        ds_ref.set_attribute_type(iso_ds.mor.get_attribute_type())
         cd_device_backing.set_element_datastore(ds_ref)
-        cd_device_backing.set_element_fileName("%s %s" % (volume_name,
-                                                          cd_iso_location))
+        cd_device_backing.set_element_fileName("[%s] %s" % (iso_ds.name,
+                                                            cd_iso_location))
         cd_ctrl.set_element_backing(cd_device_backing)
+        # Connected from the start, so the VM boots from the ISO right away.
+        cd_ctrl.set_element_connectable(vm_mgmt_spec.connect_info(True))
         cd_ctrl.set_element_key(20)
         cd_ctrl.set_element_controllerKey(ide_ctlr.get_element_key())
         cd_ctrl.set_element_unitNumber(0)
@@ -368,7 +381,9 @@ def create_vm():
     disk_backing = VI.ns0.VirtualDiskFlatVer2BackingInfo_Def("disk_backing").pyclass()
     disk_backing.set_element_fileName(volume_name)
     disk_backing.set_element_diskMode("persistent")
-    disk_backing.ThinProvisioned = True
+    disk_backing.set_element_thinProvisioned(profile.disk_provisioning == "thin")
+    if profile.disk_provisioning == "eagerzeroedthick":
+        disk_backing.set_element_eagerlyScrub(True)
     disk_ctlr.set_element_key(0)
     disk_ctlr.set_element_controllerKey(disk_ctrl_key)
     disk_ctlr.set_element_unitNumber(0)
@@ -381,7 +396,7 @@ def create_vm():
     nic_spec = config.new_deviceChange()
     if network_name:
         nic_spec.set_element_operation("add")
-        nic_ctlr = VI.ns0.VirtualPCNet32_Def("nic_ctlr").pyclass()
+        nic_ctlr = getattr(VI.ns0, NIC_DEVICES[opts.vm_network_adapter] + "_Def")("nic_ctlr").pyclass()
         nic_backing = VI.ns0.VirtualEthernetCardNetworkBackingInfo_Def("nic_backing").pyclass()
         nic_backing.set_element_deviceName(network_name)
         nic_ctlr.set_element_addressType("generated")
@@ -403,38 +418,435 @@ def create_vm():
     create_vm_request.set_element_host(host_mor)
 
     # CREATE THE VM
-    taskmor = s._proxy.CreateVM_Task(create_vm_request)._returnval
-    task = VITask(taskmor, s)
-    task.wait_for_state([task.STATE_SUCCESS, task.STATE_ERROR])
-
-    if task.get_state() == task.STATE_ERROR:
-        raise Exception("Error creating vm: %s" %
-                        task.get_error_message())
+    try:
+        with vm_mgmt_trace.span("create-task"):
+            try:
+                taskmor = s._proxy.CreateVM_Task(create_vm_request)._returnval
+            except Exception as e:
+                if vm_mgmt_inventory.is_stale_moref_error(e):
+                    vm_mgmt_inventory.invalidate(opts.vcenter)
+                raise
+            try:
+                vm_mor = vm_mgmt_tasks.wait_for_task(taskmor, s)
+            except Exception as e:
+                raise Exception("Error creating vm: %s" % str(e))
+    except Exception:
+        if scheduled_host:
+            vm_mgmt_placement.host_scheduler.release(scheduled_host, memorysize, cpucount)
+        raise
+    finally:
+        vm_mgmt_placement.datastore_placer.release(chosen, disk_bytes)
 
     # Here you should power your VM (refer to the pysphere documentation)
     # So it boots from the specified ISO location
     try:
-        new_vm = s.get_vm_by_name(opts.name)
-        connect_vm_cdroms(new_vm, s)
+        power_on_vm(s, vm_mor)
+    except Exception as e:
+        print "Failed to power-on the new VM using:", opts.name
+        print "Exception:", str(e)
+
+
+fleet_entry = namedtuple("fleet_entry", ["name", "type", "iso", "vcenter", "datastore", "template"])
+
+
+def linked_clone_snapshot(template_vm, snapshot_name):
+    # Returns the name of the snapshot linked clones of template_vm are based
+    # on, taking the snapshot if it does not exist yet. Returns None when it
+    # does not exist and cannot be taken (e.g. the VM is marked as template).
+    template_vm.refresh_snapshot_list()
+    if snapshot_name in [sn.get_name() for sn in template_vm.get_snapshots()]:
+        return snapshot_name
+    try:
+        template_vm.create_snapshot(snapshot_name, memory=False, quiesce=False,
+                                    description="Base of the linked clones created by vm-mgmt-create.py.")
+        template_vm.refresh_snapshot_list()
+        return snapshot_name
+    except Exception as e:
+        print "Could not take the snapshot %s of the template: %s" % (snapshot_name, str(e))
+        return None
+
+
+def clone_datastores(s, template_vm, opts):
+    # The datastores clones of the template may be placed on, or None to
+    # leave them on the datastore of the template (no filter given).
+    if not opts.datastore_filter and not opts.datastore_regex:
+        return None
+    config_target = vm_mgmt_config.query_config_target(s, template_vm.properties.environmentBrowser._obj)
+    datastores = vm_mgmt_placement.matching(
+        vm_mgmt_placement.datastores_from_config_target(config_target),
+        substring=opts.datastore_filter, regex=opts.datastore_regex)
+    if not datastores:
+        raise Exception("no datastore of the template's host matches the datastore filter")
+    return datastores
+
+
+def template_cluster(template_vm):
+    # The compute resource of the template's host. Scheduled clones stay
+    # within it, where the template's datastores are visible.
+    return template_vm.properties.runtime.host.parent._obj
+
+
+def clone_vm(s, template_vm, vmname, snapshot=None, config=None, power_on=False,
+             datastores=None, size=0, placement=None):
+    # Clone the template, applying 'config' (a vm_mgmt_spec.ConfigSpec)
+    # within the clone task. With 'snapshot' the clone is a linked clone
+    # sharing the disks of that snapshot, so its cost does not depend on the
+    # size of the template. With 'datastores' the clone is placed on the best
+    # of them for a VM of 'size' bytes. With 'placement' (see
+    # schedule_hosts()) it runs on that host. Returns the moref of the new VM.
+    def place_and_clone(snapshot, size):
+        chosen = None
+        if datastores:
+            chosen = vm_mgmt_placement.datastore_placer.choose(
+                vm_mgmt_placement.refresh_datastores(s, datastores), size)
+            if not chosen:
+                raise Exception("no datastore has room for %s" % vmname)
         try:
-            new_vm.power_on()
+            with vm_mgmt_trace.span("clone-task", vm=vmname, linked=bool(snapshot)):
+                return vm_mgmt_tasks.wait_for_task(
+                    vm_mgmt_spec.clone(s, template_vm, vmname, config, snapshot, power_on,
+                                       chosen and chosen.mor, placement and placement["host"],
+                                       placement and placement["resource_pool"]), s)
+        finally:
+            if chosen:
+                vm_mgmt_placement.datastore_placer.release(chosen, size)
+
+    if snapshot:
+        try:
+            # Only the delta disks are written.
+            return place_and_clone(snapshot, 0)
         except Exception as e:
-            print "Failed to power-on the new VM using:", opts.name
+            print "%s: linked clone failed (%s). Falling back to a full clone." % (vmname, str(e))
+    return place_and_clone(None, size)
+
+
+def iso_config(config, vmname, datastorename, cd_iso_location):
+    # Adds to the ConfigSpec 'config' the changes that make the VM (or a
+    # clone of the template) boot from the ISO.
+    if not config.set_cdrom_backing("ISO", "[%s] %s" % (datastorename, cd_iso_location)):
+        raise Exception("%s: has no cd rom to attach the ISO to" % vmname)
+    config.set_cdrom_connected(True)
+    return config
+
+
+def boot_from_iso(s, vm_mor, vmname, datastorename, cd_iso_location):
+    # Point the CD-ROM of an existing VM at the ISO and connect it with one
+    # reconfiguration, then power on. Only the CD-ROMs of the VM are fetched.
+    try:
+        with vm_mgmt_trace.span("reconfigure", vm=vmname):
+            config = iso_config(vm_mgmt_spec.for_vm_mor(s, vm_mor, ["VirtualCdrom"]),
+                                vmname, datastorename, cd_iso_location)
+            vm_mgmt_tasks.wait_for_task(vm_mgmt_spec.reconfigure(s, vm_mor, config), s)
+    except Exception as e:
+        raise Exception("%s: failed to attach %s: %s" % (vmname, cd_iso_location, str(e)))
+    power_on_vm(s, vm_mor)
+    return vm_mor
+
+
+def provision_vm(s, template_vm, vmname, datastorename, cd_iso_location, snapshot=None, notes=None,
+                 datastores=None, size=0, placement=None, memory_mb=None, cpus=None):
+    # A single clone task attaches and connects the ISO, sets the memory and
+    # CPUs (those the host was scheduled for) and powers the new VM on, so it
+    # boots from the ISO.
+    config = iso_config(vm_mgmt_spec.for_vm(template_vm), vmname, datastorename, cd_iso_location)
+    config.set_hardware(memory_mb, cpus)
+    if notes:
+        config.set_annotation(notes)
+    return clone_vm(s, template_vm, vmname, snapshot, config, power_on=True,
+                    datastores=datastores, size=size, placement=placement)
+
+
+# Start of the annotation of a pooled VM that has been taken.
+POOL_CLAIM_NOTE = "Taken from the warm pool of"
+
+
+def pool_prefix(vmtype):
+    return "%s-%s-" % (settings.WARM_POOL_PREFIX, vmtype)
+
+
+def pool_members(s, vmtype):
+    # (name, moref) of the pooled VMs of the type, found with one traversal.
+    prefix = pool_prefix(vmtype)
+    return sorted([(name, mor) for mor, name in s._get_managed_objects(MORTypes.VirtualMachine).items()
+                   if name.startswith(prefix)])
+
+
+@contextmanager
+def pool_lock(vmtype, action, blocking=True):
+    # Serializes the pool operations of all the processes on this machine.
+    # Yields False if 'blocking' is False and another process holds the lock.
+    if not os.path.isdir(settings.CACHE_FOLDER):
+        os.makedirs(settings.CACHE_FOLDER)
+    f = open(os.path.join(settings.CACHE_FOLDER, "pool-%s.%s.lock" % (vmtype, action)), "w")
+    try:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            locked = True
+        except IOError:
+            locked = False
+        yield locked
+    finally:
+        f.close()
+
+
+def rename_vm(s, vm_mor, newname):
+    request = VI.Rename_TaskRequestMsg()
+    _this = request.new__this(vm_mor)
+    _this.set_attribute_type(vm_mor.get_attribute_type())
+    request.set_element__this(_this)
+    request.set_element_newName(newname)
+    vm_mgmt_tasks.wait_for_task(s._proxy.Rename_Task(request)._returnval, s)
+
+
+def fill_pool(s, template_vm, vmtype, size, snapshot=None, workers=8, datastores=None):
+    # Clones powered off VMs into the pool of the type until it holds 'size'.
+    with pool_lock(vmtype, "fill", blocking=False) as locked:
+        if not locked:
+            print "The %s pool is already being filled by another process." % vmtype
+            return
+        # Recount after every round: VMs may be taken while we clone.
+        while True:
+            missing = size - len(pool_members(s, vmtype))
+            if missing <= 0:
+                print "The %s pool is full (%d VMs)." % (vmtype, size)
+                return
+            names = [pool_prefix(vmtype) + uuid.uuid4().hex[:8] for i in range(missing)]
+            print "Cloning %d VM(s) into the %s pool ..." % (missing, vmtype)
+            # The clones get the memory and CPUs of the type, not the template's.
+            config = vm_mgmt_spec.ConfigSpec([])
+            config.set_hardware(settings.VM_TYPES[vmtype].ram, settings.VM_TYPES[vmtype].cpus)
+            results = vm_mgmt_workers.run_in_pool(
+                lambda name: clone_vm(s, template_vm, name, snapshot, config, datastores=datastores,
+                                      size=settings.VM_TYPES[vmtype].disksize * 1024),
+                names, workers)
+            failed = [name for name, vm, error in results if error]
+            for name, vm, error in results:
+                if error:
+                    print "  %-40s FAILED  %s" % (name, str(error))
+            if len(failed) == len(names):
+                print "Giving up on the %s pool: no VM could be cloned." % vmtype
+                return
+
+
+def claim_pooled_vm(s, vm_mor, vmtype, vmname):
+    # Marks a pooled VM as taken in its annotation. The reconfiguration
+    # carries the config.changeVersion read with the annotation, so of the
+    # processes claiming the VM at the same time (on any machine) only one
+    # succeeds; the others get a ConcurrentAccess fault. Returns False if
+    # the VM was taken already.
+    props = vm_mgmt_properties.vm_properties(s, [vm_mor], ["config.changeVersion", "config.annotation"]).get(
+        vm_mor, {})
+    if (props.get("config.annotation") or "").startswith(POOL_CLAIM_NOTE):
+        return False
+    config = vm_mgmt_spec.ConfigSpec([])
+    config.set_change_version(props.get("config.changeVersion"))
+    config.set_annotation("%s %s as %s by %s:%d" % (POOL_CLAIM_NOTE, vmtype, vmname, socket.gethostname(),
+                                                    os.getpid()))
+    vm_mgmt_tasks.wait_for_task(vm_mgmt_spec.reconfigure(s, vm_mor, config), s)
+    return True
+
+
+def take_from_pool(s, vmtype, vmname):
+    # Claims a pooled VM of the type and renames it to 'vmname'. Returns the
+    # moref of the VM, or None if the pool is empty. The lock only spares
+    # the processes of this machine failed claims; claim_pooled_vm() is
+    # what makes a claim exclusive.
+    with pool_lock(vmtype, "take"):
+        for name, mor in pool_members(s, vmtype):
+            try:
+                if not claim_pooled_vm(s, mor, vmtype, vmname):
+                    continue
+            except Exception as e:
+                # E.g. it is still being cloned, or was claimed meanwhile.
+                print "Could not claim %s: %s" % (name, str(e))
+                continue
+            try:
+                rename_vm(s, mor, vmname)
+                return mor
+            except Exception as e:
+                print "Could not rename %s to %s: %s" % (name, vmname, str(e))
+                # Give the VM back to the pool.
+                config = vm_mgmt_spec.ConfigSpec([])
+                config.set_annotation("")
+                try:
+                    vm_mgmt_tasks.wait_for_task(vm_mgmt_spec.reconfigure(s, mor, config), s)
+                except Exception:
+                    pass
+    return None
+
+
+def refill_pool_in_background(opts):
+    # The refill runs in a process of its own, so the caller does not wait
+    # for the clones. Its output goes to LOG_FOLDER/pool-<type>.log. It
+    # places the clones under the same constraints as the caller.
+    args = [sys.executable, os.path.abspath(__file__), "--vcenter", opts.vcenter, "--type", opts.type,
+            "--pool-fill", "--pool-size", str(opts.pool_size), "--workers", str(opts.workers)]
+    if opts.datastore_filter:
+        args += ["--datastore-filter", opts.datastore_filter]
+    if opts.datastore_regex:
+        args += ["--datastore-regex", opts.datastore_regex]
+    if opts.linked_clone:
+        args += ["--linked-clone", "--snapshot", opts.snapshot]
+    try:
+        log = open(os.path.join(settings.LOG_FOLDER, "pool-%s.log" % opts.type), "a")
+    except IOError:
+        log = open(os.devnull, "w")
+    subprocess.Popen(args, stdout=log, stderr=log, close_fds=True, preexec_fn=os.setsid)
+    log.close()
+
+
+def read_fleet_manifest(opts):
+    # Resolve every manifest line into a fleet_entry, applying the same
+    # defaults options() applies to a single VM.
+    entries = []
+    for fields in vm_mgmt_workers.read_manifest(opts.manifest):
+        if len(fields) < 3:
+            print "Ignoring malformed manifest line:", " ".join(fields)
+            continue
+
+        vcenter_key = fields[3] if len(fields) > 3 else opts.vcenter
+        if fields[1] not in settings.VM_TYPES:
+            print "Ignoring %s: unknown VM type %s." % (fields[0], fields[1])
+            continue
+        if vcenter_key not in settings.VCENTER_SERVERS:
+            print "Ignoring %s: unknown vCenter %s." % (fields[0], vcenter_key)
+            continue
+
+        vmtype = settings.VM_TYPES[fields[1]]
+        vcenter = settings.VCENTER_SERVERS[vcenter_key]
+        entries.append(fleet_entry(fields[0], fields[1], fields[2], vcenter_key,
+                                   vcenter.datastore or vmtype.datastore, vcenter.template))
+    return entries
+
+
+def fleet(opts):
+    entries = read_fleet_manifest(opts)
+    if not entries:
+        print "Nothing to provision. The manifest %s has no usable entries." % opts.manifest
+        sys.exit(1)
+
+    # One session and one template lookup per vCenter, shared by all workers.
+    sessions = {}
+    templates = {}
+    snapshots = {}
+    datastores = {}
+    scheduled = {}
+    for vcenter_key in set([e.vcenter for e in entries]):
+        vcenter = settings.VCENTER_SERVERS[vcenter_key]
+        with vm_mgmt_trace.span("connect", vcenter=vcenter_key):
+            s = vm_mgmt_session.connect(vcenter_key)
+        sessions[vcenter_key] = s
+        try:
+            with vm_mgmt_trace.span("template", vcenter=vcenter_key):
+                # Loads the whole property tree of the template, including
+                # the devices and the folder the workers read, with one call.
+                templates[vcenter_key] = s.get_vm_by_name(vcenter.template)
+        except Exception as e:
+            print "Failed to locate the template %s on %s." % (vcenter.template, vcenter_key)
+            print "Exception:", str(e)
+            templates.pop(vcenter_key, None)
+            continue
+        if opts.linked_clone:
+            # Taken once here rather than by every worker.
+            snapshots[vcenter_key] = linked_clone_snapshot(templates[vcenter_key], opts.snapshot)
+        try:
+            datastores[vcenter_key] = clone_datastores(s, templates[vcenter_key], opts)
+        except Exception as e:
+            print "Failed to find datastores for the VMs on %s." % vcenter_key
             print "Exception:", str(e)
+            del templates[vcenter_key]
+            continue
+        if opts.schedule_hosts:
+            # The whole batch is packed at once, largest VMs first.
+            requests = [(entry.name, settings.VM_TYPES[entry.type].ram, settings.VM_TYPES[entry.type].cpus)
+                        for entry in entries if entry.vcenter == vcenter_key]
+            try:
+                scheduled.update(schedule_hosts(s, vcenter_key, vcenter.datacenter, requests,
+                                                template_cluster(templates[vcenter_key])))
+            except Exception as e:
+                print "Failed to schedule the VMs on the hosts of %s." % vcenter_key
+                print "Exception:", str(e)
+                del templates[vcenter_key]
+
+    def provision(entry):
+        if entry.vcenter not in templates:
+            raise Exception("template %s is not available" % entry.template)
+        host, placement = None, None
+        if opts.schedule_hosts:
+            if entry.name not in scheduled:
+                raise Exception("no host has room for a VM of type %s" % entry.type)
+            host, placement = scheduled[entry.name]
+        vmtype = settings.VM_TYPES[entry.type]
+        try:
+            with vm_mgmt_trace.span("provision", vm=entry.name, vcenter=entry.vcenter):
+                return provision_vm(sessions[entry.vcenter], templates[entry.vcenter],
+                                    entry.name, entry.datastore, entry.iso, snapshots.get(entry.vcenter),
+                                    datastores=datastores.get(entry.vcenter),
+                                    size=vmtype.disksize * 1024, placement=placement,
+                                    memory_mb=vmtype.ram, cpus=vmtype.cpus)
+        except Exception:
+            if host:
+                vm_mgmt_placement.host_scheduler.release(host, vmtype.ram, vmtype.cpus)
+            raise
+
+    results = vm_mgmt_workers.run_in_pool(provision, entries, opts.workers)
+
+    for s in sessions.values():
+        vm_mgmt_session.release(s)
+
+    # One registry transaction per vCenter and type.
+    provisioned = {}
+    for entry, vm, error in results:
+        if not error:
+            provisioned.setdefault((entry.vcenter, entry.type), []).append(entry.name)
+    for (vcenter_key, vmtype), names in provisioned.items():
+        vm_mgmt_registry.created(vcenter_key, names, vmtype)
+
+    print
+    print "Summary:"
+    failed = 0
+    for entry, vm, error in results:
+        if error:
+            failed += 1
+            print "  %-40s FAILED  %s" % (entry.name, str(error))
+        else:
+            print "  %-40s OK" % entry.name
+    print "%d of %d VMs provisioned successfully." % (len(results) - failed, len(results))
+
+    if failed:
+        sys.exit(1)
+
+
+def fill_pools(opts):
+    s = vm_mgmt_session.connect(opts.vcenter)
+    try:
+        template_vm = s.get_vm_by_name(opts.template)
     except Exception as e:
-        print "Failed to locate the new VM using:", opts.name
+        print "Failed to locate the template."
         print "Exception:", str(e)
-    # disconnect from the server
-    s.disconnect()
+        sys.exit(1)
+
+    snapshot = None
+    if opts.linked_clone:
+        snapshot = linked_clone_snapshot(template_vm, opts.snapshot)
+    datastores = clone_datastores(s, template_vm, opts)
+
+    for vmtype in ([opts.type] if opts.type else sorted(settings.VM_TYPES.keys())):
+        fill_pool(s, template_vm, vmtype, opts.pool_size, snapshot, opts.workers, datastores)
+    vm_mgmt_session.release(s)
 
 
+@vm_mgmt_trace.traced_run("vm-mgmt-create")
 def main():
     opts = options()
 
-    # CONNECTION PARAMTERS
-    server = opts.esx_host
-    user = opts.user
-    password = opts.passwd
+    if opts.manifest:
+        fleet(opts)
+        return
+
+    if opts.pool_fill:
+        fill_pools(opts)
+        return
 
     # REQUIRED PARAMETERS
     vmname = opts.name
@@ -443,44 +855,76 @@ def main():
 
     datastorename = opts.datastore  # if None, will use the first datastore available
 
-    # CONNECT TO THE SERVER
-    s = VIServer()
-    s.connect(server, user, password)
+    # CONNECT TO THE SERVER (or borrow the session already open to it)
+    with vm_mgmt_trace.span("connect"):
+        s = vm_mgmt_session.connect(opts.vcenter)
+
+    if opts.from_scratch:
+        try:
+            create_vm(s, opts)
+            vm_mgmt_registry.created(opts.vcenter, [vmname], opts.type)
+        except Exception as e:
+            print "Failed to create the new VM using:", opts.name
+            print "Exception:", str(e)
+            vm_mgmt_session.release(s)
+            sys.exit(1)
+        vm_mgmt_session.release(s)
+        return
+
+    if opts.pool_take:
+        vm_mor = None
+        try:
+            with vm_mgmt_trace.span("pool-take"):
+                vm_mor = take_from_pool(s, opts.type, vmname)
+        except Exception as e:
+            print "Failed to look up the %s pool: %s" % (opts.type, str(e))
+        refill_pool_in_background(opts)
+        if vm_mor:
+            try:
+                boot_from_iso(s, vm_mor, vmname, datastorename, cd_iso_location)
+                vm_mgmt_registry.created(opts.vcenter, [vmname], opts.type)
+            except Exception as e:
+                print "Failed to provision the new VM using:", opts.name
+                print "Exception:", str(e)
+                vm_mgmt_session.release(s)
+                sys.exit(1)
+            vm_mgmt_session.release(s)
+            return
+        print "The %s pool is empty. Cloning the template instead." % opts.type
 
     # Clone the VM.
     try:
-        template_vm = s.get_vm_by_name(template)
+        with vm_mgmt_trace.span("template"):
+            template_vm = s.get_vm_by_name(template)
     except Exception as e:
         print "Failed to locate the template."
         print "Exception:", str(e)
         sys.exit(1)
 
-    vm = template_vm.clone(vmname, power_on=False)
-    cdrom = None
+    snapshot = None
+    if opts.linked_clone:
+        with vm_mgmt_trace.span("snapshot"):
+            snapshot = linked_clone_snapshot(template_vm, opts.snapshot)
 
-    for dev in vm.properties.config.hardware.device:
-        if dev._type == "VirtualCdrom":
-            cdrom = dev._obj
-            break
-
-    change_cdrom_type(cdrom, "ISO", "[%s] %s" % (datastorename, cd_iso_location))
-    apply_changes(vm, s, cdrom)
-
-    # Here you should power your VM (refer to the pysphere documentation)
-    # So it boots from the specified ISO location
     try:
-        new_vm = s.get_vm_by_name(opts.name)
-        connect_vm_cdroms(new_vm, s)
-        try:
-            new_vm.power_on()
-        except Exception as e:
-            print "Failed to power-on the new VM using:", opts.name
-            print "Exception:", str(e)
+        placement = None
+        if opts.schedule_hosts:
+            scheduled = schedule_hosts(s, opts.vcenter, opts.datacenter, [(vmname, opts.ram, opts.cpus)],
+                                       template_cluster(template_vm))
+            if vmname not in scheduled:
+                raise Exception("no host of the template's cluster has room for %s" % vmname)
+            placement = scheduled[vmname][1]
+        provision_vm(s, template_vm, vmname, datastorename, cd_iso_location, snapshot, opts.notes,
+                     clone_datastores(s, template_vm, opts), int(opts.disksize) * 1024, placement,
+                     opts.ram, opts.cpus)
+        vm_mgmt_registry.created(opts.vcenter, [vmname], opts.type)
     except Exception as e:
-        print "Failed to locate the new VM using:", opts.name
+        print "Failed to provision the new VM using:", opts.name
         print "Exception:", str(e)
-    # disconnect from the server
-    s.disconnect()
+        vm_mgmt_session.release(s)
+        sys.exit(1)
+    # release the session
+    vm_mgmt_session.release(s)
 
 if __name__ == "__main__":
     main()
@@ -17,18 +17,45 @@
 
 import re
 import sys
+import time
+import fnmatch
 import settings
+import vm_mgmt_catalog
+import vm_mgmt_log
+import vm_mgmt_readiness
+import vm_mgmt_registry
+import vm_mgmt_session
+import vm_mgmt_tasks
+import vm_mgmt_trace
+import vm_mgmt_workers
 from optparse import OptionParser
-from pysphere import VIServer, VIProperty
+from pysphere import VIProperty
 from pysphere.resources import VimService_services as VI
-from pysphere.vi_task import VITask
+from pysphere.vi_mor import MORTypes
 
 
 def options():
-    parser = OptionParser()
+    parser = OptionParser(option_class=vm_mgmt_catalog.Option)
     parser.add_option("--name", dest="name", help="Name for this VM.")
+    parser.add_option("--names", dest="names",
+                      help="Comma separated names of the VMs to be deleted.")
+    parser.add_option("--glob", dest="glob",
+                      help="Delete every VM whose name matches this shell-style pattern (e.g. 'test-env-*').")
+    parser.add_option("--regex", dest="regex",
+                      help="Delete every VM whose whole name matches this regular expression.")
+    parser.add_option("--dry-run", dest="dry_run", default=False, action="store_true",
+                      help="Print the VMs that would be deleted and exit.")
+    parser.add_option("--yes", dest="yes", default=False, action="store_true",
+                      help="Do not ask for confirmation when --glob or --regex selects more than " +
+                      str(settings.DELETE_CONFIRM_THRESHOLD) + " VMs.")
+    parser.add_option("--manifest", dest="manifest",
+                      help="File listing the names of the VMs to be deleted, one per line (the first field of each line is used).")
+    parser.add_option("--shutdown-timeout", dest="shutdown_timeout", type="int", default=60,
+                      help="Time given to the guests to shut down (in seconds) before they are powered off. Default=60.")
+    parser.add_option("--workers", dest="workers", type="int", default=8,
+                      help="Maximum number of power-off and delete operations in flight. Default=8.")
     parser.add_option(
-        "--vcenter", dest="vcenter", type="choice", choices=settings.VCENTER_SERVERS.keys(), help="Choose a vCenter configuration. Supported choices: " + str(settings.VCENTER_SERVERS.keys()))
+        "--vcenter", dest="vcenter", type="key", mapping=settings.VCENTER_SERVERS, help="Choose a vCenter configuration. " + vm_mgmt_catalog.choices_help(settings.VCENTER_SERVERS))
     parser.add_option("--user", dest="user", help="Username to connect to ESX Server.")
     parser.add_option("--pass", dest="passwd", help="Password to connect to ESX Server.")
     parser.add_option("--esx-host", dest="esx_host", help="Hostname of ESX Server to connect to.")
@@ -47,77 +74,251 @@ def options():
         print
         sys.exit(1)
 
-    if not opts.name:
-        print "Cannot continue without VM Name that is supposed to be deleted. Use --name <Name-of-the-VM>."
+    opts.vmnames = []
+    if opts.name:
+        opts.vmnames.append(opts.name)
+    if opts.names:
+        opts.vmnames.extend([n.strip() for n in opts.names.split(",") if n.strip()])
+    if opts.manifest:
+        opts.vmnames.extend([fields[0] for fields in vm_mgmt_workers.read_manifest(opts.manifest)])
+
+    if opts.regex:
+        try:
+            # Anchored at both ends: 'web' must not select 'my-web-template'.
+            opts.regex = re.compile("(?:%s)$" % opts.regex)
+        except re.error as e:
+            print "Invalid --regex:", str(e)
+            sys.exit(1)
+
+    if not opts.vmnames and not opts.glob and not opts.regex:
+        print "Cannot continue without VM Name that is supposed to be deleted. Use --name <Name-of-the-VM>, --names, --glob, --regex or --manifest."
         sys.exit(1)
 
     # print "Identified options:", opts
     return opts
 
 
-def check_count(count, wait_for):
-    if count >= wait_for:
-        print "Exceeded %s timeout." % str(wait_for)
-        print "Aborted."
+class Target(object):
+    # A VM selected for deletion and the outcome of deleting it.
 
+    def __init__(self, name, mor, power_state):
+        self.name = name
+        self.mor = mor
+        self.power_state = power_state
+        self.error = None
+
+
+def list_vms(s, property_names):
+    # Returns [(moref, {property path: value})] for every VM, in one traversal.
+    vms = []
+    for oc in s._retrieve_properties_traversal(property_names=property_names,
+                                               obj_type=MORTypes.VirtualMachine) or []:
+        vms.append((oc.Obj, dict([(p.Name, p.Val) for p in getattr(oc, "PropSet", None) or []])))
+    return vms
 
-def main():
-    opts = options()
 
-    # CONNECTION PARAMTERS
-    server = opts.esx_host
-    user = opts.user
-    password = opts.passwd
+def protected(name, props, opts):
+    # Templates (marked as such, or the template of the vCenter
+    # configuration) are never deleted. Warm pool members are not selected
+    # by a pattern unless the pattern names the pool.
+    if props.get("config.template") or name == settings.VCENTER_SERVERS[opts.vcenter].template:
+        return "template"
+    pattern = opts.glob or (opts.regex and opts.regex.pattern) or ""
+    if name.startswith(settings.WARM_POOL_PREFIX + "-") and settings.WARM_POOL_PREFIX not in pattern:
+        return "warm pool member"
+    return None
 
-    # REQUIRED PARAMETERS
-    vmname = opts.name
 
-    # CONNECT TO THE SERVER
-    s = VIServer()
-    s.connect(server, user, password)
+def find_targets(s, opts):
+    # Returns a Target for every VM selected by the options, the names
+    # given explicitly that do not exist, and the (name, reason) of the
+    # selected VMs that are protected from deletion.
+    names = set(opts.vmnames)
+    targets = []
+    skipped = []
+    for mor, props in list_vms(s, ["name", "runtime.powerState", "config.template"]):
+        name = props.get("name")
+        if not name:
+            continue
+        matched = (opts.glob and fnmatch.fnmatchcase(name, opts.glob)) or (opts.regex and opts.regex.match(name))
+        if name not in names and not matched:
+            continue
+        reason = protected(name, props, opts)
+        if reason and (reason == "template" or name not in names):
+            skipped.append((name, reason))
+        else:
+            targets.append(Target(name, mor, props.get("runtime.powerState")))
 
+    missing = names - set([t.name for t in targets]) - set([n for n, r in skipped])
+    return sorted(targets, key=lambda t: t.name), sorted(missing), sorted(skipped)
+
+
+def confirmed(targets, opts):
+    # More than DELETE_CONFIRM_THRESHOLD VMs selected by a pattern need
+    # --yes or an answer at the terminal.
+    if opts.yes or not (opts.glob or opts.regex) or len(targets) <= settings.DELETE_CONFIRM_THRESHOLD:
+        return True
+    if not sys.stdin.isatty():
+        print "%s VMs matched. Use --yes to delete more than %s VMs selected by --glob or --regex." % (
+            str(len(targets)), str(settings.DELETE_CONFIRM_THRESHOLD))
+        return False
+    answer = raw_input("Delete these %s VMs? [y/N] " % str(len(targets)))
+    return answer.strip().lower() in ["y", "yes"]
+
+
+def vm_request(request, mor):
+    _this = request.new__this(mor)
+    _this.set_attribute_type(mor.get_attribute_type())
+    request.set_element__this(_this)
+    return request
+
+
+def power_off(s, target):
+    # Starts a hard power-off of the VM. Returns the task being tracked.
+    request = vm_request(VI.PowerOffVM_TaskRequestMsg(), target.mor)
+    return vm_mgmt_tasks.track_task(s._proxy.PowerOffVM_Task(request)._returnval, s)
+
+
+def wait_for_power_off(s, targets, timeout):
+    # Waits for all the targets at once, following their power state through
+    # a single property collector. Returns the targets that are still not
+    # powered off after 'timeout' seconds.
+    pending = dict([(str(t.mor), t) for t in targets])
+    watcher = vm_mgmt_readiness.watch_guest_state(s, [t.mor for t in targets])
+    progress = vm_mgmt_log.RateLimiter(settings.LOG_PROGRESS_INTERVAL)
+    start = time.time()
     try:
-        vm = s.get_vm_by_name(opts.name)
-        vm.shutdown_guest()
-        
-        count = 1
-        wait_for = 60
-        try: 
-            while count < wait_for and vm.is_powered_off() == False:
-                count += 1
-                time.sleep(1)
-                print "Elapsed %s seconds ..." % str(count)
-
-        except Exception as e:
-            if count >= wait_for:
-                print "Failed to shutdown the VM (%s) even after %s seconds." % (vmname, str(wait_for))
-                print "Please login to the EXSi server and fix the issue. Exception: %s" % str(e)
-                sys.exit(1)
-
-        check_count(count, wait_for)
+        while pending:
+            polled = None
+            for key, target in pending.items():
+                state = watcher.values(target.mor).get("runtime.powerState")
+                if state is None:
+                    # No update stream. Poll all the VMs with one traversal.
+                    if polled is None:
+                        polled = dict([(str(mor), props.get("runtime.powerState"))
+                                       for mor, props in list_vms(s, ["runtime.powerState"])])
+                    state = polled.get(key)
+                if state == "poweredOff":
+                    target.power_state = state
+                    del pending[key]
+
+            elapsed = time.time() - start
+            if not pending or elapsed >= timeout:
+                break
+            if progress.allow("shutdown") is not None:
+                print "Waiting for %s VM(s) to shut down. Elapsed %s seconds ..." % (str(len(pending)), str(int(elapsed)))
+            watcher.wait(min(5, timeout - elapsed))
+    finally:
+        watcher.close()
+    return pending.values()
+
+
+def delete_vms(s, targets, opts):
+    # Shuts the guests down in parallel, powers off the ones that did not go
+    # down in time, then destroys all of them with at most opts.workers tasks
+    # in flight. The outcome is left in target.error.
+    running = [t for t in targets if t.power_state != "poweredOff"]
+
+    def shutdown(target):
+        request = vm_request(VI.ShutdownGuestRequestMsg(), target.mor)
+        s._proxy.ShutdownGuest(request)
+
+    shutting_down = []
+    power_offs = []
+    with vm_mgmt_trace.span("shutdown", vms=len(running)):
+        for target, result, error in vm_mgmt_workers.run_in_pool(shutdown, running, opts.workers):
+            if error:
+                # E.g. VMware Tools are not running in the guest.
+                print "%s: graceful shutdown failed (%s). Powering it off." % (target.name, str(error))
+                power_offs.append(target)
+            else:
+                shutting_down.append(target)
+
+        if shutting_down:
+            print "Waiting up to %s seconds for %s VM(s) to shut down ..." % (
+                str(opts.shutdown_timeout), str(len(shutting_down)))
+            for target in wait_for_power_off(s, shutting_down, opts.shutdown_timeout):
+                print "%s: did not shut down within %s seconds. Powering it off." % (
+                    target.name, str(opts.shutdown_timeout))
+                power_offs.append(target)
+
+    def hard_power_off(target):
+        task = power_off(s, target)
+        if task.wait_for_state([task.STATE_SUCCESS, task.STATE_ERROR]) == task.STATE_ERROR:
+            raise Exception(task.get_error_message())
+
+    with vm_mgmt_trace.span("power-off", vms=len(power_offs)):
+        for target, result, error in vm_mgmt_workers.run_in_pool(hard_power_off, power_offs, opts.workers):
+            if error:
+                target.error = "Failed to power off: %s" % str(error)
+
+    def destroy(target):
+        request = vm_request(VI.Destroy_TaskRequestMsg(), target.mor)
+        task = vm_mgmt_tasks.track_task(s._proxy.Destroy_Task(request)._returnval, s)
+        if task.wait_for_state([task.STATE_SUCCESS, task.STATE_ERROR]) == task.STATE_ERROR:
+            raise Exception(task.get_error_message())
+
+    destroyed = [t for t in targets if not t.error]
+    with vm_mgmt_trace.span("destroy", vms=len(destroyed)):
+        for target, result, error in vm_mgmt_workers.run_in_pool(destroy, destroyed, opts.workers):
+            if error:
+                target.error = "Error removing vm: %s" % str(error)
+
+
+@vm_mgmt_trace.traced_run("vm-mgmt-delete")
+def main():
+    opts = options()
+
+    # CONNECT TO THE SERVER (or borrow the session already open to it)
+    with vm_mgmt_trace.span("connect"):
+        s = vm_mgmt_session.connect(opts.vcenter)
+
+    try:
+        with vm_mgmt_trace.span("find-targets"):
+            targets, missing, skipped = find_targets(s, opts)
     except Exception as e:
-        print "Failed to locate and shutdown the new VM using:", opts.name
-        print "VM could not be deleted."
+        print "Failed to locate the VMs to be deleted."
         print "Exception:", str(e)
+        vm_mgmt_session.release(s)
+        sys.exit(1)
 
-    # Invoke Destroy_Task
-    request = VI.Destroy_TaskRequestMsg()
-    _this = request.new__this(vm._mor)
-    _this.set_attribute_type(vm._mor.get_attribute_type())
-    request.set_element__this(_this)
-    ret = s._proxy.Destroy_Task(request)._returnval
+    for name in missing:
+        print "Failed to locate the VM:", name
+    for name, reason in skipped:
+        print "Not deleting %s (%s)." % (name, reason)
+
+    if not targets:
+        print "No VM matched. Nothing to delete."
+        vm_mgmt_session.release(s)
+        sys.exit(1)
 
-    # Wait for the task to finish
-    task = VITask(ret, s)
+    if opts.dry_run:
+        print "Would delete %s VM(s): %s" % (str(len(targets)), ", ".join([t.name for t in targets]))
+        vm_mgmt_session.release(s)
+        return
 
-    status = task.wait_for_state([task.STATE_SUCCESS, task.STATE_ERROR])
-    if status == task.STATE_SUCCESS:
-        print "VM successfully deleted from disk"
-    elif status == task.STATE_ERROR:
-        print "Error removing vm:", task.get_error_message()
+    if not confirmed(targets, opts):
+        print "Nothing deleted."
+        vm_mgmt_session.release(s)
+        sys.exit(1)
+
+    print "Deleting %s VM(s): %s" % (str(len(targets)), ", ".join([t.name for t in targets]))
+    delete_vms(s, targets, opts)
+    vm_mgmt_registry.deleted(opts.vcenter, [t.name for t in targets if not t.error])
+
+    print
+    print "Summary:"
+    for target in targets:
+        if target.error:
+            print "    %s: FAILED (%s)" % (target.name, target.error)
+        else:
+            print "    %s: VM successfully deleted from disk" % target.name
 
-    # disconnect from the server
-    s.disconnect()
+    # release the session
+    vm_mgmt_session.release(s)
+
+    if missing or [t for t in targets if t.error]:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+
+# ==============================================================================
+# Name          :   vm-mgmt.py
+#
+# Description   :   Single entry point for the actions of SUPPORTED_ACTIONS.
+#                   E.g. python vm-mgmt.py create-vm --vcenter lab --type web --iso iso/web.iso
+#                        python vm-mgmt.py delete-vm --vcenter lab --name web-1
+#                        python vm-mgmt.py remove-cd-device-from-vm --vcenter lab --name web-1
+#
+#                   The options after the action are the ones of its script
+#                   (vm-mgmt-create.py, vm-mgmt-delete.py). pysphere and the
+#                   scripts are imported only when an action runs.
+#
+#                   With --batch the actions are read from stdin, one JSON
+#                   object per line, and run one after the other in this
+#                   process, sharing its vSphere sessions and caches:
+#                     {"id": 1, "action": "delete-vm", "args": ["--vcenter", "lab", "--name", "web-1"]}
+#                     {"id": 2, "action": "create-vm", "options": {"vcenter": "lab", "type": "web", "linked-clone": true}}
+#                   One JSON line is written to stdout per action, with its
+#                   id, exit code, duration and output.
+#
+# Version       :   1.0.0
+#
+# Author        :   Santhoshkumar Settipalli
+#
+# Change log    :
+#   17-Oct-2026 :    Santhoshkumar Settipalli (santhosh.settipalli@gmail.com)
+#                    Initial version.
+#
+# ==============================================================================
+
+import os
+import sys
+import imp
+import json
+import time
+import settings
+import vm_mgmt_catalog
+import vm_mgmt_trace
+import vm_mgmt_workers
+from StringIO import StringIO
+from optparse import OptionParser
+
+# Scripts loaded so far, by file name.
+scripts = {}
+
+
+def load_script(filename):
+    base = os.path.dirname(os.path.abspath(__file__))
+    if filename not in scripts:
+        scripts[filename] = imp.load_source("vm_mgmt_" + filename[:-3].replace("-", "_"),
+                                            os.path.join(base, filename))
+    return scripts[filename]
+
+
+def run_script(filename, args):
+    # Runs main() of the script as if from the command line.
+    script = load_script(filename)
+    argv = sys.argv
+    sys.argv = [filename] + args
+    try:
+        script.main()
+    finally:
+        sys.argv = argv
+
+
+def create_vm(args):
+    run_script("vm-mgmt-create.py", args)
+
+
+def delete_vm(args):
+    run_script("vm-mgmt-delete.py", args)
+
+
+def remove_cd_options(args):
+    parser = OptionParser(prog="vm-mgmt.py remove-cd-device-from-vm", option_class=vm_mgmt_catalog.Option)
+    parser.add_option(
+        "--vcenter", dest="vcenter", type="key", mapping=settings.VCENTER_SERVERS, help="Choose a vCenter configuration. " + vm_mgmt_catalog.choices_help(settings.VCENTER_SERVERS))
+    parser.add_option("--name", dest="name", help="Name of the VM.")
+    parser.add_option("--names", dest="names", help="Comma separated names of VMs.")
+    parser.add_option("--workers", dest="workers", type="int", default=8,
+                      help="Number of VMs reconfigured in parallel. Default=8.")
+    opts, args = parser.parse_args(args)
+
+    opts.vmnames = [n.strip() for n in ([opts.name or ""] + (opts.names or "").split(",")) if n.strip()]
+    if not opts.vcenter or not opts.vmnames:
+        print "Nothing to do. Use --vcenter <key> and --name <vm> or --names <vm,...>."
+        sys.exit(1)
+    return opts
+
+
+@vm_mgmt_trace.traced_run("vm-mgmt-remove-cd")
+def remove_cd(args):
+    # Removes the CD-ROM drives from the VMs (which have to be powered off),
+    # with one reconfiguration per VM. The VMs are found with one traversal
+    # and their CD-ROMs fetched with one call, however many VMs are given.
+    opts = remove_cd_options(args)
+    import vm_mgmt_properties
+    import vm_mgmt_session
+    import vm_mgmt_spec
+    import vm_mgmt_tasks
+    from pysphere import MORTypes
+
+    with vm_mgmt_trace.span("connect"):
+        s = vm_mgmt_session.connect(opts.vcenter)
+
+    with vm_mgmt_trace.span("locate"):
+        mors = dict([(name, mor) for mor, name in s._get_managed_objects(MORTypes.VirtualMachine).items()
+                     if name in opts.vmnames])
+        cdroms = vm_mgmt_properties.vm_devices(s, mors.values(), ["VirtualCdrom"])
+
+    def remove(vmname):
+        if vmname not in mors:
+            raise Exception("Could not find a VM named %s" % vmname)
+        with vm_mgmt_trace.span("remove-cd", vm=vmname):
+            config = vm_mgmt_spec.ConfigSpec(cdroms.get(mors[vmname], []))
+            if not config.remove_cdroms():
+                return False
+            vm_mgmt_tasks.wait_for_task(vm_mgmt_spec.reconfigure(s, mors[vmname], config), s)
+            return True
+
+    results = vm_mgmt_workers.run_in_pool(remove, opts.vmnames, opts.workers)
+    vm_mgmt_session.release(s)
+
+    failed = 0
+    for vmname, removed, error in results:
+        if error:
+            failed += 1
+            print "%s: Failed to remove the cd roms: %s" % (vmname, str(error))
+        elif removed:
+            print "%s: Removed the cd roms successfully." % vmname
+        else:
+            print "%s: has no cd roms" % vmname
+    if failed:
+        sys.exit(1)
+
+
+def exit_code(code):
+    # The exit status of sys.exit(code).
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print >>sys.stderr, code
+    return 1
+
+
+def dispatch(action, args):
+    # Runs an action of SUPPORTED_ACTIONS. Returns its exit code.
+    func = globals()[settings.SUPPORTED_ACTIONS[action]]
+    try:
+        func(args)
+    except SystemExit as e:
+        return exit_code(e.code)
+    return 0
+
+
+def command_args(command):
+    # The command line of a --batch command: its "args" as they are, then
+    # its "options", e.g. {"name": "web-1", "linked-clone": true}.
+    args = [unicode(a).encode("utf-8") for a in command.get("args") or []]
+    for name, value in sorted((command.get("options") or {}).items()):
+        if value is True:
+            args.append("--" + name)
+        elif value is not False and value is not None:
+            args += ["--" + name, unicode(value).encode("utf-8")]
+    return args
+
+
+def run_batch(stream, out):
+    # Runs the commands read from 'stream' one after the other. Returns the
+    # number of commands that failed.
+    failed = 0
+    number = 0
+    # readline() rather than iteration, which reads ahead: commands are run
+    # as soon as they arrive.
+    for line in iter(stream.readline, ""):
+        number += 1
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        result = {"line": number}
+        try:
+            command = json.loads(line)
+            if not isinstance(command, dict):
+                raise ValueError("not a JSON object")
+            result["id"] = command.get("id")
+            action = command.get("action")
+            if action not in settings.SUPPORTED_ACTIONS:
+                raise ValueError("unknown action %s. Supported actions: %s" %
+                                 (str(action), str(sorted(settings.SUPPORTED_ACTIONS.keys()))))
+            args = command_args(command)
+        except (ValueError, AttributeError) as e:
+            result.update({"exit_code": 2, "error": "Invalid command: %s" % str(e)})
+        else:
+            result["action"] = action
+            captured = StringIO()
+            stdout, stderr = sys.stdout, sys.stderr
+            sys.stdout = sys.stderr = captured
+            start = time.time()
+            try:
+                result["exit_code"] = dispatch(action, args)
+            except Exception as e:
+                result.update({"exit_code": 1, "error": str(e)})
+            finally:
+                sys.stdout, sys.stderr = stdout, stderr
+            result["seconds"] = round(time.time() - start, 3)
+            result["output"] = captured.getvalue()
+
+        if result["exit_code"]:
+            failed += 1
+        out.write(json.dumps(result, sort_keys=True) + "\n")
+        out.flush()
+    return failed
+
+
+def options(argv):
+    parser = OptionParser(usage="%prog <action> [options of the action] | %prog --batch < commands.jsonl\n\n"
+                                "Actions: " + ", ".join(sorted(settings.SUPPORTED_ACTIONS.keys())))
+    parser.add_option("--batch", dest="batch", default=False, action="store_true",
+                      help="Run the commands read from stdin, one JSON object per line, in this process.")
+    # Everything from the action on is for the action.
+    parser.disable_interspersed_args()
+    opts, args = parser.parse_args(argv)
+
+    if not opts.batch and (not args or args[0] not in settings.SUPPORTED_ACTIONS):
+        print "Nothing to do. Use --batch or one of the actions: " + ", ".join(sorted(settings.SUPPORTED_ACTIONS.keys()))
+        sys.exit(1)
+    return opts, args
+
+
+def main():
+    opts, args = options(sys.argv[1:])
+
+    if opts.batch:
+        failed = run_batch(sys.stdin, sys.stdout)
+        sys.exit(1 if failed else 0)
+
+    sys.exit(dispatch(args[0], args[1:]))
+
+if __name__ == "__main__":
+    main()
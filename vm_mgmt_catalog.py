@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+
+# ==============================================================================
+# Name          :   vm_mgmt_catalog.py
+#
+# Description   :   External catalog of the VM types, vCenters, guest logins,
+#                   network adapters and hardware profiles of settings.py,
+#                   in a JSON (or, with PyYAML, YAML) file named by
+#                   CATALOG_FILE or the VM_MGMT_CATALOG environment variable:
+#
+#                     {"vm_types": {"web": {"name": "web", "hostname": "web",
+#                                           "datastore": "ds1", "ram": 8192,
+#                                           "cpus": 4, "disksize": 41943040}},
+#                      "vcenter_servers": {"lab": ["10.0.0.5", "root", "pw",
+#                                                  "DC", "ds1", "esx-1", "tpl"]},
+#                      "guest_login_info": {"web": {"username": "root",
+#                                                   "password": "pw"}},
+#                      "vm_hardware_profiles": {"web": "compatible"}}
+#
+#                   Entries are objects with the fields of the settings.py
+#                   namedtuple, or lists of them in order. The file is
+#                   compiled on first use into an index in CACHE_FOLDER
+#                   (recompiled when the file changes) from which single
+#                   entries are read and decoded on demand, so the cost of
+#                   starting a script does not grow with the catalog.
+#
+#                   python vm_mgmt_catalog.py --list vm_types
+#                   python vm_mgmt_catalog.py --compile
+#
+# Version       :   1.0.0
+#
+# Author        :   Santhoshkumar Settipalli
+#
+# Change log    :
+#   17-Oct-2026 :    Santhoshkumar Settipalli (santhosh.settipalli@gmail.com)
+#                    Initial version.
+#
+# ==============================================================================
+
+import os
+import sys
+import json
+import struct
+import marshal
+import hashlib
+import optparse
+import tempfile
+import threading
+from collections import Mapping
+
+INDEX_VERSION = 1
+SECTIONS = ["vm_types", "vcenter_servers", "guest_login_info", "network_adapter",
+            "hardware_profiles", "vm_hardware_profiles"]
+
+
+def to_str(value):
+    # JSON strings are unicode; the rest of the code expects str.
+    if isinstance(value, unicode):
+        return value.encode("utf-8")
+    if isinstance(value, list):
+        return [to_str(v) for v in value]
+    if isinstance(value, dict):
+        return dict([(to_str(k), to_str(v)) for k, v in value.items()])
+    return value
+
+
+def parse(path):
+    with open(path) as f:
+        if os.path.splitext(path)[1].lower() in [".yaml", ".yml"]:
+            try:
+                import yaml
+            except ImportError:
+                raise Exception("PyYAML is needed to read the catalog %s." % path)
+            document = yaml.safe_load(f)
+        else:
+            try:
+                document = json.load(f)
+            except ValueError as e:
+                raise Exception("The catalog %s is not valid JSON: %s" % (path, str(e)))
+    if not isinstance(document, dict):
+        raise Exception("The catalog %s is not a mapping of sections." % path)
+    unknown = [name for name in document if name not in SECTIONS]
+    if unknown:
+        raise Exception("The catalog %s has unknown sections %s. Supported sections: %s" %
+                        (path, str(sorted(unknown)), str(SECTIONS)))
+    return to_str(document)
+
+
+def compile_index(path, index_path, source):
+    # Layout: the length of the header, the header (marshal) and then one
+    # marshal blob per entry. The header maps every section and key to
+    # the offset and length of its blob.
+    document = parse(path)
+    blobs = []
+    offset = 0
+    sections = {}
+    for name in SECTIONS:
+        entries = sections[name] = {}
+        for key, value in sorted((document.get(name) or {}).items()):
+            blob = marshal.dumps(value)
+            entries[str(key)] = (offset, len(blob))
+            blobs.append(blob)
+            offset += len(blob)
+    header = marshal.dumps({"version": INDEX_VERSION, "source": source, "sections": sections})
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(index_path))
+    try:
+        os.write(fd, struct.pack("!Q", len(header)) + header + "".join(blobs))
+    finally:
+        os.close(fd)
+    os.chmod(tmp_path, 0644)
+    # Atomic: concurrent scripts read either index, never a partial one.
+    os.rename(tmp_path, index_path)
+
+
+class Catalog(object):
+
+    def __init__(self, path, cache_folder):
+        self.path = os.path.abspath(path)
+        self.cache_folder = cache_folder
+        self.lock = threading.Lock()
+        self.index = None       # section -> {key: (offset, length)}
+        self.data = None        # The open index file.
+        self.base = 0
+
+    def index_path(self):
+        return os.path.join(self.cache_folder, "catalog-%s.idx" % hashlib.sha1(self.path).hexdigest()[:16])
+
+    def read_index(self, index_path, source):
+        try:
+            f = open(index_path, "rb")
+        except IOError:
+            return False
+        try:
+            size = struct.unpack("!Q", f.read(8))[0]
+            header = marshal.loads(f.read(size))
+        except (struct.error, EOFError, ValueError, TypeError):
+            header = {}
+        if header.get("version") != INDEX_VERSION or header.get("source") != source:
+            f.close()
+            return False
+        self.index, self.data, self.base = header["sections"], f, 8 + size
+        return True
+
+    def load(self, force=False):
+        # Opens the index, compiling the catalog first when it is missing or
+        # out of date. Without a writable CACHE_FOLDER it is compiled into a
+        # temporary file, for this process only.
+        st = os.stat(self.path)
+        source = [self.path, st.st_mtime, st.st_size]
+        index_path = self.index_path()
+        if not force and self.read_index(index_path, source):
+            return
+        try:
+            if not os.path.isdir(self.cache_folder):
+                os.makedirs(self.cache_folder)
+            compile_index(self.path, index_path, source)
+        except (IOError, OSError):
+            # A private directory: nobody else can create or swap the file.
+            folder = tempfile.mkdtemp(prefix="catalog-")
+            index_path = os.path.join(folder, "catalog.idx")
+            try:
+                compile_index(self.path, index_path, source)
+                self.read_index(index_path, source)
+            finally:
+                if os.path.exists(index_path):
+                    os.remove(index_path)
+                os.rmdir(folder)
+            return
+        if not self.read_index(index_path, source):
+            raise Exception("Could not read the compiled catalog %s." % index_path)
+
+    def keys(self, section):
+        self.lock.acquire()
+        try:
+            if self.index is None:
+                self.load()
+            return self.index.get(section, {})
+        finally:
+            self.lock.release()
+
+    def entry(self, section, key):
+        location = self.keys(section).get(key)
+        if location is None:
+            raise KeyError(key)
+        self.lock.acquire()
+        try:
+            self.data.seek(self.base + location[0])
+            return marshal.loads(self.data.read(location[1]))
+        finally:
+            self.lock.release()
+
+
+class Section(Mapping):
+    # A section of a catalog as a read-only dict of 'factory' objects (e.g.
+    # settings.vm_type). The entries of 'inline' (the dict of settings.py)
+    # take precedence. Nothing is read before the first access.
+
+    def __init__(self, catalog, name, factory=None, inline=None):
+        self.catalog = catalog
+        self.name = name
+        self.factory = factory
+        self.inline = inline or {}
+        self.decoded = {}
+
+    def __getitem__(self, key):
+        if key in self.inline:
+            return self.inline[key]
+        if key not in self.decoded:
+            value = self.catalog.entry(self.name, key)
+            try:
+                if self.factory is None:
+                    pass
+                elif isinstance(value, dict):
+                    value = self.factory(**value)
+                elif isinstance(value, list):
+                    value = self.factory(*value)
+                else:
+                    value = self.factory(value)
+            except TypeError as e:
+                raise Exception("Invalid %s entry '%s' in the catalog %s: %s" %
+                                (self.name, key, self.catalog.path, str(e)))
+            self.decoded[key] = value
+        return self.decoded[key]
+
+    def __contains__(self, key):
+        return key in self.inline or key in self.catalog.keys(self.name)
+
+    def __iter__(self):
+        for key in self.inline:
+            yield key
+        for key in self.catalog.keys(self.name):
+            if key not in self.inline:
+                yield key
+
+    def __len__(self):
+        return len(set(self.inline) | set(self.catalog.keys(self.name)))
+
+    def keys(self):
+        return list(self)
+
+
+def check_key(option, opt, value):
+    if value not in option.mapping:
+        raise optparse.OptionValueError("option %s: invalid choice: %r. %s" % (opt, value, choices_help(option.mapping)))
+    return value
+
+
+class Option(optparse.Option):
+    # Adds type="key": the value must be a key of 'mapping' (e.g.
+    # settings.VM_TYPES). Unlike type="choice" no list of the keys is
+    # built; only the given value is looked up.
+    ATTRS = optparse.Option.ATTRS + ["mapping"]
+    TYPES = optparse.Option.TYPES + ("key",)
+    TYPE_CHECKER = dict(optparse.Option.TYPE_CHECKER, key=check_key)
+
+
+def choices_help(mapping):
+    # The supported keys for a help text: listed for a plain dict, a pointer
+    # to --list for a catalog section (which may hold hundreds of them).
+    if isinstance(mapping, Section):
+        return "Supported choices: see 'python vm_mgmt_catalog.py --list %s'." % mapping.name
+    return "Supported choices: " + str(mapping.keys())
+
+
+def options():
+    parser = optparse.OptionParser()
+    parser.add_option("--list", dest="list", type="choice", choices=SECTIONS,
+                      help="Print the keys of a section. Supported choices: " + str(SECTIONS))
+    parser.add_option("--compile", dest="compile", default=False, action="store_true",
+                      help="Compile the catalog now, e.g. to check it after an edit.")
+    opts, args = parser.parse_args()
+    if not (opts.list or opts.compile):
+        print "Nothing to do. Use --list <section> or --compile."
+        sys.exit(1)
+    return opts
+
+
+def main():
+    opts = options()
+    import settings
+
+    if not settings.CATALOG_FILE:
+        print "No catalog is configured. Set CATALOG_FILE in settings.py or VM_MGMT_CATALOG."
+        sys.exit(1)
+    if opts.compile:
+        Catalog(settings.CATALOG_FILE, settings.CACHE_FOLDER).load(force=True)
+        print "Compiled %s." % settings.CATALOG_FILE
+    if opts.list:
+        section = getattr(settings, opts.list.upper())
+        for key in sorted(section.keys()):
+            print key
+
+if __name__ == "__main__":
+    main()
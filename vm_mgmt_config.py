@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+# ==============================================================================
+# Name          :   vm_mgmt_config.py
+#
+# Description   :   Memoized QueryConfigTarget and QueryConfigOption calls.
+#                   The responses (networks, datastores, default devices,
+#                   CD-ROM backings) are large and nearly static for a given
+#                   environment browser, host and hardware version, so a batch
+#                   of VMs built against the same host only pays for them once.
+#
+# Version       :   1.0.0
+#
+# Author        :   Santhoshkumar Settipalli
+#
+# Change log    :
+#   17-Oct-2026 :    Santhoshkumar Settipalli (santhosh.settipalli@gmail.com)
+#                    Initial version.
+#
+# ==============================================================================
+
+import time
+import threading
+import settings
+from pysphere.resources import VimService_services as VI
+
+# (server url, query, environment browser, host, hardware version) ->
+# (time of the query, response)
+cache = {}
+in_flight = {}
+cache_lock = threading.Lock()
+
+
+def cache_key(s, query, envmor, hostmor, key):
+    return (s._proxy.binding.url, query, str(envmor), str(hostmor or ""), key or "")
+
+
+def memoize(ckey, fetch):
+    # Concurrent callers asking for the same key wait for the first caller
+    # instead of issuing the same query again.
+    while True:
+        cache_lock.acquire()
+        try:
+            entry = cache.get(ckey)
+            if entry and time.time() - entry[0] < settings.CONFIG_QUERY_CACHE_TTL:
+                return entry[1]
+            pending = in_flight.get(ckey)
+            if not pending:
+                pending = in_flight[ckey] = threading.Event()
+                break
+        finally:
+            cache_lock.release()
+
+        while not pending.is_set():
+            pending.wait(1)
+
+    try:
+        value = fetch()
+        cache_lock.acquire()
+        try:
+            cache[ckey] = (time.time(), value)
+        finally:
+            cache_lock.release()
+        return value
+    finally:
+        cache_lock.acquire()
+        try:
+            del in_flight[ckey]
+        finally:
+            cache_lock.release()
+        pending.set()
+
+
+def query_config_target(s, envmor, hostmor=None):
+    def fetch():
+        request = VI.QueryConfigTargetRequestMsg()
+        _this = request.new__this(envmor)
+        _this.set_attribute_type(envmor.get_attribute_type())
+        request.set_element__this(_this)
+        if hostmor:
+            h = request.new_host(hostmor)
+            h.set_attribute_type(hostmor.get_attribute_type())
+            request.set_element_host(h)
+        return s._proxy.QueryConfigTarget(request)._returnval
+
+    return memoize(cache_key(s, "target", envmor, hostmor, None), fetch)
+
+
+def query_config_option(s, envmor, hostmor=None, key=None):
+    # 'key' selects the hardware version (e.g. "vmx-08"); the default
+    # hardware version of the host is used when it is not given.
+    def fetch():
+        request = VI.QueryConfigOptionRequestMsg()
+        _this = request.new__this(envmor)
+        _this.set_attribute_type(envmor.get_attribute_type())
+        request.set_element__this(_this)
+        if key:
+            request.set_element_key(key)
+        if hostmor:
+            h = request.new_host(hostmor)
+            h.set_attribute_type(hostmor.get_attribute_type())
+            request.set_element_host(h)
+        return s._proxy.QueryConfigOption(request)._returnval
+
+    return memoize(cache_key(s, "option", envmor, hostmor, key), fetch)
+
+
+def evict(envmor=None, hostmor=None):
+    # Drops the cached responses of an environment browser and/or host, e.g.
+    # after a network or datastore was added to it. With no arguments every
+    # cached response is dropped.
+    cache_lock.acquire()
+    try:
+        for ckey in cache.keys():
+            if envmor and ckey[2] != str(envmor):
+                continue
+            if hostmor and ckey[3] != str(hostmor):
+                continue
+            del cache[ckey]
+    finally:
+        cache_lock.release()
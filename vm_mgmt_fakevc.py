@@ -0,0 +1,1279 @@
+#!/usr/bin/env python
+
+# ==============================================================================
+# Name          :   vm_mgmt_fakevc.py
+#
+# Description   :   A local stand-in for a vCenter, emulating the part of the
+#                   vSphere API used by this library: login, inventory
+#                   traversal, property collectors and their updates,
+#                   QueryConfigTarget/QueryConfigOption, the VM tasks, the
+#                   guest operations and the HTTP file access to the
+#                   datastores (/folder, kept in a temporary folder). Latency, task durations and the timing
+#                   of the guests (boot, OS installation, shutdown) are
+#                   configurable, and every SOAP call is counted, so the
+#                   scripts can be measured without a real vCenter.
+#                   Requests are parsed and responses built with the same
+#                   pysphere bindings the scripts use.
+#
+#                   Run standalone:  python vm_mgmt_fakevc.py --port 8989
+#                   and use "http://127.0.0.1:8989/sdk" as the vCenter ip.
+#
+# Version       :   1.0.0
+#
+# Author        :   Santhoshkumar Settipalli
+#
+# Change log    :
+#   17-Oct-2026 :    Santhoshkumar Settipalli (santhosh.settipalli@gmail.com)
+#                    Initial version.
+#
+# ==============================================================================
+
+import os
+import re
+import copy
+import time
+import heapq
+import shutil
+import urllib
+import tempfile
+import traceback
+import itertools
+import threading
+import BaseHTTPServer
+import SocketServer
+from urlparse import urlparse, parse_qs
+from optparse import OptionParser
+from pysphere.resources import VimService_services as VI
+from pysphere.ZSI import ParsedSoap, SoapWriter, Fault, TC, TCnumbers
+
+# Data object type of the properties that are composed from their leaves
+# (e.g. "runtime" of a VM from "runtime.powerState").
+COMPOSITES = {
+    ("VirtualMachine", "config"): "VirtualMachineConfigInfo",
+    ("VirtualMachine", "runtime"): "VirtualMachineRuntimeInfo",
+    ("VirtualMachine", "guest"): "GuestInfo",
+    ("HostSystem", "summary"): "HostListSummary",
+    ("HostSystem", "runtime"): "HostRuntimeInfo",
+    ("Datastore", "summary"): "DatastoreSummary",
+    ("Task", "info"): "TaskInfo",
+}
+
+# Element type of the list properties that are not lists of morefs.
+LIST_TYPES = {
+    "device": "VirtualDevice",
+    "net": "GuestNicInfo",
+}
+
+SUPERTYPES = {
+    "ClusterComputeResource": ["ComputeResource", "ManagedEntity"],
+    "ComputeResource": ["ManagedEntity"],
+    "Datacenter": ["ManagedEntity"],
+    "Datastore": ["ManagedEntity"],
+    "Folder": ["ManagedEntity"],
+    "HostSystem": ["ManagedEntity"],
+    "Network": ["ManagedEntity"],
+    "ResourcePool": ["ManagedEntity"],
+    "VirtualMachine": ["ManagedEntity"],
+}
+
+
+class FakeFault(Exception):
+
+    def __init__(self, name, message=""):
+        Exception.__init__(self, "%s: %s" % (name, message))
+        self.name = name
+
+
+def mor(value, obj_type):
+    m = VI.ns0.ManagedObjectReference_Def("mor").pyclass(value)
+    m.set_attribute_type(obj_type)
+    return m
+
+
+def now():
+    return time.gmtime()[:6] + (0, 0, 0)
+
+
+def new(type_name):
+    return getattr(VI.ns0, type_name + "_Def")(type_name).pyclass()
+
+
+def fill_required(obj):
+    # Gives every required element of a data object that is not set a
+    # default value, so partially filled objects can be serialized.
+    for tc in obj.typecode.ofwhat:
+        if tc.minOccurs < 1 or getattr(obj, tc.aname, None) not in [None, []]:
+            continue
+        if isinstance(tc, TC.Boolean):
+            value = False
+        elif isinstance(tc, TC.Gregorian):
+            value = now()
+        elif isinstance(tc, (TC.Integer, TC.Decimal)):
+            value = 0
+        elif isinstance(tc, TC.Enumeration):
+            value = tc.choices[0]
+        elif isinstance(tc, TC.String):
+            value = ""
+        elif hasattr(obj, "new_" + tc.pname):
+            try:
+                value = getattr(obj, "new_" + tc.pname)()
+            except TypeError:
+                continue    # A moref. Set by the caller.
+            if hasattr(value, "typecode") and hasattr(value.typecode, "ofwhat"):
+                fill_required(value)
+        else:
+            continue
+        if tc.maxOccurs != 1:
+            value = [value]
+        setattr(obj, tc.aname, value)
+    return obj
+
+
+def element(obj, name):
+    # An element of a parsed data object. Optional elements that were not
+    # sent are not set at all.
+    return getattr(obj, "_" + name, None)
+
+
+def data(type_name, **values):
+    obj = new(type_name)
+    for name, value in values.items():
+        getattr(obj, "set_element_" + name)(value)
+    return fill_required(obj)
+
+
+def is_mor(value):
+    return hasattr(value, "get_attribute_type") and isinstance(value, basestring)
+
+
+def array(name, values):
+    # The ArrayOf* wrapper a list property is returned in.
+    values = list(values)
+    if values and is_mor(values[0]):
+        element = "ManagedObjectReference"
+    elif values and isinstance(values[0], basestring):
+        element = "string"
+    else:
+        element = LIST_TYPES.get(name.split(".")[-1], "ManagedObjectReference")
+    wrapper = new("ArrayOf" + element[0].upper() + element[1:])
+    getattr(wrapper, "set_element_" + element)(values)
+    return wrapper
+
+
+class Long(long):
+    # A property value sent as xsd:long, which plain Python numbers beyond
+    # the range of xsd:int are not.
+    typecode = TCnumbers.Ilong(pname=("urn:vim25", "val"), typed=True)
+
+
+def fingerprint(value):
+    # Values are replaced, never changed in place, so objects compare by id.
+    if value is None or isinstance(value, (bool, int, long, float)):
+        return value
+    if isinstance(value, basestring):
+        return (str(value), is_mor(value) and value.get_attribute_type())
+    if isinstance(value, list):
+        return tuple([fingerprint(v) for v in value])
+    return id(value)
+
+
+class ManagedObject(object):
+
+    def __init__(self, mor_value, obj_type, props=None):
+        self.mor = mor(mor_value, obj_type)
+        self.type = obj_type
+        self.props = props or {}    # property path -> value (leaves)
+
+    def is_a(self, obj_type):
+        return obj_type == self.type or obj_type in SUPERTYPES.get(self.type, [])
+
+    def top_level(self):
+        return sorted(set([path.split(".")[0] for path in self.props]))
+
+    def get(self, path):
+        # The value of any property path, composing data objects from the
+        # leaves they contain. None when the property is not set.
+        if path in self.props:
+            return self.props[path]
+        top = path.split(".")[0]
+        type_name = COMPOSITES.get((self.type, top))
+        if not type_name:
+            return None
+        obj = new(type_name)
+        prefix = top + "."
+        for key, value in self.props.items():
+            if key.startswith(prefix):
+                node = obj
+                parts = key[len(prefix):].split(".")
+                for part in parts[:-1]:
+                    child = getattr(node, "_" + part, None)
+                    if child is None:
+                        child = getattr(node, "new_" + part)()
+                        getattr(node, "set_element_" + part)(child)
+                    node = child
+                getattr(node, "set_element_" + parts[-1])(value)
+        self.fill(obj)
+        for part in path.split(".")[1:]:
+            obj = getattr(obj, "_" + part, None)
+            if obj is None:
+                return None
+        return obj
+
+    def fingerprint(self, path):
+        # Composed values are built anew on every get(). Compare their leaves.
+        if path in self.props:
+            return fingerprint(self.props[path])
+        prefix = path + "."
+        return tuple([(key, fingerprint(value)) for key, value in sorted(self.props.items())
+                      if key.startswith(prefix)])
+
+    def fill(self, obj):
+        fill_required(obj)
+        for name in dir(obj):
+            if name.startswith("_") and not name.startswith("__"):
+                child = getattr(obj, name, None)
+                if hasattr(child, "typecode") and hasattr(child.typecode, "ofwhat"):
+                    self.fill(child)
+
+
+class Task(object):
+    # A scheduled piece of work with the TaskInfo of a vSphere task.
+
+    def __init__(self, vc, entity, description, work):
+        self.vc = vc
+        self.work = work
+        key = "task-%d" % vc.next_id()
+        self.obj = vc.add(ManagedObject(key, "Task", {
+            "info.key": key,
+            "info.task": mor(key, "Task"),
+            "info.descriptionId": description,
+            "info.entity": entity.mor,
+            "info.entityName": entity.props.get("name", ""),
+            "info.state": "running",
+            "info.cancelled": False,
+            "info.cancelable": False,
+            "info.queueTime": now(),
+            "info.startTime": now(),
+        }))
+        vc.schedule(vc.task_time, self.finish)
+
+    def finish(self):
+        vc = self.vc
+        try:
+            result = self.work()
+            if result is not None:
+                vc.set(self.obj, "info.result", result)
+            vc.set(self.obj, "info.state", "success")
+        except FakeFault as e:
+            error = data("LocalizedMethodFault", localizedMessage=str(e))
+            vc.set(self.obj, "info.error", error)
+            vc.set(self.obj, "info.state", "error")
+        vc.set(self.obj, "info.completeTime", now())
+
+
+class FakeVCenter(object):
+
+    def __init__(self, hosts=2, datastores=2, latency=0.0, task_time=0.2, boot_time=1.0,
+                 install_time=3.0, shutdown_time=0.5, process_time=0.05,
+                 datacenter="DC", template="template"):
+        self.latency = latency
+        self.task_time = task_time
+        self.boot_time = boot_time
+        self.install_time = install_time
+        self.shutdown_time = shutdown_time
+        self.process_time = process_time
+
+        self.cond = threading.Condition(threading.RLock())
+        self.objects = {}       # moref -> ManagedObject
+        self.collectors = {}    # collector moref -> {"filters": {...}, "cancelled": bool}
+        self.filters = {}       # filter moref -> collector moref
+        self.files = {}         # VM moref -> {guest path: content}
+        self.processes = {}     # VM moref -> {pid: process info}
+        self.transfers = {}     # transfer id -> (VM moref, guest path, direction)
+        self.generations = {}   # VM moref -> power cycle, to drop stale guest events
+        self.datastore_root = None  # Folder holding the files of the datastores, see start().
+        self.datastore_failures = 0  # Datastore PUTs to answer with HTTP 503, to test retries.
+        self.ids = itertools.count(100)
+        self.stats_lock = threading.Lock()
+        self.calls = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.events = []
+        self.events_cond = threading.Condition()
+        self.server = None
+        self.url = None
+        self.stopped = False
+        self.build_inventory(hosts, datastores, datacenter, template)
+
+    # -- inventory ------------------------------------------------------------
+
+    def next_id(self):
+        return self.ids.next()
+
+    def add(self, obj):
+        self.cond.acquire()
+        try:
+            self.objects[str(obj.mor)] = obj
+            self.cond.notifyAll()
+            return obj
+        finally:
+            self.cond.release()
+
+    def remove(self, obj):
+        self.cond.acquire()
+        try:
+            self.objects.pop(str(obj.mor), None)
+            self.cond.notifyAll()
+        finally:
+            self.cond.release()
+
+    def set(self, obj, path, value):
+        self.cond.acquire()
+        try:
+            if value is None:
+                obj.props.pop(path, None)
+            else:
+                obj.props[path] = value
+            self.cond.notifyAll()
+        finally:
+            self.cond.release()
+
+    def lookup(self, mor_value):
+        obj = self.objects.get(str(mor_value))
+        if not obj:
+            raise FakeFault("ManagedObjectNotFound", "The object '%s' has already been deleted or has not been completely created" % str(mor_value))
+        return obj
+
+    def link(self, parent, path, child):
+        self.set(parent, path, parent.props.get(path, []) + [child.mor])
+
+    def unlink(self, parent, path, child):
+        self.set(parent, path, [m for m in parent.props.get(path, []) if str(m) != str(child.mor)])
+
+    def build_inventory(self, hosts, datastores, datacenter, template):
+        self.root = self.add(ManagedObject("group-d1", "Folder", {"name": "Datacenters"}))
+        self.host_folder = self.add(ManagedObject("group-h1", "Folder", {"name": "host"}))
+        self.vm_folder = self.add(ManagedObject("group-v1", "Folder", {"name": "vm"}))
+        dc = self.datacenter = self.add(ManagedObject("datacenter-1", "Datacenter", {
+            "name": datacenter, "parent": self.root.mor, "hostFolder": self.host_folder.mor,
+            "vmFolder": self.vm_folder.mor}))
+        self.link(self.root, "childEntity", dc)
+        self.host_folder.props["parent"] = dc.mor
+        self.vm_folder.props["parent"] = dc.mor
+
+        self.network = self.add(ManagedObject("network-1", "Network", {"name": "VM Network"}))
+        self.datastores = []
+        for i in range(1, datastores + 1):
+            ds = self.add(ManagedObject("datastore-%d" % i, "Datastore", {"name": "datastore%d" % i}))
+            ds.props.update({
+                "summary.datastore": ds.mor, "summary.name": ds.props["name"],
+                "summary.url": "ds:///vmfs/volumes/datastore%d/" % i, "summary.type": "VMFS",
+                "summary.capacity": 2 * 1024 ** 4, "summary.freeSpace": (20 - i) * 1024 ** 4 / 10,
+                "summary.uncommitted": 0, "summary.accessible": True})
+            self.datastores.append(ds)
+        dc.props["datastore"] = [d.mor for d in self.datastores]
+        dc.props["network"] = [self.network.mor]
+
+        self.env_browser = self.add(ManagedObject("envbrowser-1", "EnvironmentBrowser"))
+        self.pool = self.add(ManagedObject("resgroup-1", "ResourcePool", {"name": "Resources"}))
+        cluster = self.add(ManagedObject("domain-c1", "ClusterComputeResource", {
+            "name": "Cluster", "parent": self.host_folder.mor, "resourcePool": self.pool.mor,
+            "environmentBrowser": self.env_browser.mor,
+            "datastore": [d.mor for d in self.datastores], "network": [self.network.mor]}))
+        self.pool.props["parent"] = cluster.mor
+        self.pool.props["owner"] = cluster.mor
+        self.link(self.host_folder, "childEntity", cluster)
+        self.hosts = []
+        for i in range(1, hosts + 1):
+            host = self.add(ManagedObject("host-%d" % i, "HostSystem", {
+                "name": "esx-%d.local" % i, "parent": cluster.mor,
+                "datastore": [d.mor for d in self.datastores], "network": [self.network.mor],
+                "runtime.connectionState": "connected", "runtime.inMaintenanceMode": False,
+                "runtime.powerState": "poweredOn",
+                "summary.hardware.cpuMhz": 2400, "summary.hardware.numCpuCores": 16,
+                "summary.hardware.memorySize": 128 * 1024 ** 3,
+                "summary.quickStats.overallCpuUsage": 2000 * i,
+                "summary.quickStats.overallMemoryUsage": 16384 * i,
+                "summary.overallStatus": "green", "summary.rebootRequired": False}))
+            host.props["summary.host"] = host.mor
+            self.link(cluster, "host", host)
+            self.hosts.append(host)
+
+        guest_ops = self.add(ManagedObject("guestOperationsManager", "GuestOperationsManager", {
+            "authManager": mor("guestOperationsAuthManager", "GuestAuthManager"),
+            "fileManager": mor("guestOperationsFileManager", "GuestFileManager"),
+            "processManager": mor("guestOperationsProcessManager", "GuestProcessManager")}))
+        self.guest_ops = guest_ops
+
+        devices = [
+            data("VirtualIDEController", key=200, busNumber=0, device=[3000]),
+            data("VirtualLsiLogicController", key=1000, busNumber=0, sharedBus="noSharing", device=[2000]),
+            data("VirtualDisk", key=2000, controllerKey=1000, unitNumber=0, capacityInKB=41943040,
+                 backing=data("VirtualDiskFlatVer2BackingInfo", fileName="[datastore1] template/template.vmdk",
+                              diskMode="persistent", thinProvisioned=True)),
+            data("VirtualCdrom", key=3000, controllerKey=200, unitNumber=0,
+                 backing=data("VirtualCdromRemoteAtapiBackingInfo", deviceName=""),
+                 connectable=data("VirtualDeviceConnectInfo", startConnected=False, allowGuestControl=True,
+                                  connected=False)),
+            data("VirtualVmxnet3", key=4000, addressType="generated", macAddress="00:50:56:00:00:01",
+                 backing=data("VirtualEthernetCardNetworkBackingInfo", deviceName="VM Network")),
+        ]
+        self.template = self.new_vm(template, self.hosts[0], self.datastores[0], 4096, 2, devices)
+
+    def new_vm(self, name, host, datastore, memory, cpus, devices, annotation=None):
+        key = "vm-%d" % self.next_id()
+        vm = ManagedObject(key, "VirtualMachine", {
+            "name": name, "parent": self.vm_folder.mor, "resourcePool": self.pool.mor,
+            "environmentBrowser": self.env_browser.mor, "datastore": [datastore.mor],
+            "network": [self.network.mor],
+            "config.name": name, "config.guestId": "centos64Guest", "config.guestFullName": "CentOS 4/5/6 (64-bit)",
+            "config.uuid": "4200-%s" % key, "config.template": False, "config.version": "vmx-08",
+            "config.changeVersion": "1",
+            "config.files.vmPathName": "[%s] %s/%s.vmx" % (datastore.props["name"], name, name),
+            "config.hardware.memoryMB": memory, "config.hardware.numCPU": cpus,
+            "config.hardware.device": devices,
+            "runtime.powerState": "poweredOff", "runtime.host": host.mor,
+            "runtime.connectionState": "connected",
+            "guest.toolsStatus": "toolsNotRunning", "guest.toolsRunningStatus": "guestToolsNotRunning",
+            "guest.guestState": "notRunning"})
+        if annotation:
+            vm.props["config.annotation"] = annotation
+        self.add(vm)
+        self.link(self.vm_folder, "childEntity", vm)
+        self.link(self.pool, "vm", vm)
+        self.link(host, "vm", vm)
+        self.files[key] = {}
+        self.processes[key] = {}
+        self.generations[key] = 0
+        return vm
+
+    # -- scheduler ------------------------------------------------------------
+
+    def schedule(self, delay, func):
+        self.events_cond.acquire()
+        try:
+            heapq.heappush(self.events, (time.time() + delay, self.next_id(), func))
+            self.events_cond.notify()
+        finally:
+            self.events_cond.release()
+
+    def run_events(self):
+        while True:
+            self.events_cond.acquire()
+            try:
+                while not self.stopped and (not self.events or self.events[0][0] > time.time()):
+                    self.events_cond.wait(self.events and max(0.001, self.events[0][0] - time.time()) or 1)
+                if self.stopped:
+                    return
+                when, seq, func = heapq.heappop(self.events)
+            finally:
+                self.events_cond.release()
+            try:
+                func()
+            except Exception:
+                pass
+
+    # -- virtual machine life cycle -------------------------------------------
+
+    def power_on(self, vm):
+        if vm.props["runtime.powerState"] == "poweredOn":
+            raise FakeFault("InvalidPowerState", "The VM is powered on already")
+        key = str(vm.mor)
+        self.generations[key] += 1
+        generation = self.generations[key]
+        self.set(vm, "runtime.powerState", "poweredOn")
+        self.set(vm, "runtime.bootTime", now())
+
+        def booted():
+            if self.generations.get(key) != generation:
+                return
+            nic = data("GuestNicInfo", network="VM Network", ipAddress=["10.0.%d.%d" % (self.next_id() / 250 % 250, self.next_id() % 250 + 1)],
+                       macAddress="00:50:56:00:00:01", connected=True, deviceConfigId=4000)
+            self.set(vm, "guest.net", [nic])
+            self.set(vm, "guest.ipAddress", element(nic, "ipAddress")[0])
+            self.set(vm, "guest.hostName", vm.props["name"])
+            self.set(vm, "guest.guestState", "running")
+            self.set(vm, "guest.toolsStatus", "toolsOk")
+            self.set(vm, "guest.toolsRunningStatus", "guestToolsRunning")
+            self.files[key]["/var/lock/subsys/local"] = ""
+
+        def installed():
+            if self.generations.get(key) == generation:
+                self.files[key]["/etc/INSTALLATION_COMPLETED"] = ""
+
+        self.schedule(self.boot_time, booted)
+        if "/etc/INSTALLATION_COMPLETED" not in self.files[key]:
+            self.schedule(self.install_time, installed)
+
+    def power_off(self, vm):
+        key = str(vm.mor)
+        self.generations[key] += 1
+        self.set(vm, "runtime.powerState", "poweredOff")
+        self.set(vm, "guest.guestState", "notRunning")
+        self.set(vm, "guest.toolsStatus", "toolsNotRunning")
+        self.set(vm, "guest.toolsRunningStatus", "guestToolsNotRunning")
+        self.set(vm, "guest.net", None)
+        self.set(vm, "guest.ipAddress", None)
+        for path in self.files[key].keys():
+            if path.startswith("/var/lock/subsys/"):
+                del self.files[key][path]
+
+    def shutdown(self, vm):
+        generation = self.generations.get(str(vm.mor))
+
+        def down():
+            if self.generations.get(str(vm.mor)) == generation:
+                self.power_off(vm)
+        self.schedule(self.shutdown_time, down)
+
+    def destroy(self, vm):
+        if vm.props["runtime.powerState"] != "poweredOff":
+            raise FakeFault("InvalidPowerState", "The attempted operation cannot be performed in the current state (Powered on).")
+        self.unlink(self.vm_folder, "childEntity", vm)
+        self.unlink(self.pool, "vm", vm)
+        for host in self.hosts:
+            self.unlink(host, "vm", vm)
+        self.remove(vm)
+        key = str(vm.mor)
+        for table in [self.files, self.processes, self.generations]:
+            table.pop(key, None)
+
+    def apply_config(self, vm, spec):
+        # The deviceChange, annotation, memory and CPUs of a
+        # VirtualMachineConfigSpec, if its changeVersion (when set) matches.
+        change_version = element(spec, "changeVersion")
+        if change_version is not None and change_version != vm.props.get("config.changeVersion"):
+            raise FakeFault("ConcurrentAccess", "Cannot complete operation due to concurrent modification by another operation.")
+        self.changed(vm)
+        devices = list(vm.props.get("config.hardware.device", []))
+        for change in element(spec, "deviceChange") or []:
+            device = element(change, "device")
+            key = element(device, "key")
+            operation = element(change, "operation")
+            if operation == "add":
+                if key is None or key < 0 or key in [element(d, "key") for d in devices]:
+                    device.set_element_key(self.next_id() + 5000)
+                devices.append(device)
+            elif operation == "edit":
+                devices = [element(d, "key") == key and device or d for d in devices]
+            elif operation == "remove":
+                devices = [d for d in devices if element(d, "key") != key]
+        for d in devices:
+            fill_required(d)
+        self.set(vm, "config.hardware.device", devices)
+        if element(spec, "annotation") is not None:
+            self.set(vm, "config.annotation", element(spec, "annotation"))
+        if element(spec, "memoryMB"):
+            self.set(vm, "config.hardware.memoryMB", element(spec, "memoryMB"))
+        if element(spec, "numCPUs"):
+            self.set(vm, "config.hardware.numCPU", element(spec, "numCPUs"))
+
+    def changed(self, vm):
+        self.set(vm, "config.changeVersion", str(int(vm.props.get("config.changeVersion") or 0) + 1))
+
+    def datastore_of(self, ref, default):
+        return ref and self.lookup(ref) or default
+
+    def host_of(self, ref, default):
+        return ref and self.lookup(ref) or default
+
+    def vm_named(self, name):
+        for obj in self.objects.values():
+            if obj.type == "VirtualMachine" and obj.props.get("name") == name:
+                return obj
+        return None
+
+    # -- SOAP operations ------------------------------------------------------
+
+    def op_RetrieveServiceContent(self, request, response):
+        sc = response.new_returnval()
+        about = data("AboutInfo", name="Fake vCenter", fullName="Fake vCenter (vm_mgmt_fakevc)",
+                     vendor="vm_mgmt_lib", version="5.0.0", build="0", osType="linux-x64",
+                     productLineId="fakevc", apiType="HostAgent", apiVersion="5.0",
+                     instanceUuid="fake")
+        sc.set_element_about(about)
+        sc.set_element_rootFolder(self.root.mor)
+        sc.set_element_propertyCollector(mor("propertyCollector", "PropertyCollector"))
+        sc.set_element_sessionManager(mor("SessionManager", "SessionManager"))
+        sc.set_element_guestOperationsManager(self.guest_ops.mor)
+        return sc
+
+    def op_Login(self, request, response):
+        session = response.new_returnval()
+        for name in ["key", "userName", "fullName", "locale", "messageLocale"]:
+            getattr(session, "set_element_" + name)(element(request, "userName"))
+        session.set_element_loginTime(now())
+        session.set_element_lastActiveTime(now())
+        return session
+
+    def op_Logout(self, request, response):
+        return None
+
+    def op_CurrentTime(self, request, response):
+        return now()
+
+    # Property collector
+
+    def collect(self, spec):
+        # [(object, [property paths])] selected by a PropertyFilterSpec.
+        named = {}
+
+        def register(specs):
+            for s in specs or []:
+                if s.typecode.type[1] == "TraversalSpec":
+                    if element(s, "name"):
+                        named[element(s, "name")] = s
+                    register(element(s, "selectSet"))
+        for object_spec in element(spec, "objectSet") or []:
+            register(element(object_spec, "selectSet"))
+
+        found = []
+        seen = set()
+        visited = set()
+
+        def include(obj):
+            if str(obj.mor) not in seen:
+                seen.add(str(obj.mor))
+                found.append(obj)
+
+        def traverse(obj, specs):
+            for s in specs or []:
+                if s.typecode.type[1] != "TraversalSpec":
+                    s = named.get(element(s, "name"))
+                    if not s:
+                        continue
+                if not obj.is_a(element(s, "type")) or (str(obj.mor), id(s)) in visited:
+                    continue
+                visited.add((str(obj.mor), id(s)))
+                children = obj.props.get(element(s, "path"))
+                if children is None:
+                    continue
+                if not isinstance(children, list):
+                    children = [children]
+                for child_mor in children:
+                    child = self.objects.get(str(child_mor))
+                    if not child:
+                        continue
+                    if not element(s, "skip"):
+                        include(child)
+                    traverse(child, element(s, "selectSet"))
+
+        for object_spec in element(spec, "objectSet") or []:
+            obj = self.lookup(element(object_spec, "obj"))
+            if not element(object_spec, "skip"):
+                include(obj)
+            traverse(obj, element(object_spec, "selectSet"))
+
+        selected = []
+        for obj in found:
+            paths = []
+            for prop_spec in element(spec, "propSet") or []:
+                if obj.is_a(element(prop_spec, "type")):
+                    if element(prop_spec, "all"):
+                        paths.extend(obj.top_level())
+                    else:
+                        paths.extend(element(prop_spec, "pathSet") or [])
+            if paths or [p for p in element(spec, "propSet") or [] if obj.is_a(element(p, "type"))]:
+                selected.append((obj, paths))
+        return selected
+
+    def val(self, path, value):
+        if isinstance(value, list):
+            return array(path, value)
+        if isinstance(value, (int, long)) and not isinstance(value, bool) and abs(value) >= 2 ** 31:
+            return Long(value)
+        return value
+
+    def object_contents(self, container, specs):
+        contents = []
+        self.cond.acquire()
+        try:
+            for spec in specs:
+                for obj, paths in self.collect(spec):
+                    oc = container.new_objects() if hasattr(container, "new_objects") else container.new_returnval()
+                    oc.set_element_obj(obj.mor)
+                    prop_set = []
+                    for path in paths:
+                        value = obj.get(path)
+                        if value is None:
+                            continue
+                        prop = oc.new_propSet()
+                        prop.set_element_name(path)
+                        prop.set_element_val(self.val(path, value))
+                        prop_set.append(prop)
+                    oc.set_element_propSet(prop_set)
+                    contents.append(oc)
+        finally:
+            self.cond.release()
+        return contents
+
+    def op_RetrieveProperties(self, request, response):
+        return self.object_contents(response, element(request, "specSet"))
+
+    def op_RetrievePropertiesEx(self, request, response):
+        result = response.new_returnval()
+        contents = self.object_contents(result, element(request, "specSet"))
+        if not contents:
+            return None
+        result.set_element_objects(contents)
+        return result
+
+    def op_CreatePropertyCollector(self, request, response):
+        collector = mor("session[fake]propertyCollector-%d" % self.next_id(), "PropertyCollector")
+        self.collectors[str(collector)] = {"filters": {}, "cancelled": False, "version": 0}
+        return collector
+
+    def op_DestroyPropertyCollector(self, request, response):
+        collector = self.collectors.pop(str(element(request, "_this")), None)
+        for filter_key in (collector or {}).get("filters", {}).keys():
+            self.filters.pop(filter_key, None)
+        return None
+
+    def op_CreateFilter(self, request, response):
+        collector = self.collectors.get(str(element(request, "_this")))
+        if collector is None:
+            raise FakeFault("ManagedObjectNotFound", str(element(request, "_this")))
+        filter_mor = mor("session[fake]filter-%d" % self.next_id(), "PropertyFilter")
+        self.cond.acquire()
+        try:
+            collector["filters"][str(filter_mor)] = {"mor": filter_mor, "spec": element(request, "spec"),
+                                                     "reported": {}}
+            self.filters[str(filter_mor)] = str(element(request, "_this"))
+            self.cond.notifyAll()
+        finally:
+            self.cond.release()
+        return filter_mor
+
+    def op_DestroyPropertyFilter(self, request, response):
+        key = str(element(request, "_this"))
+        collector = self.collectors.get(self.filters.pop(key, None))
+        if collector:
+            collector["filters"].pop(key, None)
+        return None
+
+    def op_CancelWaitForUpdates(self, request, response):
+        collector = self.collectors.get(str(element(request, "_this")))
+        if collector:
+            self.cond.acquire()
+            try:
+                collector["cancelled"] = True
+                self.cond.notifyAll()
+            finally:
+                self.cond.release()
+        return None
+
+    def pending_updates(self, collector, response):
+        # The changes since the values last reported by every filter. Filters
+    # remember the fingerprints of the values they reported.
+        filter_updates = []
+        for filter_key, entry in collector["filters"].items():
+            current = {}
+            for obj, paths in self.collect_existing(entry["spec"]):
+                current[str(obj.mor)] = (obj, dict([(p, obj.fingerprint(p)) for p in paths]))
+            object_updates = []
+            for key, (obj, values) in current.items():
+                reported = entry["reported"].get(key)
+                changes = {}
+                for path, value in values.items():
+                    if reported is None or reported.get(path) != value:
+                        changes[path] = obj.get(path)
+                if reported is None or changes:
+                    object_updates.append(("enter" if reported is None else "modify", obj.mor, changes))
+                    entry["reported"][key] = values
+            for key in entry["reported"].keys():
+                if key not in current:
+                    object_updates.append(("leave", mor(key, "ManagedEntity"), {}))
+                    del entry["reported"][key]
+            if object_updates:
+                filter_updates.append((entry["mor"], object_updates))
+        return filter_updates
+
+    def collect_existing(self, spec):
+        try:
+            return self.collect(spec)
+        except FakeFault:
+            # Objects of the filter that are gone report no values.
+            alive = []
+            for object_spec in element(spec, "objectSet") or []:
+                obj = self.objects.get(str(element(object_spec, "obj")))
+                if obj:
+                    paths = []
+                    for prop_spec in element(spec, "propSet") or []:
+                        if obj.is_a(element(prop_spec, "type")):
+                            paths.extend(element(prop_spec, "pathSet") or [])
+                    alive.append((obj, paths))
+            return alive
+
+    def op_WaitForUpdatesEx(self, request, response):
+        collector = self.collectors.get(str(element(request, "_this")))
+        if collector is None:
+            raise FakeFault("ManagedObjectNotFound", str(element(request, "_this")))
+        options = element(request, "options")
+        max_wait = options and element(options, "maxWaitSeconds")
+        deadline = time.time() + (30 if max_wait is None else max_wait)
+        self.cond.acquire()
+        try:
+            collector["cancelled"] = False
+            while True:
+                updates = self.pending_updates(collector, response)
+                if updates or collector["cancelled"] or time.time() >= deadline:
+                    break
+                self.cond.wait(deadline - time.time())
+            if collector["cancelled"] and not updates:
+                collector["cancelled"] = False
+                raise FakeFault("RequestCanceled", "The request was canceled.")
+            if not updates:
+                return None
+            collector["version"] += 1
+            update_set = response.new_returnval()
+            update_set.set_element_version(str(collector["version"]))
+            filter_set = []
+            for filter_mor, object_updates in updates:
+                filter_update = update_set.new_filterSet()
+                filter_update.set_element_filter(filter_mor)
+                object_set = []
+                for kind, obj_mor, changes in object_updates:
+                    object_update = filter_update.new_objectSet()
+                    object_update.set_element_kind(kind)
+                    object_update.set_element_obj(obj_mor)
+                    change_set = []
+                    for path, value in changes.items():
+                        change = object_update.new_changeSet()
+                        change.set_element_name(path)
+                        change.set_element_op("assign")
+                        if value is not None:
+                            change.set_element_val(self.val(path, value))
+                        change_set.append(change)
+                    object_update.set_element_changeSet(change_set)
+                    object_set.append(object_update)
+                filter_update.set_element_objectSet(object_set)
+                filter_set.append(filter_update)
+            update_set.set_element_filterSet(filter_set)
+            return update_set
+        finally:
+            self.cond.release()
+
+    # Environment browser
+
+    def op_QueryConfigTarget(self, request, response):
+        target = response.new_returnval()
+        datastores = []
+        for ds in self.datastores:
+            info = target.new_datastore()
+            info.set_element_name(ds.props["name"])
+            info.set_element_datastore(ds.get("summary"))
+            info.set_element_maxFileSize(2 * 1024 ** 4)
+            info.set_element_mode("readWrite")
+            datastores.append(fill_required(info))
+        target.set_element_datastore(datastores)
+        network = target.new_network()
+        network.set_element_name(self.network.props["name"])
+        network.set_element_network(data("NetworkSummary", network=self.network.mor,
+                                         name=self.network.props["name"], accessible=True))
+        target.set_element_network([fill_required(network)])
+        target.set_element_numCpus(32)
+        target.set_element_numCpuCores(16)
+        target.set_element_numNumaNodes(2)
+        return fill_required(target)
+
+    def op_QueryConfigOption(self, request, response):
+        option = response.new_returnval()
+        option.set_element_version("vmx-08")
+        option.set_element_description("Hardware version 8")
+        option.set_element_defaultDevice([data("VirtualIDEController", key=200, busNumber=0),
+                                          data("VirtualIDEController", key=201, busNumber=1),
+                                          data("VirtualPCIController", key=100, busNumber=0)])
+        fill_required(option)
+        ManagedObject("", "").fill(option)
+        return option
+
+    # Virtual machine tasks
+
+    def task(self, entity, description, work):
+        return Task(self, entity, description, work).obj.mor
+
+    def op_CreateVM_Task(self, request, response):
+        config = element(request, "config")
+        host = self.host_of(element(request, "host"), self.hosts[0])
+        path = element(element(config, "files"), "vmPathName")
+        datastore = ([ds for ds in self.datastores if "[%s]" % ds.props["name"] in path] or self.datastores)[0]
+
+        def work():
+            if self.vm_named(element(config, "name")):
+                raise FakeFault("DuplicateName", "The name '%s' already exists." % element(config, "name"))
+            vm = self.new_vm(element(config, "name"), host, datastore, element(config, "memoryMB") or 1024,
+                             element(config, "numCPUs") or 1, [], element(config, "annotation"))
+            self.apply_config(vm, config)
+            return vm.mor
+        return self.task(self.vm_folder, "Folder.createVm", work)
+
+    def op_CloneVM_Task(self, request, response):
+        source = self.lookup(element(request, "_this"))
+        name = element(request, "name")
+        spec = element(request, "spec")
+        location = element(spec, "location")
+        host = self.host_of(element(location, "host"),
+                            self.lookup(source.props["runtime.host"]))
+        datastore = self.datastore_of(element(location, "datastore"),
+                                      self.lookup(source.props["datastore"][0]))
+
+        def work():
+            if self.vm_named(name):
+                raise FakeFault("DuplicateName", "The name '%s' already exists." % name)
+            if element(spec, "snapshot"):
+                raise FakeFault("NotSupported", "Linked clones are not emulated.")
+            vm = self.new_vm(name, host, datastore, source.props["config.hardware.memoryMB"],
+                             source.props["config.hardware.numCPU"],
+                             copy.deepcopy(source.props["config.hardware.device"]),
+                             source.props.get("config.annotation"))
+            self.files[str(vm.mor)] = dict(self.files.get(str(source.mor), {}))
+            for path in self.files[str(vm.mor)].keys():
+                if path.startswith("/var/lock/subsys/"):
+                    del self.files[str(vm.mor)][path]
+            self.files[str(vm.mor)].pop("/etc/INSTALLATION_COMPLETED", None)
+            if element(spec, "config"):
+                self.apply_config(vm, element(spec, "config"))
+            if element(spec, "powerOn"):
+                self.power_on(vm)
+            return vm.mor
+        return self.task(source, "VirtualMachine.clone", work)
+
+    def op_ReconfigVM_Task(self, request, response):
+        vm = self.lookup(element(request, "_this"))
+        return self.task(vm, "VirtualMachine.reconfigure",
+                         lambda: self.apply_config(self.lookup(vm.mor), element(request, "spec")))
+
+    def op_PowerOnVM_Task(self, request, response):
+        vm = self.lookup(element(request, "_this"))
+        return self.task(vm, "VirtualMachine.powerOn", lambda: self.power_on(self.lookup(vm.mor)))
+
+    def op_PowerOffVM_Task(self, request, response):
+        vm = self.lookup(element(request, "_this"))
+
+        def work():
+            if self.lookup(vm.mor).props["runtime.powerState"] == "poweredOff":
+                raise FakeFault("InvalidPowerState", "The VM is powered off already")
+            self.power_off(vm)
+        return self.task(vm, "VirtualMachine.powerOff", work)
+
+    def op_ShutdownGuest(self, request, response):
+        vm = self.lookup(element(request, "_this"))
+        if vm.props["guest.toolsRunningStatus"] != "guestToolsRunning":
+            raise FakeFault("ToolsUnavailable", "Cannot complete operation because VMware Tools is not running in this virtual machine.")
+        self.shutdown(vm)
+        return None
+
+    def op_Destroy_Task(self, request, response):
+        vm = self.lookup(element(request, "_this"))
+        return self.task(vm, "VirtualMachine.destroy", lambda: self.destroy(self.lookup(vm.mor)))
+
+    def op_Rename_Task(self, request, response):
+        vm = self.lookup(element(request, "_this"))
+        name = element(request, "newName")
+
+        def work():
+            if self.vm_named(name):
+                raise FakeFault("DuplicateName", "The name '%s' already exists." % name)
+            self.set(vm, "name", name)
+            self.set(vm, "config.name", name)
+            self.changed(vm)
+        return self.task(vm, "VirtualMachine.rename", work)
+
+    # Guest operations
+
+    def guest(self, request):
+        vm = self.lookup(element(request, "vm"))
+        if vm.props["guest.toolsRunningStatus"] != "guestToolsRunning":
+            raise FakeFault("GuestOperationsUnavailable", "The guest operations agent could not be contacted.")
+        return vm
+
+    def op_ValidateCredentialsInGuest(self, request, response):
+        self.guest(request)
+        return None
+
+    def op_ListFilesInGuest(self, request, response):
+        vm = self.guest(request)
+        path = element(request, "filePath")
+        files = self.files[str(vm.mor)]
+        if path not in files:
+            raise FakeFault("FileNotFound", "File %s was not found" % path)
+        result = response.new_returnval()
+        info = result.new_files()
+        info.set_element_path(path)
+        info.set_element_type("file")
+        info.set_element_size(len(files[path]))
+        info.set_element_attributes(new("GuestFileAttributes"))
+        result.set_element_files([fill_required(info)])
+        result.set_element_remaining(0)
+        return result
+
+    def transfer_url(self, vm, path, direction):
+        transfer = "%d" % self.next_id()
+        self.transfers[transfer] = (str(vm.mor), path, direction)
+        return "http://*:%d/guestFile?id=%s" % (self.server.server_port, transfer)
+
+    def op_InitiateFileTransferToGuest(self, request, response):
+        vm = self.guest(request)
+        return self.transfer_url(vm, element(request, "guestFilePath"), "to")
+
+    def op_InitiateFileTransferFromGuest(self, request, response):
+        vm = self.guest(request)
+        path = element(request, "guestFilePath")
+        if path not in self.files[str(vm.mor)]:
+            raise FakeFault("FileNotFound", "File %s was not found" % path)
+        info = response.new_returnval()
+        info.set_element_attributes(new("GuestFileAttributes"))
+        info.set_element_size(len(self.files[str(vm.mor)][path]))
+        info.set_element_url(self.transfer_url(vm, path, "from"))
+        return info
+
+    def op_StartProgramInGuest(self, request, response):
+        vm = self.guest(request)
+        spec = element(request, "spec")
+        program = element(spec, "programPath")
+        arguments = element(spec, "arguments") or ""
+        processes = self.processes[str(vm.mor)]
+        pid = self.next_id()
+        processes[pid] = {"name": program, "cmd": "%s %s" % (program, arguments), "start": now(),
+                          "end": None, "exit": None}
+        files = self.files[str(vm.mor)]
+        exit_code = 0
+        if program == "/bin/sh" and arguments.strip() not in files:
+            exit_code = 127
+        generation = self.generations.get(str(vm.mor))
+
+        def finish():
+            processes[pid]["end"] = now()
+            processes[pid]["exit"] = exit_code
+            # Init scripts lock their service in /var/lock/subsys when started.
+            started = re.search(r"/service (\S+) start", files.get(arguments.strip(), ""))
+            if exit_code == 0 and started and self.generations.get(str(vm.mor)) == generation:
+                files["/var/lock/subsys/" + started.group(1)] = ""
+        if program == "/sbin/shutdown":
+            self.shutdown(vm)
+        self.schedule(self.process_time, finish)
+        return pid
+
+    def op_ListProcessesInGuest(self, request, response):
+        vm = self.guest(request)
+        processes = self.processes[str(vm.mor)]
+        pids = element(request, "pids") or processes.keys()
+        result = []
+        for pid in pids:
+            process = processes.get(pid)
+            if not process:
+                continue
+            info = new("GuestProcessInfo")
+            info.set_element_name(process["name"])
+            info.set_element_pid(pid)
+            info.set_element_owner("root")
+            info.set_element_cmdLine(process["cmd"])
+            info.set_element_startTime(process["start"])
+            if process["end"]:
+                info.set_element_endTime(process["end"])
+                info.set_element_exitCode(process["exit"])
+            result.append(info)
+        return result
+
+    # -- HTTP -----------------------------------------------------------------
+
+    def count(self, method, bytes_in, bytes_out):
+        self.stats_lock.acquire()
+        try:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+        finally:
+            self.stats_lock.release()
+
+    def stats(self):
+        # A snapshot of the call counters: {"calls": {method: count},
+        # "round_trips", "bytes_in", "bytes_out"}.
+        self.stats_lock.acquire()
+        try:
+            return {"calls": dict(self.calls), "round_trips": sum(self.calls.values()),
+                    "bytes_in": self.bytes_in, "bytes_out": self.bytes_out}
+        finally:
+            self.stats_lock.release()
+
+    def handle_soap(self, body):
+        # Returns (HTTP status, response body).
+        if self.latency:
+            time.sleep(self.latency)
+        ps = ParsedSoap(body)
+        name = ps.body_root.localName
+        handler = getattr(self, "op_" + name, None)
+        try:
+            if not handler:
+                raise FakeFault("NotSupported", "%s is not emulated." % name)
+            request = ps.Parse(getattr(VI, name + "RequestMsg").typecode)
+            response = getattr(VI, name + "ResponseMsg")()
+            value = handler(request, response)
+            if value is not None:
+                response.set_element_returnval(value)
+            sw = SoapWriter()
+            sw.serialize(response)
+            out = str(sw)
+            status = 200
+        except FakeFault as e:
+            out = str(Fault(Fault.Server, str(e)).AsSOAP())
+            status = 500
+        except Exception as e:
+            # Bugs of the emulation surface as the SystemError of a vCenter.
+            out = str(Fault(Fault.Server, "SystemError: %s: %s" % (name, traceback.format_exc())).AsSOAP())
+            status = 500
+        self.count(name, len(body), len(out))
+        return status, out
+
+    def handle_transfer(self, method, path, body):
+        query = parse_qs(urlparse(path).query)
+        transfer = self.transfers.pop((query.get("id") or [""])[0], None)
+        if not transfer:
+            return 404, ""
+        vm_key, guest_path, direction = transfer
+        files = self.files.get(vm_key)
+        if files is None:
+            return 404, ""
+        self.count("guestFile" + method, len(body or ""), 0)
+        if direction == "to" and method == "PUT":
+            files[guest_path] = body
+            return 200, ""
+        if direction == "from" and method == "GET":
+            return 200, files.get(guest_path, "")
+        return 400, ""
+
+    def handle_datastore(self, method, path, authorization, body):
+        # HEAD, GET or PUT of /folder/<path>?dcPath=<datacenter>&dsName=<datastore>,
+        # the HTTP file access of vSphere. Returns (HTTP status, response
+        # body, content length).
+        url = urlparse(path)
+        query = parse_qs(url.query)
+        self.count("datastore" + method, len(body or ""), 0)
+        if not authorization:
+            return 401, "", 0
+        datastore = (query.get("dsName") or [""])[0]
+        if ((query.get("dcPath") or [""])[0] != self.datacenter.props["name"]
+                or datastore not in [d.props["name"] for d in self.datastores]):
+            return 404, "", 0
+        relative = urllib.unquote(url.path[len("/folder/"):])
+        if not relative or relative.startswith("/") or ".." in relative.split("/"):
+            return 400, "", 0
+        local_path = os.path.join(self.datastore_root, datastore, relative)
+        if method == "PUT":
+            self.stats_lock.acquire()
+            try:
+                failing = self.datastore_failures > 0
+                if failing:
+                    self.datastore_failures -= 1
+            finally:
+                self.stats_lock.release()
+            if failing:
+                return 503, "", 0
+            created = not os.path.exists(local_path)
+            if not os.path.isdir(os.path.dirname(local_path)):
+                os.makedirs(os.path.dirname(local_path))
+            with open(local_path, "wb") as f:
+                f.write(body)
+            return (201 if created else 200), "", 0
+        if not os.path.isfile(local_path):
+            return 404, "", 0
+        if method == "HEAD":
+            return 200, "", os.path.getsize(local_path)
+        with open(local_path, "rb") as f:
+            content = f.read()
+        return 200, content, len(content)
+
+    def start(self, port=0):
+        vc = self
+        self.datastore_root = tempfile.mkdtemp(prefix="fakevc-datastores-")
+
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def reply(self, status, out, length=None):
+                self.send_response(status)
+                self.send_header("Content-Type", "text/xml; charset=utf-8")
+                self.send_header("Content-Length", str(len(out) if length is None else length))
+                self.end_headers()
+                self.wfile.write(out)
+
+            def body(self):
+                return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+            def datastore(self, method, body=None):
+                self.reply(*vc.handle_datastore(method, self.path, self.headers.get("Authorization"), body))
+
+            def do_POST(self):
+                self.reply(*vc.handle_soap(self.body()))
+
+            def do_PUT(self):
+                if self.path.startswith("/folder/"):
+                    return self.datastore("PUT", self.body())
+                self.reply(*vc.handle_transfer("PUT", self.path, self.body()))
+
+            def do_GET(self):
+                if self.path.startswith("/folder/"):
+                    return self.datastore("GET")
+                self.reply(*vc.handle_transfer("GET", self.path, None))
+
+            def do_HEAD(self):
+                if self.path.startswith("/folder/"):
+                    return self.datastore("HEAD")
+                self.reply(404, "")
+
+            def log_message(self, *args):
+                pass
+
+        class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+
+        self.server = Server(("127.0.0.1", port), Handler)
+        self.url = "http://127.0.0.1:%d/sdk" % self.server.server_port
+        for target in [self.server.serve_forever, self.run_events]:
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
+        return self.url
+
+    def stop(self):
+        self.events_cond.acquire()
+        try:
+            self.stopped = True
+            self.events_cond.notify()
+        finally:
+            self.events_cond.release()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        if self.datastore_root:
+            shutil.rmtree(self.datastore_root, ignore_errors=True)
+            self.datastore_root = None
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("--port", dest="port", type="int", default=8989, help="Port to listen on. Default=8989.")
+    parser.add_option("--hosts", dest="hosts", type="int", default=2, help="Number of ESXi hosts. Default=2.")
+    parser.add_option("--datastores", dest="datastores", type="int", default=2, help="Number of datastores. Default=2.")
+    parser.add_option("--latency", dest="latency", type="float", default=0.0,
+                      help="Seconds added to every SOAP call. Default=0.")
+    parser.add_option("--task-time", dest="task_time", type="float", default=0.2,
+                      help="Seconds every task runs. Default=0.2.")
+    parser.add_option("--install-time", dest="install_time", type="float", default=3.0,
+                      help="Seconds from the first power on of a VM to the end of its OS installation. Default=3.")
+    opts, args = parser.parse_args()
+
+    vc = FakeVCenter(opts.hosts, opts.datastores, opts.latency, opts.task_time,
+                     install_time=opts.install_time)
+    print "Fake vCenter listening on", vc.start(opts.port)
+    print "Datastore files (ISO_DATASTORE_URL) at", vc.url.replace("/sdk", "/folder")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        vc.stop()
+
+if __name__ == "__main__":
+    main()
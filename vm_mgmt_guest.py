@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+
+# ==============================================================================
+# Name          :   vm_mgmt_guest.py
+#
+# Description   :   Runs commands in guests and waits for them to finish.
+#                   Started processes are tracked by pid and waited for with
+#                   one ListProcessesInGuest call for all of them, and their
+#                   exit codes are returned. A sequence of steps can be run as
+#                   a single uploaded script.
+#
+# Version       :   1.0.0
+#
+# Author        :   Santhoshkumar Settipalli
+#
+# Change log    :
+#   17-Oct-2026 :    Santhoshkumar Settipalli (santhosh.settipalli@gmail.com)
+#                    Initial version.
+#
+# ==============================================================================
+
+import os
+import time
+import pipes
+import hashlib
+import settings
+import tempfile
+import vm_mgmt_transfer
+from pysphere.resources import VimService_services as VI
+
+# Polling of running processes starts fast, for short commands, and backs off.
+MIN_POLL_INTERVAL = 0.25
+MAX_POLL_INTERVAL = 2
+
+
+def exit_codes(guest_vm, pids):
+    # {pid: exit code} of the processes started by start_process(), with
+    # None for those still running, from a single ListProcessesInGuest call.
+    request = VI.ListProcessesInGuestRequestMsg()
+    _this = request.new__this(guest_vm._proc_mgr)
+    _this.set_attribute_type(guest_vm._proc_mgr.get_attribute_type())
+    request.set_element__this(_this)
+    vm = request.new_vm(guest_vm._mor)
+    vm.set_attribute_type(guest_vm._mor.get_attribute_type())
+    request.set_element_vm(vm)
+    request.set_element_auth(guest_vm._auth_obj)
+    request.set_element_pids(list(pids))
+    codes = dict([(pid, None) for pid in pids])
+    for proc in guest_vm._server._proxy.ListProcessesInGuest(request)._returnval or []:
+        if proc.Pid in codes and getattr(proc, "EndTime", None) is not None:
+            codes[proc.Pid] = getattr(proc, "ExitCode", None)
+    return codes
+
+
+class Commands(object):
+    # Processes started in one logged in guest (see login_in_guest()) and
+    # waited for together.
+
+    def __init__(self, guest_vm):
+        self.guest_vm = guest_vm
+        self.running = {}   # pid -> label
+        self.exited = {}    # label -> exit code
+
+    def start(self, program, args=None, cwd=None, env=None, label=None):
+        # 'args' is a list of arguments. Returns the pid.
+        pid = self.guest_vm.start_process(program, args=args, env=env, cwd=cwd)
+        self.running[pid] = label or pid
+        return pid
+
+    def wait(self, timeout=None):
+        # Waits for all started processes. Returns {label: exit code}, with
+        # None for the processes still running after 'timeout' seconds.
+        timeout = timeout or settings.GUEST_COMMAND_TIMEOUT
+        deadline = time.time() + timeout
+        interval = MIN_POLL_INTERVAL
+        while self.running:
+            for pid, code in exit_codes(self.guest_vm, self.running.keys()).items():
+                if code is not None:
+                    self.exited[self.running.pop(pid)] = code
+            if not self.running or time.time() >= deadline:
+                break
+            time.sleep(min(interval, max(0, deadline - time.time())))
+            interval = min(MAX_POLL_INTERVAL, interval * 2)
+        codes = dict(self.exited)
+        for label in self.running.values():
+            codes[label] = None
+        return codes
+
+
+def run(guest_vm, program, args=None, cwd=None, env=None, timeout=None):
+    # Runs one command and returns its exit code.
+    commands = Commands(guest_vm)
+    commands.start(program, args, cwd, env, label=program)
+    code = commands.wait(timeout)[program]
+    if code is None:
+        raise Exception("%s is still running after %s seconds" %
+                        (program, str(timeout or settings.GUEST_COMMAND_TIMEOUT)))
+    return code
+
+
+def script(steps):
+    # A /bin/sh script running 'steps' (lists of program and arguments) in
+    # order and stopping at the first one that fails.
+    lines = ["#!/bin/sh", "set -e"]
+    for step in steps:
+        lines.append(" ".join([pipes.quote(str(arg)) for arg in step]))
+    return "\n".join(lines) + "\n"
+
+
+def run_script(guest_vm, steps, cwd="/", timeout=None):
+    # Runs the steps as one script uploaded to the guest, instead of one
+    # process per step. The script is named after its content, so guests
+    # already holding it are not sent it again. Returns its exit code.
+    content = script(steps)
+    digest = hashlib.sha256(content).hexdigest()
+    local_folder = os.path.join(settings.CACHE_FOLDER, "guest-scripts")
+    local_path = os.path.join(local_folder, digest + ".sh")
+    if not os.path.exists(local_path):
+        try:
+            os.makedirs(local_folder)
+        except OSError:
+            pass    # Exists already.
+        fd, tmp_path = tempfile.mkstemp(dir=local_folder)
+        os.write(fd, content)
+        os.close(fd)
+        os.rename(tmp_path, local_path)
+    guest_path = "%s/vm-mgmt-%s.sh" % (settings.GUEST_SCRIPT_FOLDER, digest[:16])
+    vm_mgmt_transfer.upload_file(guest_vm, local_path, guest_path)
+    return run(guest_vm, "/bin/sh", [guest_path], cwd=cwd, timeout=timeout)
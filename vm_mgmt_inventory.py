@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+
+# ==============================================================================
+# Name          :   vm_mgmt_inventory.py
+#
+# Description   :   Discovery of the inventory objects needed to place a new
+#                   VM (datacenter, folders, host, compute resource, resource
+#                   pool and environment browser) and an on-disk cache of
+#                   their morefs per vCenter, so a warm run skips discovery.
+#
+# Version       :   1.0.0
+#
+# Author        :   Santhoshkumar Settipalli
+#
+# Change log    :
+#   17-Oct-2026 :    Santhoshkumar Settipalli (santhosh.settipalli@gmail.com)
+#                    Initial version.
+#
+# ==============================================================================
+
+import os
+import json
+import time
+import tempfile
+import settings
+from pysphere.resources import VimService_services as VI
+from pysphere.vi_mor import VIMor, MORTypes
+
+PLACEMENT_KEYS = ["datacenter", "host_folder", "vm_folder", "host",
+                  "compute_resource", "resource_pool", "environment_browser"]
+
+
+def cache_file(vcenter_key):
+    return os.path.join(settings.CACHE_FOLDER, "inventory-%s.json" % vcenter_key)
+
+
+def load_cache(vcenter_key):
+    try:
+        with open(cache_file(vcenter_key)) as f:
+            cache = json.load(f)
+    except (IOError, ValueError):
+        return {}
+    if time.time() - cache.get("created", 0) > settings.INVENTORY_CACHE_TTL:
+        return {}
+    return cache
+
+
+def save_cache(vcenter_key, cache):
+    # Write to a temporary file and rename it so that concurrent readers
+    # never see a partially written cache.
+    try:
+        if not os.path.isdir(settings.CACHE_FOLDER):
+            os.makedirs(settings.CACHE_FOLDER)
+        fd, tmp_path = tempfile.mkstemp(dir=settings.CACHE_FOLDER)
+        with os.fdopen(fd, "w") as f:
+            json.dump(cache, f)
+        os.rename(tmp_path, cache_file(vcenter_key))
+    except (IOError, OSError):
+        # The cache is only an optimization.
+        pass
+
+
+def invalidate(vcenter_key):
+    try:
+        os.remove(cache_file(vcenter_key))
+    except OSError:
+        pass
+
+
+def is_stale_moref_error(e):
+    # vCenter answers with a ManagedObjectNotFound fault when a moref refers
+    # to an object that was removed (or re-registered under a new moref).
+    message = str(e)
+    return ("ManagedObjectNotFound" in message
+            or "has already been deleted" in message)
+
+
+def traversal_specs(object_spec):
+    # Folder -> childEntity, Datacenter -> hostFolder and ComputeResource ->
+    # host is enough to reach every datacenter, compute resource and host.
+    visit_folders = VI.ns0.TraversalSpec_Def('visitFolders').pyclass()
+    visit_folders.set_element_name('visitFolders')
+    visit_folders.set_element_type(MORTypes.Folder)
+    visit_folders.set_element_path('childEntity')
+    visit_folders.set_element_skip(False)
+
+    dc_to_hf = VI.ns0.TraversalSpec_Def('dcToHf').pyclass()
+    dc_to_hf.set_element_name('dcToHf')
+    dc_to_hf.set_element_type(MORTypes.Datacenter)
+    dc_to_hf.set_element_path('hostFolder')
+    dc_to_hf.set_element_skip(False)
+
+    cr_to_h = VI.ns0.TraversalSpec_Def('crToH').pyclass()
+    cr_to_h.set_element_name('crToH')
+    cr_to_h.set_element_type(MORTypes.ComputeResource)
+    cr_to_h.set_element_path('host')
+    cr_to_h.set_element_skip(False)
+
+    select_sets = []
+    for name in ['visitFolders', 'dcToHf', 'crToH']:
+        select_set = object_spec.new_selectSet()
+        select_set.set_element_name(name)
+        select_sets.append(select_set)
+    visit_folders.set_element_selectSet(select_sets)
+    dc_to_hf.set_element_selectSet(select_sets[:1])
+
+    return [visit_folders, dc_to_hf, cr_to_h]
+
+
+def build_placement_index(s):
+    # Walks the inventory once and returns
+    #   {datacenter name: {host name: {<PLACEMENT_KEYS>: moref}}}
+    # so that resolving where a VM goes is a dictionary lookup.
+    request, request_call = s._retrieve_property_request()
+    collector = s._do_service_content.PropertyCollector
+    _this = request.new__this(collector)
+    _this.set_attribute_type(collector.get_attribute_type())
+    request.set_element__this(_this)
+
+    spec = request.new_specSet()
+    prop_sets = []
+    for mo_type, path_set in [(MORTypes.Datacenter, ['name', 'hostFolder', 'vmFolder']),
+                              (MORTypes.Folder, ['parent']),
+                              (MORTypes.ComputeResource, ['parent', 'resourcePool', 'environmentBrowser']),
+                              (MORTypes.HostSystem, ['name', 'parent'])]:
+        prop_set = spec.new_propSet()
+        prop_set.set_element_type(mo_type)
+        prop_set.set_element_pathSet(path_set)
+        prop_set.set_element_all(False)
+        prop_sets.append(prop_set)
+    spec.set_element_propSet(prop_sets)
+
+    root = s._do_service_content.RootFolder
+    object_spec = spec.new_objectSet()
+    obj = object_spec.new_obj(root)
+    obj.set_attribute_type(root.get_attribute_type())
+    object_spec.set_element_obj(obj)
+    object_spec.set_element_skip(False)
+    object_spec.set_element_selectSet(traversal_specs(object_spec))
+    spec.set_element_objectSet([object_spec])
+    request.set_element_specSet([spec])
+
+    datacenters = {}    # moref -> properties
+    compute_resources = {}
+    hosts = []
+    parents = {}
+    for oc in request_call(request) or []:
+        props = dict([(p.Name, p.Val) for p in getattr(oc, "PropSet", None) or []])
+        mo_type = oc.Obj.get_attribute_type()
+        if "parent" in props:
+            parents[str(oc.Obj)] = props["parent"]
+        if mo_type == MORTypes.Datacenter:
+            datacenters[str(oc.Obj)] = (oc.Obj, props)
+        elif mo_type == MORTypes.HostSystem:
+            hosts.append((oc.Obj, props))
+        elif "resourcePool" in props:
+            compute_resources[str(oc.Obj)] = (oc.Obj, props)
+
+    index = {}
+    for hostmor, props in hosts:
+        crmor = props.get("parent")
+        if str(crmor) not in compute_resources:
+            continue
+        # Climb folders until the datacenter owning this compute resource.
+        node = str(crmor)
+        while node in parents and node not in datacenters:
+            node = str(parents[node])
+        if node not in datacenters:
+            continue
+
+        dcmor, dcprops = datacenters[node]
+        crprops = compute_resources[str(crmor)][1]
+        index.setdefault(dcprops["name"], {})[props["name"]] = {
+            "datacenter": dcmor,
+            "host_folder": dcprops["hostFolder"],
+            "vm_folder": dcprops["vmFolder"],
+            "host": hostmor,
+            "compute_resource": crmor,
+            "resource_pool": crprops["resourcePool"],
+            "environment_browser": crprops["environmentBrowser"],
+        }
+    return index
+
+
+def get_placement_index(s, vcenter_key, refresh=False):
+    # Returns the placement index of the vCenter, from the cache when
+    # possible. Use refresh=True after a stale moref was detected.
+    cache = {} if refresh else load_cache(vcenter_key)
+    if "index" in cache:
+        index = {}
+        for dcname, dchosts in cache["index"].items():
+            for hostname, entry in dchosts.items():
+                index.setdefault(dcname, {})[hostname] = dict(
+                    [(k, VIMor(v[0], v[1])) for k, v in entry.items()])
+        return index
+
+    index = build_placement_index(s)
+
+    cache = {"created": time.time(), "index": {}}
+    for dcname, dchosts in index.items():
+        for hostname, placement in dchosts.items():
+            cache["index"].setdefault(dcname, {})[hostname] = dict(
+                [(k, (str(v), v.get_attribute_type())) for k, v in placement.items()])
+    save_cache(vcenter_key, cache)
+    return index
+
+
+def get_placement(s, vcenter_key, datacentername, hostname, refresh=False):
+    # Returns a dict of the morefs in PLACEMENT_KEYS for the host.
+    index = get_placement_index(s, vcenter_key, refresh)
+    placement = index.get(datacentername, {}).get(hostname)
+    if not placement and not refresh:
+        # The host may have been added after the index was cached.
+        return get_placement(s, vcenter_key, datacentername, hostname, refresh=True)
+    if not placement:
+        raise Exception("couldn't find host %s in datacenter %s" % (hostname, datacentername))
+    return placement
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+
+# ==============================================================================
+# Name          :   vm_mgmt_iso.py
+#
+# Description   :   Uploads ISO files to the datastores of the VCENTER_SERVERS
+#                   over the HTTP datastore interface (/folder). ISOs are
+#                   streamed, retried, and identified by the sha256 digest
+#                   kept in a '<iso>.sha256' sidecar next to them, so an ISO
+#                   already at its path on the datastore is never sent again
+#                   and an interrupted batch picks up where it stopped. The
+#                   digest is only compared with the file at the target path:
+#                   the same content under another name or product is
+#                   uploaded again.
+#
+# Version       :   1.0.0
+#
+# Author        :   Santhoshkumar Settipalli
+#
+# Change log    :
+#   17-Oct-2026 :    Santhoshkumar Settipalli (santhosh.settipalli@gmail.com)
+#                    Initial version.
+#
+# ==============================================================================
+
+import os
+import time
+import base64
+import urllib
+import httplib
+import settings
+import vm_mgmt_transfer
+import vm_mgmt_workers
+from urlparse import urlparse
+
+
+def iso_path(product, filename):
+    # Path of the ISO relative to the root of the datastore.
+    return "%s/%s/%s" % (settings.ISO_FOLDER, product, filename)
+
+
+def datastore_url(vcenter, path):
+    base = settings.ISO_DATASTORE_URL % {"host": vcenter.ip}
+    return "%s/%s?%s" % (base.rstrip("/"), urllib.quote(path),
+                         urllib.urlencode([("dcPath", vcenter.datacenter), ("dsName", vcenter.datastore)]))
+
+
+def request(vcenter, method, path, body=None, size=None):
+    # Sends one request to the datastore interface and returns (status,
+    # headers, content). 'body' may be a file object, streamed in chunks.
+    url = urlparse(datastore_url(vcenter, path))
+    if url.scheme == "https":
+        conn = httplib.HTTPSConnection(url.netloc)
+    else:
+        conn = httplib.HTTPConnection(url.netloc)
+    try:
+        conn.putrequest(method, "%s?%s" % (url.path, url.query))
+        conn.putheader("Authorization", "Basic " + base64.b64encode(
+            "%s:%s" % (vcenter.username, vcenter.password)))
+        if body is not None:
+            if isinstance(body, str):
+                size = len(body)
+            conn.putheader("Content-Type", "application/octet-stream")
+            conn.putheader("Content-Length", str(size))
+        conn.endheaders()
+        if isinstance(body, str):
+            conn.send(body)
+        elif body is not None:
+            while True:
+                chunk = body.read(settings.TRANSFER_CHUNK_SIZE)
+                if not chunk:
+                    break
+                conn.send(chunk)
+        response = conn.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+    finally:
+        conn.close()
+
+
+def remote_size(vcenter, path):
+    # Size of the file on the datastore, or None when it does not exist.
+    status, headers, content = request(vcenter, "HEAD", path)
+    if status != 200:
+        return None
+    return long(headers.get("content-length", -1))
+
+
+def remote_digest(vcenter, path):
+    status, headers, content = request(vcenter, "GET", path + ".sha256")
+    if status != 200:
+        return None
+    return content.strip()
+
+
+def is_uploaded(vcenter, path, size, digest):
+    return remote_size(vcenter, path) == size and remote_digest(vcenter, path) == digest
+
+
+def upload(vcenter_key, local_path, product, filename=None, retries=None):
+    # Uploads the ISO to the datastore of the vCenter unless the file at its
+    # path (product folder and file name) has the same content already.
+    # Copies under other paths are not looked for. Returns True if it was
+    # uploaded.
+    vcenter = settings.VCENTER_SERVERS[vcenter_key]
+    path = iso_path(product, filename or os.path.basename(local_path))
+    size = os.path.getsize(local_path)
+    digest = vm_mgmt_transfer.file_digest(local_path)
+    retries = settings.ISO_UPLOAD_RETRIES if retries is None else retries
+
+    attempt = 0
+    while True:
+        try:
+            if is_uploaded(vcenter, path, size, digest):
+                return False
+            fd = open(local_path, "rb")
+            try:
+                status, headers, content = request(vcenter, "PUT", path, fd, size)
+            finally:
+                fd.close()
+            if status not in [200, 201, 204]:
+                raise Exception("uploading %s failed: HTTP %d" % (path, status))
+            # The sidecar goes last: it marks the ISO as complete.
+            status, headers, content = request(vcenter, "PUT", path + ".sha256", digest + "\n")
+            if status not in [200, 201, 204]:
+                raise Exception("uploading %s.sha256 failed: HTTP %d" % (path, status))
+            return True
+        except Exception:
+            attempt += 1
+            if attempt > retries:
+                raise
+            time.sleep(min(60, 2 ** attempt))
+
+
+def upload_everywhere(local_path, product, vcenter_keys=None, workers=None):
+    # Uploads the ISO to the datastores of many vCenters in parallel. Returns
+    # the (vcenter key, uploaded, exception) of every vCenter.
+    vcenter_keys = vcenter_keys or sorted(settings.VCENTER_SERVERS.keys())
+    vm_mgmt_transfer.file_digest(local_path)
+    return vm_mgmt_workers.run_in_pool(lambda key: upload(key, local_path, product), vcenter_keys,
+                                       workers or len(vcenter_keys))
+
+
+def prune_command(datastore, product=None, days=None):
+    # One shell command deleting, in a single SSH session, the ISOs (and
+    # their sidecars) of the product (all products by default) not modified
+    # for 'days' days (ISO_RETENTION_DAYS by default). Prints what it deleted.
+    folder = "%s/%s/%s" % (settings.ISO_DATASTORE_PATH, datastore, settings.ISO_FOLDER)
+    if product:
+        folder += "/" + product
+    days = settings.ISO_RETENTION_DAYS if days is None else int(days)
+    return ("find '%s' -type f -name '*.iso' -mtime +%d | while read iso; do "
+            "rm -f \"$iso\" \"$iso.sha256\" && echo \"$iso\"; done" % (folder, days))
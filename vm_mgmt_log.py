@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+
+# ==============================================================================
+# Name          :   vm_mgmt_log.py
+#
+# Description   :   Logging shared by the scripts. Records are formatted by
+#                   the thread logging them and written to LOG_FILE by a
+#                   background thread, in batches, so logging never waits
+#                   for the disk. Many processes can write to (and rotate)
+#                   the same LOG_FILE: every batch is written under an
+#                   exclusive lock on LOG_FILE.lock. Repetitive progress
+#                   messages ("Elapsed N seconds ...") are let through once
+#                   every LOG_PROGRESS_INTERVAL seconds per key, with the
+#                   number of messages coalesced since the previous one.
+#
+# Version       :   1.0.0
+#
+# Author        :   Santhoshkumar Settipalli
+#
+# Change log    :
+#   17-Oct-2026 :    Santhoshkumar Settipalli (santhosh.settipalli@gmail.com)
+#                    Initial version.
+#
+# ==============================================================================
+
+import os
+import sys
+import time
+import Queue
+import fcntl
+import atexit
+import logging
+import settings
+import threading
+
+LOGGER_NAME = "vm_mgmt_lib"
+FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+BATCH_SIZE = 512  # Records written per lock of the log file, at most.
+
+LEVELS = {
+    'debug': logging.DEBUG,
+    'info': logging.INFO,
+    'warning': logging.WARNING,
+    'error': logging.ERROR,
+    'critical': logging.CRITICAL
+}
+
+# The writer of this process, its handler and filter, created by setup().
+writer = None
+handler = None
+progress_filter = None
+setup_lock = threading.Lock()
+
+
+class SharedRotatingFile(object):
+    # A log file appended to and rotated by many processes. Rotation renames
+    # the file, so before every write the file is reopened if another
+    # process rotated it away.
+
+    def __init__(self, path, max_bytes, backup_count):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.lock_file = open(path + ".lock", "a")
+        self.stream = None
+
+    def open(self):
+        if self.stream:
+            self.stream.close()
+        self.stream = open(self.path, "a")
+
+    def rotated(self):
+        try:
+            return os.stat(self.path).st_ino != os.fstat(self.stream.fileno()).st_ino
+        except OSError:
+            return True
+
+    def rotate(self):
+        self.stream.close()
+        self.stream = None
+        for i in range(self.backup_count - 1, 0, -1):
+            source = "%s.%d" % (self.path, i)
+            if os.path.exists(source):
+                os.rename(source, "%s.%d" % (self.path, i + 1))
+        if self.backup_count > 0:
+            os.rename(self.path, self.path + ".1")
+        else:
+            os.remove(self.path)
+        self.open()
+
+    def write(self, text):
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        try:
+            if not self.stream or self.rotated():
+                self.open()
+            size = os.fstat(self.stream.fileno()).st_size
+            if self.max_bytes and size and size + len(text) > self.max_bytes:
+                self.rotate()
+            self.stream.write(text)
+            self.stream.flush()
+        finally:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+
+    def close(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        self.lock_file.close()
+
+
+class Writer(threading.Thread):
+    # Drains the queue of formatted records into the log file.
+
+    def __init__(self, log_file):
+        threading.Thread.__init__(self, name="vm_mgmt_log-writer")
+        self.daemon = True
+        self.log_file = log_file
+        self.queue = Queue.Queue()
+        self.failed = False
+
+    def put(self, text):
+        self.queue.put(text)
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            lines = [self.queue.get()]
+            while len(lines) < BATCH_SIZE:
+                try:
+                    lines.append(self.queue.get_nowait())
+                except Queue.Empty:
+                    break
+            if None in lines:
+                stopping = True
+                lines = [line for line in lines if line is not None]
+            if lines:
+                self.write("".join(lines))
+        self.log_file.close()
+
+    def write(self, text):
+        try:
+            self.log_file.write(text)
+        except (IOError, OSError) as e:
+            # Reported once; the records still reach the console.
+            if not self.failed:
+                self.failed = True
+                print >>sys.stderr, "Could not write to %s: %s" % (self.log_file.path, str(e))
+
+    def stop(self, timeout=10):
+        # Writes out what is queued and closes the file.
+        self.queue.put(None)
+        self.join(timeout)
+
+
+class QueueHandler(logging.Handler):
+
+    def __init__(self, writer):
+        logging.Handler.__init__(self)
+        self.writer = writer
+
+    def emit(self, record):
+        try:
+            self.writer.put(self.format(record) + "\n")
+        except Exception:
+            self.handleError(record)
+
+
+class RateLimiter(object):
+    # Lets a key through at most once every 'interval' seconds.
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.keys = {}  # key -> [time let through last, calls refused since]
+
+    def allow(self, key, now=None):
+        # None if refused, else the number of calls refused since the key
+        # was let through last.
+        now = now or time.time()
+        self.lock.acquire()
+        try:
+            state = self.keys.setdefault(key, [0, 0])
+            if now - state[0] < self.interval:
+                state[1] += 1
+                return None
+            refused = state[1]
+            self.keys[key] = [now, 0]
+            return refused
+        finally:
+            self.lock.release()
+
+
+class ProgressFilter(logging.Filter):
+    # Coalesces the records logged with extra={"progress": <key>}.
+
+    def __init__(self, interval):
+        logging.Filter.__init__(self)
+        self.limiter = RateLimiter(interval)
+
+    def filter(self, record):
+        key = getattr(record, "progress", None)
+        if key is None:
+            return True
+        refused = self.limiter.allow(key, record.created)
+        if refused is None:
+            return False
+        if refused:
+            record.msg = "%s (%d similar message(s) coalesced)" % (record.getMessage(), refused)
+            record.args = None
+        return True
+
+
+def setup():
+    # Returns the logger of the scripts, writing to the console and, through
+    # the writer thread, to settings.LOG_FILE. Safe to call more than once;
+    # a changed LOG_FILE gets a new writer.
+    global writer, handler, progress_filter
+    logging.basicConfig(format=FORMAT, datefmt=DATE_FORMAT)
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(LEVELS.get(settings.LOG_LEVEL))
+
+    setup_lock.acquire()
+    try:
+        if writer and writer.log_file.path == settings.LOG_FILE and writer.isAlive():
+            return logger
+        if handler:
+            logger.removeHandler(handler)
+            logger.removeFilter(progress_filter)
+        if writer:
+            writer.stop()
+
+        writer = Writer(SharedRotatingFile(settings.LOG_FILE, settings.LOG_MAX_BYTES, settings.LOG_BACKUP_COUNT))
+        writer.start()
+        handler = QueueHandler(writer)
+        handler.setFormatter(logging.Formatter(fmt=FORMAT, datefmt=DATE_FORMAT))
+        progress_filter = ProgressFilter(settings.LOG_PROGRESS_INTERVAL)
+        logger.addHandler(handler)
+        logger.addFilter(progress_filter)
+        return logger
+    finally:
+        setup_lock.release()
+
+
+def flush():
+    # Writes out the queued records. Called at exit.
+    global writer, handler, progress_filter
+    setup_lock.acquire()
+    try:
+        if handler:
+            logger = logging.getLogger(LOGGER_NAME)
+            logger.removeHandler(handler)
+            logger.removeFilter(progress_filter)
+            handler = progress_filter = None
+        if writer:
+            writer.stop()
+            writer = None
+    finally:
+        setup_lock.release()
+
+atexit.register(flush)
@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+
+# ==============================================================================
+# Name          :   vm_mgmt_placement.py
+#
+# Description   :   Placement of new VMs. Datastores are scored by free space,
+#                   provisioned ratio and the operations this process already
+#                   has in flight on them, so a batch of VMs is spread across
+#                   the datastores instead of piling up on the first one.
+#                   ESXi hosts are chosen by weighing the RAM and vCPUs of the
+#                   VMs against the CPU and memory load of the hosts, placing
+#                   each VM on the host left with the most headroom.
+#
+# Version       :   1.0.0
+#
+# Author        :   Santhoshkumar Settipalli
+#
+# Change log    :
+#   17-Oct-2026 :    Santhoshkumar Settipalli (santhosh.settipalli@gmail.com)
+#                    Initial version.
+#
+# ==============================================================================
+
+import re
+import threading
+import vm_mgmt_properties
+from collections import namedtuple
+
+datastore_info = namedtuple("datastore_info", ["name", "mor", "capacity", "free", "uncommitted"])
+# CPU in MHz, memory in MB.
+host_info = namedtuple("host_info", ["name", "mor", "cpu_capacity", "cpu_usage", "cpu_cores",
+                                     "memory_capacity", "memory_usage", "vms"])
+
+# Weights of the datastore score. A datastore loses PROVISIONED_WEIGHT for
+# every 100% it is provisioned beyond its capacity and IN_FLIGHT_WEIGHT for
+# every placement of this process that has not completed yet.
+PROVISIONED_WEIGHT = 0.5
+IN_FLIGHT_WEIGHT = 0.1
+
+# A host takes a new VM only while its projected usage stays below these
+# ratios. Every vCPU placed by this process is expected to keep VCPU_LOAD of
+# a physical core busy.
+MAX_MEMORY_USAGE = 0.85
+MAX_CPU_USAGE = 0.80
+VCPU_LOAD = 0.25
+
+DATASTORE_PROPERTIES = ["summary.capacity", "summary.freeSpace", "summary.uncommitted"]
+HOST_PROPERTIES = ["name", "vm", "runtime.connectionState", "runtime.inMaintenanceMode",
+                   "summary.hardware.cpuMhz", "summary.hardware.numCpuCores",
+                   "summary.hardware.memorySize", "summary.quickStats.overallCpuUsage",
+                   "summary.quickStats.overallMemoryUsage"]
+
+
+def datastores_from_config_target(config_target):
+    # The accessible, writable datastores of a QueryConfigTarget response.
+    datastores = []
+    for d in getattr(config_target, "Datastore", None) or []:
+        summary = d.Datastore
+        if not summary.Accessible or getattr(d, "Mode", "readWrite") != "readWrite":
+            continue
+        datastores.append(datastore_info(summary.Name, summary.Datastore, long(summary.Capacity or 0),
+                                         long(summary.FreeSpace or 0),
+                                         long(getattr(summary, "Uncommitted", None) or 0)))
+    return datastores
+
+
+def refresh_datastores(s, datastores):
+    # The datastores with their capacity and free space as vCenter reports
+    # them now, read with a single call. The QueryConfigTarget response they
+    # come from is cached (vm_mgmt_config), and once a placement is released
+    # only fresh values account for the VMs it created. The cached values
+    # are kept if the call fails.
+    if not datastores:
+        return datastores
+    try:
+        values = dict([(str(mor), props) for mor, props in vm_mgmt_properties.retrieve_properties(
+            s, [d.mor for d in datastores], "Datastore", DATASTORE_PROPERTIES)])
+    except Exception:
+        return datastores
+    refreshed = []
+    for d in datastores:
+        props = values.get(str(d.mor))
+        if props and props.get("summary.capacity"):
+            d = d._replace(capacity=long(props["summary.capacity"]),
+                           free=long(props.get("summary.freeSpace") or 0),
+                           uncommitted=long(props.get("summary.uncommitted") or 0))
+        refreshed.append(d)
+    return refreshed
+
+
+def matching(datastores, name=None, substring=None, regex=None):
+    # Applies the filters of the scripts: an exact name, a substring of the
+    # name and/or a regular expression searched in the name.
+    if name:
+        datastores = [d for d in datastores if d.name == name]
+    if substring:
+        datastores = [d for d in datastores if substring in d.name]
+    if regex:
+        pattern = re.compile(regex)
+        datastores = [d for d in datastores if pattern.search(d.name)]
+    return datastores
+
+
+class DatastorePlacer(object):
+    # Chooses datastores and remembers, until release(), the space and the
+    # number of operations this process has put on each of them. The free
+    # space reported by vCenter only catches up once the VMs exist.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reserved = {}     # datastore name -> [bytes, operations]
+
+    def score(self, datastore, size):
+        # Returns None when the datastore cannot hold 'size' more bytes.
+        reserved, in_flight = self._reserved.get(datastore.name, [0, 0])
+        if not datastore.capacity:
+            return None
+        free = datastore.free - reserved
+        if free < size:
+            return None
+        free_ratio = float(free - size) / datastore.capacity
+        provisioned = float(datastore.capacity - datastore.free + datastore.uncommitted
+                            + reserved + size) / datastore.capacity
+        return (free_ratio - PROVISIONED_WEIGHT * max(0, provisioned - 1)
+                - IN_FLIGHT_WEIGHT * in_flight)
+
+    def choose(self, datastores, size=0):
+        # Picks the best of 'datastores' for 'size' bytes and reserves it.
+        # Returns None if none of them has room. Pair with release().
+        self._lock.acquire()
+        try:
+            best = None
+            best_score = None
+            for datastore in sorted(datastores, key=lambda d: d.name):
+                score = self.score(datastore, size)
+                if score is not None and (best_score is None or score > best_score):
+                    best, best_score = datastore, score
+            if best:
+                reservation = self._reserved.setdefault(best.name, [0, 0])
+                reservation[0] += size
+                reservation[1] += 1
+            return best
+        finally:
+            self._lock.release()
+
+    def release(self, datastore, size=0):
+        self._lock.acquire()
+        try:
+            reservation = self._reserved.get(datastore.name)
+            if reservation:
+                reservation[0] = max(0, reservation[0] - size)
+                reservation[1] = max(0, reservation[1] - 1)
+        finally:
+            self._lock.release()
+
+
+def host_loads(s, host_mors):
+    # The load of the hosts, read with a single property collector call.
+    # Hosts that are disconnected or in maintenance mode are left out.
+    hosts = []
+    for mor, props in vm_mgmt_properties.retrieve_properties(s, host_mors, "HostSystem", HOST_PROPERTIES):
+        if props.get("runtime.connectionState") != "connected" or props.get("runtime.inMaintenanceMode"):
+            continue
+        cores = int(props.get("summary.hardware.numCpuCores") or 0)
+        vms = getattr(props.get("vm"), "ManagedObjectReference", None) or []
+        hosts.append(host_info(props["name"], mor,
+                               cores * int(props.get("summary.hardware.cpuMhz") or 0),
+                               int(props.get("summary.quickStats.overallCpuUsage") or 0), cores,
+                               long(props.get("summary.hardware.memorySize") or 0) / (1024 ** 2),
+                               int(props.get("summary.quickStats.overallMemoryUsage") or 0), len(vms)))
+    return hosts
+
+
+class HostScheduler(object):
+    # Spreads VMs over hosts: a VM goes to the host left with the most
+    # headroom among those staying under MAX_MEMORY_USAGE and MAX_CPU_USAGE,
+    # so the load stays balanced and no host runs hot. The RAM and
+    # vCPUs of the VMs placed by this process stay reserved for the whole
+    # run, as the quick stats of a host only catch up once the guests run.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reserved = {}     # host moref -> [memory MB, vCPUs, VMs]
+
+    def headroom(self, host, ram, cpus):
+        # The ratio left of the scarcer of memory and CPU on the host after
+        # adding a VM of 'ram' MB and 'cpus' vCPUs, or None when the VM does
+        # not fit.
+        memory, vcpus, vms = self._reserved.get(str(host.mor), [0, 0, 0])
+        if not host.memory_capacity or not host.cpu_capacity or not host.cpu_cores:
+            return None
+        memory_usage = float(host.memory_usage + memory + ram) / host.memory_capacity
+        core_mhz = float(host.cpu_capacity) / host.cpu_cores
+        cpu_usage = (host.cpu_usage + (vcpus + cpus) * core_mhz * VCPU_LOAD) / host.cpu_capacity
+        if memory_usage > MAX_MEMORY_USAGE or cpu_usage > MAX_CPU_USAGE:
+            return None
+        return min(MAX_MEMORY_USAGE - memory_usage, MAX_CPU_USAGE - cpu_usage)
+
+    def choose(self, hosts, ram, cpus):
+        # Picks the host of 'hosts' left with the most headroom (ties go to
+        # the host running fewer VMs) and reserves the VM on it. Returns None
+        # if none of them has room.
+        self._lock.acquire()
+        try:
+            best = None
+            best_key = None
+            for host in hosts:
+                headroom = self.headroom(host, ram, cpus)
+                if headroom is None:
+                    continue
+                key = (-headroom, host.vms + self._reserved.get(str(host.mor), [0, 0, 0])[2], host.name)
+                if best_key is None or key < best_key:
+                    best, best_key = host, key
+            if best:
+                reservation = self._reserved.setdefault(str(best.mor), [0, 0, 0])
+                reservation[0] += ram
+                reservation[1] += cpus
+                reservation[2] += 1
+            return best
+        finally:
+            self._lock.release()
+
+    def plan(self, hosts, requests):
+        # Worst fit decreasing over 'requests', (key, ram MB, vCPUs) tuples:
+        # the largest VMs are placed first, while the most room is left.
+        # Returns {key: host_info or None}.
+        plan = {}
+        for key, ram, cpus in sorted(requests, key=lambda r: (-r[1], -r[2], r[0])):
+            plan[key] = self.choose(hosts, ram, cpus)
+        return plan
+
+    def release(self, host, ram, cpus):
+        # For VMs that could not be created after all.
+        self._lock.acquire()
+        try:
+            reservation = self._reserved.get(str(host.mor))
+            if reservation:
+                reservation[0] = max(0, reservation[0] - ram)
+                reservation[1] = max(0, reservation[1] - cpus)
+                reservation[2] = max(0, reservation[2] - 1)
+        finally:
+            self._lock.release()
+
+
+# Shared by everything placing VMs in this process.
+datastore_placer = DatastorePlacer()
+host_scheduler = HostScheduler()
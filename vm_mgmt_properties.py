@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+
+# ==============================================================================
+# Name          :   vm_mgmt_properties.py
+#
+# Description   :   Helpers around the vSphere property collector: private
+#                   collectors, filters and WaitForUpdatesEx long-polls that
+#                   let one call report changes on many managed objects, and
+#                   selective retrieval of properties (only the requested
+#                   paths, of one or many VMs at once).
+#
+# Version       :   1.0.0
+#
+# Author        :   Santhoshkumar Settipalli
+#
+# Change log    :
+#   17-Oct-2026 :    Santhoshkumar Settipalli (santhosh.settipalli@gmail.com)
+#                    Initial version.
+#
+# ==============================================================================
+
+from pysphere.resources import VimService_services as VI
+
+
+def create_property_collector(s):
+    # A private collector keeps our filters (and their updates) away from any
+    # other user of the session wide default collector.
+    default_collector = s._do_service_content.PropertyCollector
+    request = VI.CreatePropertyCollectorRequestMsg()
+    _this = request.new__this(default_collector)
+    _this.set_attribute_type(default_collector.get_attribute_type())
+    request.set_element__this(_this)
+    return s._proxy.CreatePropertyCollector(request)._returnval
+
+
+def destroy_property_collector(s, collector):
+    request = VI.DestroyPropertyCollectorRequestMsg()
+    _this = request.new__this(collector)
+    _this.set_attribute_type(collector.get_attribute_type())
+    request.set_element__this(_this)
+    s._proxy.DestroyPropertyCollector(request)
+
+
+def create_filter(s, collector, mors, obj_type, path_set):
+    # One filter watching 'path_set' on every managed object in 'mors'.
+    request = VI.CreateFilterRequestMsg()
+    _this = request.new__this(collector)
+    _this.set_attribute_type(collector.get_attribute_type())
+    request.set_element__this(_this)
+
+    spec = request.new_spec()
+    prop_set = spec.new_propSet()
+    prop_set.set_element_type(obj_type)
+    prop_set.set_element_pathSet(path_set)
+    prop_set.set_element_all(False)
+    spec.set_element_propSet([prop_set])
+
+    object_sets = []
+    for mor in mors:
+        object_set = spec.new_objectSet()
+        obj = object_set.new_obj(mor)
+        obj.set_attribute_type(mor.get_attribute_type())
+        object_set.set_element_obj(obj)
+        object_set.set_element_skip(False)
+        object_sets.append(object_set)
+    spec.set_element_objectSet(object_sets)
+
+    request.set_element_spec(spec)
+    request.set_element_partialUpdates(False)
+    return s._proxy.CreateFilter(request)._returnval
+
+
+def destroy_filter(s, filter_mor):
+    request = VI.DestroyPropertyFilterRequestMsg()
+    _this = request.new__this(filter_mor)
+    _this.set_attribute_type(filter_mor.get_attribute_type())
+    request.set_element__this(_this)
+    s._proxy.DestroyPropertyFilter(request)
+
+
+def wait_for_updates(s, collector, version="", max_wait=30):
+    # Blocks for up to 'max_wait' seconds until any filter of the collector
+    # reports a change. Returns the new version and a list of
+    # (object mor, kind, {property path: value}) tuples; the list is empty
+    # when nothing changed before the timeout.
+    request = VI.WaitForUpdatesExRequestMsg()
+    _this = request.new__this(collector)
+    _this.set_attribute_type(collector.get_attribute_type())
+    request.set_element__this(_this)
+    request.set_element_version(version)
+    options = request.new_options()
+    options.set_element_maxWaitSeconds(max_wait)
+    request.set_element_options(options)
+
+    update = s._proxy.WaitForUpdatesEx(request)._returnval
+    if not update:
+        return version, []
+
+    changes = []
+    for filter_update in getattr(update, "FilterSet", None) or []:
+        for object_update in getattr(filter_update, "ObjectSet", None) or []:
+            values = {}
+            for change in getattr(object_update, "ChangeSet", None) or []:
+                values[change.Name] = getattr(change, "Val", None)
+            changes.append((object_update.Obj, object_update.Kind, values))
+    return update.Version, changes
+
+
+def cancel_wait_for_updates(s, collector):
+    # Makes a WaitForUpdatesEx blocked in another thread return early.
+    request = VI.CancelWaitForUpdatesRequestMsg()
+    _this = request.new__this(collector)
+    _this.set_attribute_type(collector.get_attribute_type())
+    request.set_element__this(_this)
+    s._proxy.CancelWaitForUpdates(request)
+
+
+def retrieve_properties(s, mors, obj_type, path_set):
+    # Fetches 'path_set' of every managed object in 'mors' (all of type
+    # 'obj_type') with a single property collector call. Returns a list of
+    # (object mor, {property path: value}) tuples.
+    if not mors:
+        return []
+    request, request_call = s._retrieve_property_request()
+    collector = s._do_service_content.PropertyCollector
+    _this = request.new__this(collector)
+    _this.set_attribute_type(collector.get_attribute_type())
+    request.set_element__this(_this)
+
+    spec = request.new_specSet()
+    prop_set = spec.new_propSet()
+    prop_set.set_element_type(obj_type)
+    prop_set.set_element_pathSet(path_set)
+    prop_set.set_element_all(False)
+    spec.set_element_propSet([prop_set])
+
+    object_sets = []
+    for mor in mors:
+        object_set = spec.new_objectSet()
+        obj = object_set.new_obj(mor)
+        obj.set_attribute_type(mor.get_attribute_type())
+        object_set.set_element_obj(obj)
+        object_set.set_element_skip(False)
+        object_sets.append(object_set)
+    spec.set_element_objectSet(object_sets)
+    request.set_element_specSet([spec])
+
+    return [(oc.Obj, dict([(p.Name, p.Val) for p in getattr(oc, "PropSet", None) or []]))
+            for oc in request_call(request) or []]
+
+
+def vm_properties(s, vm_mors, path_set):
+    # Returns {vm moref: {property path: value}} for the VMs in 'vm_mors',
+    # fetched with one call however many VMs are given. Only the paths of
+    # 'path_set' (e.g. "runtime.powerState", "guest.ipAddress") are sent and
+    # parsed, not the whole property tree that a VIVirtualMachine loads.
+    return dict(retrieve_properties(s, vm_mors, "VirtualMachine", path_set))
+
+
+def device_type(device):
+    # The type of a VirtualDevice, e.g. "VirtualCdrom".
+    return device.typecode.type[1]
+
+
+def devices(value, types=None):
+    # The (device type, VirtualDevice) pairs of a config.hardware.device
+    # value, only those of 'types' if given.
+    pairs = [(device_type(device), device) for device in getattr(value, "VirtualDevice", None) or []]
+    if types is None:
+        return pairs
+    return [(dev_type, device) for dev_type, device in pairs if dev_type in types]
+
+
+def vm_devices(s, vm_mors, types=None):
+    # Returns {vm moref: [(device type, VirtualDevice)]} for the VMs in
+    # 'vm_mors', with one call. The property collector cannot select array
+    # elements by type, so config.hardware.device is fetched whole and
+    # filtered by 'types' here.
+    return dict([(mor, devices(props.get("config.hardware.device"), types))
+                 for mor, props in vm_properties(s, vm_mors, ["config.hardware.device"]).items()])
+
+
+def guest_nics(value):
+    # The (MAC address, [IP addresses]) of every NIC of a guest.net value.
+    return [(getattr(nic, "MacAddress", None), list(getattr(nic, "IpAddress", None) or []))
+            for nic in getattr(value, "GuestNicInfo", None) or []]
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+
+# ==============================================================================
+# Name          :   vm_mgmt_readiness.py
+#
+# Description   :   Adaptive readiness detection for guests being installed.
+#                   Probes are sparse early on, frequent around the expected
+#                   completion time and back off again afterwards, and any
+#                   change of the VMware Tools, guest or power state of the VM
+#                   triggers an immediate probe.
+#
+# Version       :   1.0.0
+#
+# Author        :   Santhoshkumar Settipalli
+#
+# Change log    :
+#   17-Oct-2026 :    Santhoshkumar Settipalli (santhosh.settipalli@gmail.com)
+#                    Initial version.
+#
+# ==============================================================================
+
+import math
+import time
+import threading
+import vm_mgmt_properties
+
+GUEST_STATE_PROPERTIES = ["guest.toolsRunningStatus", "guest.guestState", "runtime.powerState"]
+
+# Around the expected completion time probes are at least this fraction of
+# the expected time apart (1 minute for a 20 minute installation).
+EXPECTED_TIME_FLOOR = 0.05
+# Once overdue, the next probe comes after this fraction of the delay so far.
+OVERDUE_BACKOFF = 0.5
+
+
+def probe_interval(elapsed, expected, min_interval, max_interval):
+    # Before the expected completion time wait a quarter of the remaining
+    # time, so probes get denser as completion approaches, but never closer
+    # than EXPECTED_TIME_FLOOR of the expected time. Once overdue, back off
+    # geometrically: every wait is OVERDUE_BACKOFF of the delay so far.
+    floor = min(max_interval, max(min_interval, expected * EXPECTED_TIME_FLOOR))
+    remaining = expected - elapsed
+    if remaining > 0:
+        interval = remaining / 4.0
+    else:
+        interval = -remaining * OVERDUE_BACKOFF
+    return max(floor, min(max_interval, interval))
+
+
+class GuestStateWatcher(object):
+    # Follows GUEST_STATE_PROPERTIES of any number of VMs through one private
+    # property collector, so all of them share a single update stream.
+
+    def __init__(self, s, vm_mors=None):
+        self._server = s
+        self._collector = vm_mgmt_properties.create_property_collector(s)
+        self._version = ""
+        self._filters = {}  # VM moref -> filter moref
+        self.states = {}    # VM moref -> {property path: latest known value}
+        self._lock = threading.Lock()
+        self._waiting = False   # A wait() is in progress.
+        self._woken = False     # wake() was called since the last wait().
+        for vm_mor in vm_mors or []:
+            self.add(vm_mor)
+
+    def add(self, vm_mor):
+        # The current values of the VM arrive with the next wait().
+        key = str(vm_mor)
+        if key not in self._filters:
+            self._filters[key] = vm_mgmt_properties.create_filter(
+                self._server, self._collector, [vm_mor], "VirtualMachine", GUEST_STATE_PROPERTIES)
+            self.states.setdefault(key, {})
+
+    def remove(self, vm_mor):
+        key = str(vm_mor)
+        filter_mor = self._filters.pop(key, None)
+        self.states.pop(key, None)
+        if filter_mor:
+            try:
+                vm_mgmt_properties.destroy_filter(self._server, filter_mor)
+            except Exception:
+                pass
+
+    def values(self, vm_mor):
+        return self.states.get(str(vm_mor), {})
+
+    def wait(self, timeout):
+        # Returns the set of VM morefs (as strings) whose watched properties
+        # changed, as soon as there is one, or an empty set after 'timeout'
+        # seconds without changes or after wake(). WaitForUpdatesEx takes
+        # whole seconds and returns at once for 0, so the timeout is rounded
+        # up, and nothing is sent when it is not positive.
+        self._lock.acquire()
+        try:
+            if self._woken or timeout <= 0:
+                self._woken = False
+                return set()
+            self._waiting = True
+        finally:
+            self._lock.release()
+        try:
+            self._version, changes = vm_mgmt_properties.wait_for_updates(
+                self._server, self._collector, self._version, int(math.ceil(timeout)))
+        except Exception as e:
+            if "RequestCanceled" in str(e):
+                return set()
+            raise
+        finally:
+            self._lock.acquire()
+            self._waiting = self._woken = False
+            self._lock.release()
+        changed = set()
+        for mor, kind, values in changes:
+            state = self.states.setdefault(str(mor), {})
+            for name, value in values.items():
+                if state.get(name) != value:
+                    changed.add(str(mor))
+                state[name] = value
+        return changed
+
+    def wake(self):
+        # Makes a wait() of another thread return early (e.g. a worker has
+        # finished), or the next one if none is in progress.
+        self._lock.acquire()
+        try:
+            self._woken = True
+            waiting = self._waiting
+        finally:
+            self._lock.release()
+        if waiting:
+            try:
+                vm_mgmt_properties.cancel_wait_for_updates(self._server, self._collector)
+            except Exception:
+                pass
+
+    def close(self):
+        # Destroying the collector destroys its filters too.
+        try:
+            vm_mgmt_properties.destroy_property_collector(self._server, self._collector)
+        except Exception:
+            pass
+
+
+class SleepWatcher(object):
+    # Stand-in for servers that do not support WaitForUpdatesEx.
+
+    def __init__(self):
+        self._woken = threading.Event()
+
+    def add(self, vm_mor):
+        pass
+
+    def remove(self, vm_mor):
+        pass
+
+    def values(self, vm_mor):
+        return {}
+
+    def wait(self, timeout):
+        if timeout > 0:
+            self._woken.wait(timeout)
+        self._woken.clear()
+        return set()
+
+    def wake(self):
+        self._woken.set()
+
+    def close(self):
+        pass
+
+
+def watch_guest_state(s, vm_mors=None):
+    try:
+        watcher = GuestStateWatcher(s, vm_mors)
+        if vm_mors:
+            # The first call returns the current values right away.
+            watcher.wait(1)
+        return watcher
+    except Exception:
+        return SleepWatcher()
+
+
+def wait_until(probe, watcher, expected, deadline, min_interval, max_interval,
+               start=None, progress=None):
+    # Calls probe() on the adaptive schedule (measured from 'start') until it
+    # returns True or 'deadline' seconds have elapsed. Returns the last result
+    # of probe(). progress(elapsed, next_interval) is called before each wait.
+    start = start or time.time()
+    while True:
+        last_probe = time.time()
+        if probe():
+            return True
+        elapsed = last_probe - start
+        if elapsed >= deadline:
+            return False
+
+        interval = min(probe_interval(elapsed, expected, min_interval, max_interval),
+                       deadline - elapsed)
+        if progress:
+            progress(elapsed, interval)
+        if watcher.wait(interval):
+            # Probe right away, but never more often than min_interval.
+            pause = min_interval - (time.time() - last_probe)
+            if pause > 0:
+                time.sleep(pause)
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+
+# ==============================================================================
+# Name          :   vm_mgmt_registry.py
+#
+# Description   :   Registry of the deployed VMs in a SQLite database
+#                   (REGISTRY_DB, in WAL mode so readers never block the
+#                   writers and concurrent scripts can all write to it).
+#                   vm-mgmt-create.py records the VMs it creates,
+#                   detect_installation_completion.py their IP and MAC
+#                   addresses and the outcome and duration of their OS
+#                   installation, and vm-mgmt-delete.py their deletion.
+#                   Failing to update the registry never fails a script.
+#
+#                   Lookups and exports from the command line, e.g.
+#                       python vm_mgmt_registry.py --ip my-vm
+#                       python vm_mgmt_registry.py --lookup my-vm
+#                       python vm_mgmt_registry.py --export --format csv --state installed
+#
+# Version       :   1.0.0
+#
+# Author        :   Santhoshkumar Settipalli
+#
+# Change log    :
+#   17-Oct-2026 :    Santhoshkumar Settipalli (santhosh.settipalli@gmail.com)
+#                    Initial version.
+#
+# ==============================================================================
+
+import os
+import sys
+import csv
+import json
+import time
+import sqlite3
+import settings
+import threading
+from optparse import OptionParser
+
+COLUMNS = ["name", "vcenter", "type", "state", "ip", "mac", "error",
+           "created", "installed", "install_seconds", "deleted", "updated"]
+STATES = ["created", "installed", "failed", "deleted"]
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS vms (
+           name TEXT NOT NULL,
+           vcenter TEXT NOT NULL,
+           type TEXT,
+           state TEXT,
+           ip TEXT,
+           mac TEXT,
+           error TEXT,
+           created REAL,
+           installed REAL,
+           install_seconds REAL,
+           deleted REAL,
+           updated REAL NOT NULL,
+           PRIMARY KEY (vcenter, name))""",
+    "CREATE INDEX IF NOT EXISTS vms_name ON vms (name)",
+    "CREATE INDEX IF NOT EXISTS vms_ip ON vms (ip)",
+    "CREATE INDEX IF NOT EXISTS vms_state ON vms (state, updated)",
+]
+
+# One connection per thread and database file.
+local = threading.local()
+
+
+def connection():
+    path = settings.REGISTRY_DB
+    connections = local.__dict__.setdefault("connections", {})
+    conn = connections.get(path)
+    if conn is None:
+        folder = os.path.dirname(path)
+        if folder and not os.path.isdir(folder):
+            try:
+                os.makedirs(folder)
+            except OSError:
+                pass  # Created by another process meanwhile.
+        # Autocommit; transactions are begun explicitly.
+        conn = sqlite3.connect(path, timeout=settings.REGISTRY_BUSY_TIMEOUT, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in SCHEMA:
+            conn.execute(statement)
+        connections[path] = conn
+    return conn
+
+
+def write(func):
+    # Runs func(conn) in one write transaction. A failure is reported on
+    # stderr, not raised: the registry is a record of the work, not part of it.
+    try:
+        conn = connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            func(conn)
+            conn.execute("COMMIT")
+        except:
+            conn.execute("ROLLBACK")
+            raise
+    except sqlite3.Error as e:
+        print >>sys.stderr, "Could not update the VM registry %s: %s" % (settings.REGISTRY_DB, str(e))
+
+
+def upsert(conn, vcenter, name, fields):
+    now = time.time()
+    conn.execute("INSERT OR IGNORE INTO vms (vcenter, name, updated) VALUES (?, ?, ?)", (vcenter, name, now))
+    names = sorted(fields.keys())
+    conn.execute("UPDATE vms SET %s, updated = ? WHERE vcenter = ? AND name = ?" %
+                 ", ".join(["%s = ?" % n for n in names]),
+                 [fields[n] for n in names] + [now, vcenter, name])
+
+
+def record(vcenter, name, **fields):
+    # Sets the given columns of the VM, adding it if needed.
+    write(lambda conn: upsert(conn, vcenter, name, fields))
+
+
+def record_many(vcenter, entries):
+    # record() for many (name, {column: value}) at once, in one transaction.
+    def update(conn):
+        for name, fields in entries:
+            upsert(conn, vcenter, name, fields)
+    write(update)
+
+
+def created(vcenter, names, vmtype=None):
+    # A new deployment of each VM: what is known of a previous VM of the
+    # same name is cleared.
+    now = time.time()
+    record_many(vcenter, [(name, {"type": vmtype, "state": "created", "mac": None, "ip": None, "error": None,
+                                  "created": now, "installed": None, "install_seconds": None,
+                                  "deleted": None}) for name in names])
+
+
+def installed(vcenter, name, started):
+    # The installation is measured from the creation of the VM when the
+    # registry knows it, else from 'started'.
+    now = time.time()
+
+    def update(conn):
+        upsert(conn, vcenter, name, {"state": "installed", "installed": now, "error": None})
+        conn.execute("UPDATE vms SET install_seconds = installed - COALESCE(created, ?) "
+                     "WHERE vcenter = ? AND name = ?", (started, vcenter, name))
+    write(update)
+
+
+def failed(vcenter, name, error):
+    record(vcenter, name, state="failed", error=error)
+
+
+def deleted(vcenter, names):
+    now = time.time()
+    record_many(vcenter, [(name, {"state": "deleted", "deleted": now}) for name in names])
+
+
+def find(name=None, vcenter=None, state=None, ip=None):
+    # The VMs matching all the given columns, most recently updated first.
+    conditions, values = [], []
+    for column, value in [("name", name), ("vcenter", vcenter), ("state", state), ("ip", ip)]:
+        if value is not None:
+            conditions.append("%s = ?" % column)
+            values.append(value)
+    query = "SELECT %s FROM vms" % ", ".join(COLUMNS)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    return [dict(zip(COLUMNS, row)) for row in
+            connection().execute(query + " ORDER BY updated DESC", values)]
+
+
+def export(out, fmt="json", **filters):
+    # Writes the VMs matching 'filters' (see find()) to 'out' as JSON lines
+    # or CSV. Returns the number of VMs written.
+    rows = find(**filters)
+    if fmt == "csv":
+        writer = csv.writer(out)
+        writer.writerow(COLUMNS)
+        for row in rows:
+            writer.writerow([row[c] if row[c] is not None else "" for c in COLUMNS])
+    else:
+        for row in rows:
+            out.write(json.dumps(row, sort_keys=True) + "\n")
+    return len(rows)
+
+
+def options():
+    parser = OptionParser()
+    parser.add_option("--ip", dest="ip_of", help="Print the IP address of this VM.")
+    parser.add_option("--lookup", dest="lookup", help="Print everything known of this VM, as JSON.")
+    parser.add_option("--export", dest="export", default=False, action="store_true",
+                      help="Print all the VMs, or the ones selected by --vcenter and --state.")
+    parser.add_option("--format", dest="format", type="choice", choices=["json", "csv"], default="json",
+                      help="Format of --export: json (one VM per line) or csv. Default=json.")
+    parser.add_option("--vcenter", dest="vcenter", help="Only the VMs of this vCenter configuration.")
+    parser.add_option("--state", dest="state", type="choice", choices=STATES,
+                      help="Only the VMs in this state. Supported choices: " + str(STATES))
+    opts, args = parser.parse_args()
+
+    if not (opts.ip_of or opts.lookup or opts.export):
+        print "Nothing to do. Use --ip <name>, --lookup <name> or --export."
+        sys.exit(1)
+    return opts
+
+
+def main():
+    opts = options()
+
+    if opts.export:
+        export(sys.stdout, opts.format, vcenter=opts.vcenter, state=opts.state)
+        return
+
+    name = opts.ip_of or opts.lookup
+    vms = find(name=name, vcenter=opts.vcenter, state=opts.state)
+    if not vms:
+        print >>sys.stderr, "%s is not in the VM registry." % name
+        sys.exit(1)
+    if opts.ip_of:
+        if not vms[0]["ip"]:
+            print >>sys.stderr, "The IP address of %s is not known." % name
+            sys.exit(1)
+        print vms[0]["ip"]
+    else:
+        for vm in vms:
+            print json.dumps(vm, sort_keys=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+
+# ==============================================================================
+# Name          :   vm_mgmt_session.py
+#
+# Description   :   A pool of authenticated vSphere sessions, one per
+#                   VCENTER_SERVERS key, shared by everything running in the
+#                   process. Sessions are kept alive in the background,
+#                   re-established when they expire and logged out at exit.
+#
+# Version       :   1.0.0
+#
+# Author        :   Santhoshkumar Settipalli
+#
+# Change log    :
+#   17-Oct-2026 :    Santhoshkumar Settipalli (santhosh.settipalli@gmail.com)
+#                    Initial version.
+#
+# ==============================================================================
+
+import time
+import atexit
+import threading
+import settings
+import vm_mgmt_tasks
+import vm_mgmt_trace
+from contextlib import contextmanager
+from pysphere import VIServer
+
+# VCENTER_SERVERS key -> Session
+sessions = {}
+sessions_lock = threading.Lock()
+keepalive_thread = None
+
+
+class Session(object):
+
+    def __init__(self, vcenter_key):
+        self.vcenter_key = vcenter_key
+        self.server = None
+        self.borrowers = 0
+        self.checked = 0    # Last time the session was known to be alive.
+        self.lock = threading.Lock()
+
+    def login(self):
+        vcenter = settings.VCENTER_SERVERS[self.vcenter_key]
+        # Before connect(), so that its RetrieveServiceContent and Login count.
+        vm_mgmt_trace.instrument()
+        if not self.server:
+            self.server = VIServer()
+        # connect() on the same object keeps the references held by the
+        # borrowers valid across a re-login.
+        self.server.connect(vcenter.ip, vcenter.username, vcenter.password)
+        # The property collectors of the old session are gone.
+        vm_mgmt_tasks.reset_tracker(self.server)
+        self.checked = time.time()
+
+    def ensure_alive(self, max_age):
+        # Re-login if the session was not checked recently and has expired.
+        self.lock.acquire()
+        try:
+            if not self.server or not self.server.is_connected():
+                self.login()
+            elif time.time() - self.checked > max_age:
+                try:
+                    alive = self.server.keep_session_alive()
+                except Exception:
+                    alive = False
+                if alive:
+                    self.checked = time.time()
+                else:
+                    self.login()
+        finally:
+            self.lock.release()
+
+    def logout(self):
+        self.lock.acquire()
+        try:
+            if self.server and self.server.is_connected():
+                try:
+                    self.server.disconnect()
+                except Exception:
+                    pass
+        finally:
+            self.lock.release()
+
+
+def connect(vcenter_key):
+    # Borrows the session of the vCenter, logging in only if this process
+    # has no live session for it yet. Pair with release().
+    global keepalive_thread
+    sessions_lock.acquire()
+    try:
+        session = sessions.get(vcenter_key)
+        if not session:
+            session = sessions[vcenter_key] = Session(vcenter_key)
+        session.borrowers += 1
+        if not keepalive_thread:
+            keepalive_thread = threading.Thread(target=keepalive)
+            keepalive_thread.daemon = True
+            keepalive_thread.start()
+    finally:
+        sessions_lock.release()
+
+    try:
+        session.ensure_alive(settings.SESSION_KEEPALIVE_INTERVAL)
+    except Exception:
+        release(session.server)
+        raise
+    return session.server
+
+
+def release(server):
+    # The session stays logged in for the next borrower; all sessions are
+    # logged out when the process exits.
+    sessions_lock.acquire()
+    try:
+        for session in sessions.values():
+            if session.server is server and session.borrowers > 0:
+                session.borrowers -= 1
+    finally:
+        sessions_lock.release()
+
+
+@contextmanager
+def borrow(vcenter_key):
+    server = connect(vcenter_key)
+    try:
+        yield server
+    finally:
+        release(server)
+
+
+def keepalive():
+    while True:
+        time.sleep(settings.SESSION_KEEPALIVE_INTERVAL)
+        sessions_lock.acquire()
+        try:
+            active = sessions.values()
+        finally:
+            sessions_lock.release()
+        for session in active:
+            try:
+                session.ensure_alive(settings.SESSION_KEEPALIVE_INTERVAL)
+            except Exception:
+                # Retried on the next round or by the next connect().
+                pass
+
+
+def close_all():
+    sessions_lock.acquire()
+    try:
+        active = sessions.values()
+        sessions.clear()
+    finally:
+        sessions_lock.release()
+    for session in active:
+        session.logout()
+
+atexit.register(close_all)
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+
+# ==============================================================================
+# Name          :   vm_mgmt_spec.py
+#
+# Description   :   Composes the configuration changes of a VM (CD-ROM
+#                   backing, connection state and removal, network of the
+#                   NICs, annotation) into a single spec, applied either within the
+#                   CloneVM_Task that creates the VM or as one ReconfigVM_Task.
+#
+# Version       :   1.0.0
+#
+# Author        :   Santhoshkumar Settipalli
+#
+# Change log    :
+#   17-Oct-2026 :    Santhoshkumar Settipalli (santhosh.settipalli@gmail.com)
+#                    Initial version.
+#
+# ==============================================================================
+
+import copy
+import vm_mgmt_properties
+from pysphere.resources import VimService_services as VI
+
+
+def cdrom_backing(dev_type, value=""):
+    # dev_type is one of "ISO" (value: "[datastore] path"), "HOST DEVICE"
+    # (value: device name) or "CLIENT DEVICE".
+    if dev_type == "ISO":
+        backing = VI.ns0.VirtualCdromIsoBackingInfo_Def("iso").pyclass()
+        backing.set_element_fileName(value)
+    elif dev_type == "HOST DEVICE":
+        backing = VI.ns0.VirtualCdromAtapiBackingInfo_Def("host").pyclass()
+        backing.set_element_deviceName(value)
+    elif dev_type == "CLIENT DEVICE":
+        backing = VI.ns0.VirtualCdromRemoteAtapiBackingInfo_Def("client").pyclass()
+        backing.set_element_deviceName("")
+    else:
+        raise ValueError("unknown cd rom type %s" % dev_type)
+    return backing
+
+
+def connect_info(connected):
+    connectable = VI.ns0.VirtualDeviceConnectInfo_Def("connectable").pyclass()
+    connectable.set_element_connected(connected)
+    connectable.set_element_startConnected(connected)
+    connectable.set_element_allowGuestControl(True)
+    return connectable
+
+
+class ConfigSpec(object):
+    # Accumulates changes to the devices of a VM. Every edited device is
+    # sent once, with all of its changes, however many setters touched it.
+
+    def __init__(self, devices):
+        # 'devices' are (device type, VirtualDevice) pairs as found in
+        # config.hardware.device of the VM. They are copied before being
+        # edited, so the caller's (possibly shared) objects stay untouched.
+        self._devices = devices
+        self._edited = {}   # device key -> edited copy of the device
+        self._order = []
+        self._removed = {}  # device key -> device to be removed
+        self._annotation = None
+        self._memory_mb = None
+        self._cpus = None
+        self._change_version = None
+
+    def _edit(self, device):
+        key = device.get_element_key()
+        if key not in self._edited:
+            self._edited[key] = copy.deepcopy(device)
+            self._order.append(key)
+        return self._edited[key]
+
+    def _of_type(self, types):
+        return [device for dev_type, device in self._devices if dev_type in types]
+
+    def set_cdrom_backing(self, dev_type, value=""):
+        # Returns the number of CD-ROMs changed.
+        cdroms = self._of_type(["VirtualCdrom"])
+        for device in cdroms:
+            self._edit(device).set_element_backing(cdrom_backing(dev_type, value))
+        return len(cdroms)
+
+    def set_cdrom_connected(self, connected):
+        # Sets both 'connected' and 'startConnected'. Returns the number of
+        # CD-ROMs changed.
+        cdroms = self._of_type(["VirtualCdrom"])
+        for device in cdroms:
+            device = self._edit(device)
+            if getattr(device, "Connectable", None):
+                device.Connectable.set_element_connected(connected)
+                device.Connectable.set_element_startConnected(connected)
+            else:
+                device.set_element_connectable(connect_info(connected))
+        return len(cdroms)
+
+    def remove_cdroms(self):
+        # Removes the CD-ROMs (the VM has to be powered off). Returns the
+        # number of CD-ROMs removed.
+        cdroms = self._of_type(["VirtualCdrom"])
+        for device in cdroms:
+            self._removed[device.get_element_key()] = device
+        return len(cdroms)
+
+    def set_annotation(self, annotation):
+        self._annotation = annotation
+
+    def set_hardware(self, memory_mb=None, cpus=None):
+        # Memory (in MB) and number of vCPUs, when given.
+        self._memory_mb = memory_mb
+        self._cpus = cpus
+
+    def set_change_version(self, change_version):
+        # The config.changeVersion the VM must still have: vSphere fails the
+        # reconfiguration (ConcurrentAccess) if the VM was changed since.
+        self._change_version = change_version
+
+    def empty(self):
+        return (not self._order and not self._removed and self._annotation is None
+                and not self._memory_mb and not self._cpus)
+
+    def fill(self, spec):
+        # Writes the changes into a VirtualMachineConfigSpec.
+        dev_changes = []
+        for key in self._order:
+            if key in self._removed:
+                continue
+            dev_change = spec.new_deviceChange()
+            dev_change.set_element_device(self._edited[key])
+            dev_change.set_element_operation("edit")
+            dev_changes.append(dev_change)
+        for key in sorted(self._removed.keys()):
+            dev_change = spec.new_deviceChange()
+            dev_change.set_element_device(self._removed[key])
+            dev_change.set_element_operation("remove")
+            dev_changes.append(dev_change)
+        if dev_changes:
+            spec.set_element_deviceChange(dev_changes)
+        if self._annotation is not None:
+            spec.set_element_annotation(self._annotation)
+        if self._memory_mb:
+            spec.set_element_memoryMB(self._memory_mb)
+        if self._cpus:
+            spec.set_element_numCPUs(self._cpus)
+        if self._change_version:
+            spec.set_element_changeVersion(self._change_version)
+        return spec
+
+
+def for_vm(vm):
+    # A ConfigSpec for changes to a VIVirtualMachine (or to the clones of a
+    # template, whose devices keep the keys they have in the template).
+    return ConfigSpec([(dev._type, dev._obj) for dev in vm.properties.config.hardware.device])
+
+
+def for_vm_mor(s, vm_mor, types=None):
+    # A ConfigSpec for changes to the devices of 'types' (all if None) of a
+    # VM known by its moref. Only config.hardware.device is fetched, not the
+    # whole property tree of a VIVirtualMachine.
+    return ConfigSpec(vm_mgmt_properties.vm_devices(s, [vm_mor], types).get(vm_mor, []))
+
+
+def reconfigure(s, vm_mor, config):
+    # Applies the changes with one ReconfigVM_Task. Returns the task, or
+    # None when there is nothing to change.
+    if config.empty():
+        return None
+    request = VI.ReconfigVM_TaskRequestMsg()
+    _this = request.new__this(vm_mor)
+    _this.set_attribute_type(vm_mor.get_attribute_type())
+    request.set_element__this(_this)
+    request.set_element_spec(config.fill(request.new_spec()))
+    return s._proxy.ReconfigVM_Task(request)._returnval
+
+
+def clone(s, vm, name, config=None, snapshot=None, power_on=False, datastore=None,
+          host=None, pool=None):
+    # Starts a CloneVM_Task of the VIVirtualMachine into the same folder,
+    # with the changes of 'config' applied by the clone itself. With
+    # 'snapshot' (a snapshot name) the clone is a linked clone of it. The
+    # clone is stored on the 'datastore' moref, if given, instead of the
+    # datastore of the source VM, and registered on the 'host' and resource
+    # 'pool' morefs, if given, instead of those of the source VM. Returns the
+    # task.
+    request = VI.CloneVM_TaskRequestMsg()
+    _this = request.new__this(vm._mor)
+    _this.set_attribute_type(vm._mor.get_attribute_type())
+    request.set_element__this(_this)
+    folder_mor = vm.properties.parent._obj
+    folder = request.new_folder(folder_mor)
+    folder.set_attribute_type(folder_mor.get_attribute_type())
+    request.set_element_folder(folder)
+    request.set_element_name(name)
+
+    spec = request.new_spec()
+    location = spec.new_location()
+    if datastore:
+        ds = location.new_datastore(datastore)
+        ds.set_attribute_type(datastore.get_attribute_type())
+        location.set_element_datastore(ds)
+    if host:
+        host_el = location.new_host(host)
+        host_el.set_attribute_type(host.get_attribute_type())
+        location.set_element_host(host_el)
+    if pool:
+        pool_el = location.new_pool(pool)
+        pool_el.set_attribute_type(pool.get_attribute_type())
+        location.set_element_pool(pool_el)
+    if snapshot:
+        snapshot_mor = None
+        for sn in vm.get_snapshots():
+            if sn.get_name() == snapshot:
+                snapshot_mor = sn._mor
+                break
+        if not snapshot_mor:
+            raise Exception("couldn't find snapshot %s" % snapshot)
+        sn = spec.new_snapshot(snapshot_mor)
+        sn.set_attribute_type(snapshot_mor.get_attribute_type())
+        spec.set_element_snapshot(sn)
+        location.set_element_diskMoveType("createNewChildDiskBacking")
+    spec.set_element_location(location)
+    spec.set_element_powerOn(power_on)
+    spec.set_element_template(False)
+    if config and not config.empty():
+        spec.set_element_config(config.fill(spec.new_config()))
+    request.set_element_spec(spec)
+    return s._proxy.CloneVM_Task(request)._returnval
@@ -0,0 +1,334 @@
+#!/usr/bin/env python
+
+# ==============================================================================
+# Name          :   vm_mgmt_tasks.py
+#
+# Description   :   Tracks any number of vSphere tasks through a single
+#                   property collector. One background thread long-polls
+#                   WaitForUpdatesEx for all of them instead of every task
+#                   polling its own state with VITask.wait_for_state.
+#
+# Version       :   1.0.0
+#
+# Author        :   Santhoshkumar Settipalli
+#
+# Change log    :
+#   17-Oct-2026 :    Santhoshkumar Settipalli (santhosh.settipalli@gmail.com)
+#                    Initial version.
+#
+# ==============================================================================
+
+import time
+import threading
+import vm_mgmt_properties
+from pysphere import VIException, FaultTypes
+from pysphere.vi_task import VITask
+
+TASK_PROPERTIES = ["info.state", "info.error", "info.result"]
+
+# Faults of WaitForUpdatesEx meaning the collector went away with the session.
+SESSION_FAULTS = ["ManagedObjectNotFound", "NotAuthenticated"]
+
+# Trackers are shared by everybody using the same session.
+trackers = {}
+trackers_lock = threading.Lock()
+
+
+class TaskFuture(object):
+    # Offers the same methods as VITask so it can be used as a drop-in
+    # replacement, plus done() and an optional completion callback.
+
+    STATE_ERROR = VITask.STATE_ERROR
+    STATE_QUEUED = VITask.STATE_QUEUED
+    STATE_RUNNING = VITask.STATE_RUNNING
+    STATE_SUCCESS = VITask.STATE_SUCCESS
+
+    def __init__(self, mor, callback=None):
+        self._mor = mor
+        self._callback = callback
+        self._condition = threading.Condition()
+        self.state = None
+        self.error = None
+        self.result = None
+
+    def done(self):
+        return self.state in [self.STATE_SUCCESS, self.STATE_ERROR]
+
+    def get_state(self):
+        return self.state
+
+    def get_error_message(self):
+        return self.error
+
+    def get_result(self):
+        return self.result
+
+    def wait_for_state(self, states, check_interval=1, timeout=-1):
+        if not isinstance(states, list):
+            states = [states]
+        start_time = time.time()
+        self._condition.acquire()
+        try:
+            while self.state not in states:
+                if timeout > 0 and (time.time() - start_time) > timeout:
+                    raise VIException("Timed out waiting for task state.",
+                                      FaultTypes.TIME_OUT)
+                # A bounded wait keeps the caller responsive to Ctrl-C.
+                self._condition.wait(check_interval)
+            return self.state
+        finally:
+            self._condition.release()
+
+    def wait(self, timeout=-1):
+        return self.wait_for_state([self.STATE_SUCCESS, self.STATE_ERROR],
+                                   timeout=timeout)
+
+    def _update(self, values):
+        self._condition.acquire()
+        try:
+            if "info.state" in values:
+                self.state = values["info.state"]
+            if values.get("info.error") is not None:
+                error = values["info.error"]
+                self.error = getattr(error, "LocalizedMessage", None) or str(error)
+            if values.get("info.result") is not None:
+                self.result = values["info.result"]
+            finished = self.done()
+            self._condition.notifyAll()
+        finally:
+            self._condition.release()
+
+        if finished and self._callback:
+            try:
+                self._callback(self)
+            except Exception:
+                pass
+        return finished
+
+
+class TaskTracker(object):
+
+    def __init__(self, server, max_wait=30):
+        self._server = server
+        self._max_wait = max_wait
+        self._lock = threading.Lock()
+        self._collector = None
+        self._version = ""
+        self._thread = None
+        self._futures = {}      # task mor -> TaskFuture
+        self._filters = {}      # filter mor -> [filter mor, pending task mors]
+
+    def track(self, task_mor, callback=None):
+        return self.track_many([task_mor], callback)[0]
+
+    def track_many(self, task_mors, callback=None):
+        # Registers all the tasks with a single filter and returns one
+        # TaskFuture per task, in the same order.
+        futures = [TaskFuture(mor, callback) for mor in task_mors]
+        if not futures:
+            return futures
+
+        self._lock.acquire()
+        try:
+            self._ensure_collector()
+            self._add_filter(task_mors)
+            for future in futures:
+                self._futures[str(future._mor)] = future
+
+            if not self._thread:
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+        finally:
+            self._lock.release()
+        return futures
+
+    def close(self):
+        self._lock.acquire()
+        try:
+            if self._collector:
+                vm_mgmt_properties.destroy_property_collector(self._server, self._collector)
+                self._drop()
+        finally:
+            self._lock.release()
+
+    def reset(self):
+        # The session was logged in again: the collector and its filters died
+        # with the old one. The outstanding tasks are registered with a new
+        # collector the next time one is needed.
+        self._lock.acquire()
+        try:
+            self._drop()
+        finally:
+            self._lock.release()
+
+    def _drop(self):
+        # Called with the lock held.
+        self._collector = None
+        self._version = ""
+        self._filters = {}
+
+    def _ensure_collector(self):
+        # Called with the lock held. A new collector gets a filter for the
+        # outstanding tasks, whose filters were lost with the previous one.
+        if not self._collector:
+            self._collector = vm_mgmt_properties.create_property_collector(self._server)
+            self._version = ""
+            if self._futures:
+                self._add_filter([future._mor for future in self._futures.values()])
+        return self._collector
+
+    def _add_filter(self, task_mors):
+        # Called with the lock held.
+        filter_mor = vm_mgmt_properties.create_filter(self._server, self._collector,
+                                                      task_mors, "Task", TASK_PROPERTIES)
+        self._filters[str(filter_mor)] = [filter_mor, set([str(m) for m in task_mors])]
+
+    def _lost(self, collector, error):
+        # Whether 'collector' failed because it went away with the session.
+        # Returns True if a reset() has already replaced it.
+        self._lock.acquire()
+        try:
+            if collector is not self._collector:
+                return True
+            if [fault for fault in SESSION_FAULTS if fault in str(error)]:
+                self._drop()
+            return False
+        finally:
+            self._lock.release()
+
+    def _run(self):
+        while True:
+            self._lock.acquire()
+            try:
+                if not self._futures:
+                    # Nothing left to wait for. track() starts a new thread.
+                    self._thread = None
+                    return
+                try:
+                    collector = self._ensure_collector()
+                except Exception:
+                    collector = None
+                version = self._version
+            finally:
+                self._lock.release()
+
+            try:
+                if not collector:
+                    raise Exception("no property collector")
+                version, changes = vm_mgmt_properties.wait_for_updates(
+                    self._server, collector, version, self._max_wait)
+            except Exception as e:
+                if collector and self._lost(collector, e):
+                    # Waited on the collector of the old session.
+                    continue
+                # E.g. WaitForUpdatesEx is not supported by this server, or
+                # the session is being logged in again.
+                self._poll_all()
+                time.sleep(2)
+                continue
+
+            finished = []
+            self._lock.acquire()
+            try:
+                if collector is not self._collector:
+                    # reset() while waiting: the version belongs to the old collector.
+                    continue
+                self._version = version
+                for mor, kind, values in changes:
+                    future = self._futures.get(str(mor))
+                    if not future:
+                        continue
+                    if kind == "leave":
+                        values = {"info.state": TaskFuture.STATE_ERROR}
+                        future.error = "Task %s no longer exists." % str(mor)
+                    finished.append((future, values))
+            finally:
+                self._lock.release()
+
+            for future, values in finished:
+                if future._update(values):
+                    self._forget(str(future._mor))
+
+    def _forget(self, key):
+        # Drops a finished task and destroys its filter once all of the
+        # tasks registered with it have finished.
+        self._lock.acquire()
+        try:
+            self._futures.pop(key, None)
+            for filter_key, (filter_mor, pending) in self._filters.items():
+                pending.discard(key)
+                if not pending:
+                    del self._filters[filter_key]
+                    try:
+                        vm_mgmt_properties.destroy_filter(self._server, filter_mor)
+                    except Exception:
+                        pass
+        finally:
+            self._lock.release()
+
+    def _poll_all(self):
+        # Degrades to one RetrieveProperties call per outstanding task.
+        self._lock.acquire()
+        try:
+            futures = self._futures.values()
+        finally:
+            self._lock.release()
+        for future in futures:
+            task = VITask(future._mor, self._server)
+            try:
+                values = {"info.state": task.get_state()}
+                if values["info.state"] == TaskFuture.STATE_SUCCESS and task.get_result():
+                    values["info.result"] = task.get_result()._obj
+                future.error = task.get_error_message()
+            except Exception as e:
+                values = {"info.state": TaskFuture.STATE_ERROR}
+                future.error = "Failed to get the state of task %s: %s" % (str(future._mor), str(e))
+            if future._update(values):
+                self._forget(str(future._mor))
+
+
+def get_tracker(server):
+    trackers_lock.acquire()
+    try:
+        tracker = trackers.get(id(server))
+        if not tracker or tracker._server is not server:
+            tracker = TaskTracker(server)
+            trackers[id(server)] = tracker
+        return tracker
+    finally:
+        trackers_lock.release()
+
+
+def reset_tracker(server):
+    # Called after the server logged in again.
+    trackers_lock.acquire()
+    try:
+        tracker = trackers.get(id(server))
+    finally:
+        trackers_lock.release()
+    if tracker and tracker._server is server:
+        tracker.reset()
+
+
+def track_task(task_mor, server, callback=None):
+    # Drop-in replacement for VITask(task_mor, server). Falls back to VITask
+    # when the server cannot create property collectors or filters.
+    try:
+        return get_tracker(server).track(task_mor, callback)
+    except Exception:
+        return VITask(task_mor, server)
+
+
+def wait_for_task(task_mor, server, timeout=-1):
+    # Waits for the task to finish. Returns its result (if any) and raises an
+    # exception when the task failed.
+    task = track_task(task_mor, server)
+    status = task.wait_for_state([task.STATE_SUCCESS, task.STATE_ERROR], timeout=timeout)
+    if status == task.STATE_ERROR:
+        raise VIException(task.get_error_message(), FaultTypes.TASK_ERROR)
+    result = task.get_result()
+    if isinstance(task, VITask) and result is not None:
+        # VITask wraps the result in a VIProperty.
+        result = result._obj
+    return result
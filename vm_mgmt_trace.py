@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+
+# ==============================================================================
+# Name          :   vm_mgmt_trace.py
+#
+# Description   :   Per-phase timing of the scripts. A run (one call of the
+#                   main() of a script) is divided into named spans, and
+#                   every SOAP call made while a span is open is counted,
+#                   with its bytes and time, against that span and the spans
+#                   enclosing it. Work handed to vm_mgmt_workers threads is
+#                   counted against the span that handed it out. When the
+#                   run ends its spans are appended to TRACE_FILE as JSON
+#                   lines and exported as a Prometheus text file (for the
+#                   node exporter textfile collector), both in LOG_FOLDER.
+#
+# Version       :   1.0.0
+#
+# Author        :   Santhoshkumar Settipalli
+#
+# Change log    :
+#   17-Oct-2026 :    Santhoshkumar Settipalli (santhosh.settipalli@gmail.com)
+#                    Initial version.
+#
+# ==============================================================================
+
+import os
+import sys
+import json
+import time
+import fcntl
+import socket
+import settings
+import tempfile
+import threading
+from contextlib import contextmanager
+
+# The run in progress in this process, if any.
+current_run = None
+counters_lock = threading.Lock()
+local = threading.local()
+
+
+class Span(object):
+
+    def __init__(self, name, parent=None, attrs=None):
+        self.name = name
+        self.parent = parent
+        self.attrs = attrs or {}
+        self.start = time.time()
+        self.duration = None
+        self.calls = {}         # SOAP method -> count
+        self.soap_calls = 0
+        self.soap_seconds = 0.0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.error = None
+
+    def path(self):
+        # Names of the enclosing spans and this one, e.g. "vm-mgmt-create/clone".
+        names = []
+        span = self
+        while span:
+            names.append(span.name)
+            span = span.parent
+        return "/".join(reversed(names))
+
+    def to_dict(self):
+        return {"span": self.name, "path": self.path(), "attrs": self.attrs,
+                "start": round(self.start, 3), "duration": round(self.duration or 0, 3),
+                "soap_calls": self.soap_calls, "soap_seconds": round(self.soap_seconds, 3),
+                "bytes_sent": self.bytes_sent, "bytes_received": self.bytes_received,
+                "calls": self.calls, "error": self.error}
+
+
+class Run(object):
+
+    def __init__(self, script):
+        self.script = script
+        self.id = "%s-%s-%d-%d" % (script, socket.gethostname(), os.getpid(), int(time.time() * 1000))
+        self.root = Span(script)
+        self.spans = []         # Finished spans, root excluded.
+        self.exit_code = None
+        self.lock = threading.Lock()
+
+    def add(self, span):
+        self.lock.acquire()
+        try:
+            self.spans.append(span)
+        finally:
+            self.lock.release()
+
+
+def stack():
+    if not hasattr(local, "stack"):
+        local.stack = []
+    return local.stack
+
+
+def current():
+    # The innermost open span of this thread, else the span adopted from the
+    # thread that handed the work out, else the root of the run.
+    spans = stack()
+    if spans:
+        return spans[-1]
+    if getattr(local, "base", None) and local.base_run is current_run:
+        return local.base
+    return current_run and current_run.root
+
+
+def adopt(span):
+    # Counts the work of this (worker) thread against 'span' of another thread.
+    local.base = span
+    local.base_run = current_run
+
+
+@contextmanager
+def span(name, **attrs):
+    # with span("clone", vm=name): ... times the block as one phase of the run.
+    run = current_run
+    if not run:
+        yield None
+        return
+    s = Span(name, current(), attrs)
+    stack().append(s)
+    try:
+        yield s
+    except Exception as e:
+        s.error = str(e)
+        raise
+    finally:
+        stack().pop()
+        s.duration = time.time() - s.start
+        run.add(s)
+
+
+def record(name, start, **attrs):
+    # Adds a phase timed by the caller, from 'start' until now, to the run.
+    # For phases that are not a single block of code (e.g. a state of a VM
+    # that is probed from several threads). Its own SOAP calls are not counted.
+    run = current_run
+    if not run:
+        return
+    s = Span(name, current(), attrs)
+    s.start = start
+    s.duration = time.time() - start
+    run.add(s)
+
+
+def count(method, seconds, sent, received):
+    s = current()
+    if not s:
+        return
+    counters_lock.acquire()
+    try:
+        while s:
+            s.calls[method] = s.calls.get(method, 0) + 1
+            s.soap_calls += 1
+            s.soap_seconds += seconds
+            s.bytes_sent += sent
+            s.bytes_received += received
+            s = s.parent
+    finally:
+        counters_lock.release()
+
+
+def instrument():
+    # Counts every SOAP call made through a ZSI binding of pysphere. The
+    # binding class is patched, so it has to happen before VIServer.connect()
+    # for RetrieveServiceContent and Login to be counted, and holds for the
+    # bindings created by later connect() calls.
+    # (Looked up in __dict__: the ZSI Binding answers any unknown attribute.)
+    from pysphere.ZSI.client import Binding
+    if Binding.__dict__.get("_vm_mgmt_traced"):
+        return
+    send, send_data, receive = Binding.Send, Binding.SendSOAPData, Binding.Receive
+
+    def traced_send(binding, url, opname, obj, *args, **kw):
+        binding.local.trace = [getattr(obj.typecode, "pname", None) or opname, time.time(), 0]
+        return send(binding, url, opname, obj, *args, **kw)
+
+    def traced_send_data(binding, soapdata, *args, **kw):
+        trace = getattr(binding.local, "trace", None)
+        if trace:
+            trace[2] = len(soapdata)
+        return send_data(binding, soapdata, *args, **kw)
+
+    def traced_receive(binding, *args, **kw):
+        try:
+            return receive(binding, *args, **kw)
+        finally:
+            trace = getattr(binding.local, "trace", None)
+            if trace:
+                binding.local.trace = None
+                count(str(trace[0]), time.time() - trace[1], trace[2], len(getattr(binding.local, "data", None) or ""))
+
+    Binding.Send = traced_send
+    Binding.SendSOAPData = traced_send_data
+    Binding.Receive = traced_receive
+    Binding._vm_mgmt_traced = True
+
+
+def start_run(script):
+    global current_run
+    run = Run(script)
+    run.previous = current_run
+    current_run = run
+    local.stack = []
+    return run
+
+
+def finish_run(run, exit_code=0):
+    global current_run
+    run.root.duration = time.time() - run.root.start
+    run.exit_code = exit_code
+    current_run = run.previous
+    if settings.TRACE_ENABLED:
+        try:
+            write_jsonl(run)
+            write_prometheus(run)
+        except (IOError, OSError) as e:
+            print >>sys.stderr, "Could not write the trace of %s: %s" % (run.script, str(e))
+
+
+def traced_run(script):
+    # Decorator for the main() of a script: every call is one run, reported
+    # however it ends (return, sys.exit() or exception).
+    def decorate(func):
+        def wrapper(*args, **kwargs):
+            run = start_run(script)
+            exit_code = 0
+            try:
+                return func(*args, **kwargs)
+            except SystemExit as e:
+                exit_code = e.code or 0
+                raise
+            except Exception as e:
+                exit_code = 1
+                run.root.error = str(e)
+                raise
+            finally:
+                finish_run(run, exit_code)
+        return wrapper
+    return decorate
+
+
+def log_path(name):
+    return os.path.join(settings.LOG_FOLDER, name)
+
+
+def write_jsonl(run):
+    # One line for the run, then one per span, appended under a lock so runs
+    # of concurrent processes do not interleave.
+    lines = []
+    root = run.root.to_dict()
+    root.update({"kind": "run", "run": run.id, "script": run.script, "exit_code": run.exit_code})
+    lines.append(json.dumps(root, sort_keys=True))
+    for s in sorted(run.spans, key=lambda s: s.start):
+        record = s.to_dict()
+        record.update({"kind": "span", "run": run.id, "script": run.script})
+        lines.append(json.dumps(record, sort_keys=True))
+
+    path = log_path(settings.TRACE_FILE)
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            f.write("\n".join(lines) + "\n")
+            f.flush()
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def write_prometheus(run):
+    # Gauges of the last run of the script. Spans of the same name (e.g. one
+    # per VM of a fleet) are added up. The file is replaced atomically.
+    script = label(run.script)
+    by_name = {}
+    for s in run.spans:
+        total = by_name.setdefault(s.name, [0, 0.0, 0, 0, 0, 0])
+        total[0] += 1
+        total[1] += s.duration
+        total[2] += s.soap_calls
+        total[3] += s.bytes_sent
+        total[4] += s.bytes_received
+        total[5] += s.error and 1 or 0
+
+    metrics = [
+        ("vm_mgmt_run_duration_seconds", "Wall time of the last run.",
+         [("", run.root.duration)]),
+        ("vm_mgmt_run_exit_code", "Exit code of the last run.",
+         [("", isinstance(run.exit_code, int) and run.exit_code or (run.exit_code and 1 or 0))]),
+        ("vm_mgmt_run_timestamp_seconds", "Time the last run ended.",
+         [("", run.root.start + run.root.duration)]),
+        ("vm_mgmt_run_soap_calls", "SOAP calls of the last run.",
+         [("", run.root.soap_calls)]),
+        ("vm_mgmt_run_soap_bytes", "SOAP bytes of the last run.",
+         [(',direction="sent"', run.root.bytes_sent), (',direction="received"', run.root.bytes_received)]),
+        ("vm_mgmt_soap_method_calls", "SOAP calls of the last run per method.",
+         [(',method="%s"' % label(m), n) for m, n in sorted(run.root.calls.items())]),
+        ("vm_mgmt_span_count", "Spans of the last run per name.",
+         [(',span="%s"' % label(n), t[0]) for n, t in sorted(by_name.items())]),
+        ("vm_mgmt_span_duration_seconds", "Time spent in the spans of the last run per name.",
+         [(',span="%s"' % label(n), t[1]) for n, t in sorted(by_name.items())]),
+        ("vm_mgmt_span_soap_calls", "SOAP calls made in the spans of the last run per name.",
+         [(',span="%s"' % label(n), t[2]) for n, t in sorted(by_name.items())]),
+        ("vm_mgmt_span_soap_bytes", "SOAP bytes of the spans of the last run per name.",
+         [(',span="%s",direction="sent"' % label(n), t[3]) for n, t in sorted(by_name.items())] +
+         [(',span="%s",direction="received"' % label(n), t[4]) for n, t in sorted(by_name.items())]),
+        ("vm_mgmt_span_errors", "Spans of the last run per name that raised an exception.",
+         [(',span="%s"' % label(n), t[5]) for n, t in sorted(by_name.items())]),
+    ]
+    lines = []
+    for name, help_text, samples in metrics:
+        lines.append("# HELP %s %s" % (name, help_text))
+        lines.append("# TYPE %s gauge" % name)
+        for labels, value in samples:
+            lines.append('%s{script="%s"%s} %s' % (name, script, labels, repr(float(value))))
+
+    path = log_path(settings.TRACE_PROMETHEUS_FILE % {"script": run.script})
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        os.write(fd, "\n".join(lines) + "\n")
+    finally:
+        os.close(fd)
+    os.chmod(tmp_path, 0644)
+    os.rename(tmp_path, path)
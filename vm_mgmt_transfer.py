@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+
+# ==============================================================================
+# Name          :   vm_mgmt_transfer.py
+#
+# Description   :   Content addressed file uploads to guests. Local files are
+#                   identified by their sha256 digest and a small manifest in
+#                   the guest records the digest of every file uploaded to it,
+#                   so identical content is never sent twice. Files are
+#                   streamed in chunks, and the number of concurrent uploads
+#                   and their combined bandwidth are capped for the process.
+#
+# Version       :   1.0.0
+#
+# Author        :   Santhoshkumar Settipalli
+#
+# Change log    :
+#   17-Oct-2026 :    Santhoshkumar Settipalli (santhosh.settipalli@gmail.com)
+#                    Initial version.
+#
+# ==============================================================================
+
+import os
+import time
+import hashlib
+import httplib
+import logging
+import urllib2
+import settings
+import threading
+import vm_mgmt_log
+from urlparse import urlparse
+from pysphere.resources import VimService_services as VI
+
+# (path, size, mtime) -> sha256 hex digest
+digests = {}
+digests_lock = threading.Lock()
+
+
+class RateLimiter(object):
+    # Token bucket shared by all uploads of the process. A rate of 0 means
+    # unlimited.
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._next = time.time()
+
+    def consume(self, size):
+        if not self.rate:
+            return
+        self._lock.acquire()
+        try:
+            now = time.time()
+            start = max(now, self._next)
+            self._next = start + float(size) / self.rate
+        finally:
+            self._lock.release()
+        if start > now:
+            time.sleep(start - now)
+
+limiter = RateLimiter(settings.TRANSFER_BANDWIDTH)
+upload_slots = threading.BoundedSemaphore(settings.TRANSFER_WORKERS)
+
+
+def file_digest(path):
+    # sha256 of the file, computed once per version of the file.
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_size, st.st_mtime)
+    digests_lock.acquire()
+    try:
+        if key in digests:
+            return digests[key]
+    finally:
+        digests_lock.release()
+
+    sha = hashlib.sha256()
+    fd = open(path, "rb")
+    try:
+        while True:
+            chunk = fd.read(settings.TRANSFER_CHUNK_SIZE)
+            if not chunk:
+                break
+            sha.update(chunk)
+    finally:
+        fd.close()
+
+    digests_lock.acquire()
+    try:
+        digests[key] = sha.hexdigest()
+    finally:
+        digests_lock.release()
+    return digests[key]
+
+
+def transfer_url(guest_vm, url):
+    # The URLs of the guest file manager use '*' for the host it is reached on.
+    return url.replace("*", urlparse(guest_vm._server._proxy.binding.url).hostname)
+
+
+def initiate_upload(guest_vm, guest_path, size):
+    # Returns the URL the content of the file has to be PUT to.
+    if not guest_vm._file_mgr or not guest_vm._auth_obj:
+        raise Exception("login_in_guest() is required before uploading files")
+    request = VI.InitiateFileTransferToGuestRequestMsg()
+    _this = request.new__this(guest_vm._file_mgr)
+    _this.set_attribute_type(guest_vm._file_mgr.get_attribute_type())
+    request.set_element__this(_this)
+    vm = request.new_vm(guest_vm._mor)
+    vm.set_attribute_type(guest_vm._mor.get_attribute_type())
+    request.set_element_vm(vm)
+    request.set_element_auth(guest_vm._auth_obj)
+    request.set_element_guestFilePath(guest_path)
+    request.set_element_overwrite(True)
+    request.set_element_fileSize(size)
+    request.set_element_fileAttributes(request.new_fileAttributes())
+    return transfer_url(guest_vm, guest_vm._server._proxy.InitiateFileTransferToGuest(request)._returnval)
+
+
+def put(url, fd, size):
+    # Streams 'size' bytes of 'fd' in chunks, within the bandwidth limit.
+    parts = urlparse(url)
+    if parts.scheme == "https":
+        conn = httplib.HTTPSConnection(parts.netloc)
+    else:
+        conn = httplib.HTTPConnection(parts.netloc)
+    try:
+        conn.putrequest("PUT", parts.path + (parts.query and "?" + parts.query))
+        conn.putheader("Content-Type", "application/octet-stream")
+        conn.putheader("Content-Length", str(size))
+        conn.endheaders()
+        while True:
+            chunk = fd.read(settings.TRANSFER_CHUNK_SIZE)
+            if not chunk:
+                break
+            limiter.consume(len(chunk))
+            conn.send(chunk)
+        response = conn.getresponse()
+        response.read()
+        if response.status != 200:
+            raise Exception("upload failed: HTTP %d %s" % (response.status, response.reason))
+    finally:
+        conn.close()
+
+
+def read_manifest(guest_vm):
+    # {guest path: sha256} of the files uploaded to the guest. Empty when the
+    # guest has no manifest yet. Any other failure is raised: an empty
+    # manifest would be written back over the digests of the other files.
+    request = VI.InitiateFileTransferFromGuestRequestMsg()
+    _this = request.new__this(guest_vm._file_mgr)
+    _this.set_attribute_type(guest_vm._file_mgr.get_attribute_type())
+    request.set_element__this(_this)
+    vm = request.new_vm(guest_vm._mor)
+    vm.set_attribute_type(guest_vm._mor.get_attribute_type())
+    request.set_element_vm(vm)
+    request.set_element_auth(guest_vm._auth_obj)
+    request.set_element_guestFilePath(settings.GUEST_TRANSFER_MANIFEST)
+    try:
+        url = guest_vm._server._proxy.InitiateFileTransferFromGuest(request)._returnval.Url
+    except Exception as e:
+        if "FileNotFound" in str(e):
+            return {}
+        raise
+    content = urllib2.urlopen(transfer_url(guest_vm, url)).read()
+    manifest = {}
+    for line in content.splitlines():
+        fields = line.split(" ", 1)
+        if len(fields) == 2:
+            manifest[fields[1]] = fields[0]
+    return manifest
+
+
+def write_manifest(guest_vm, manifest):
+    content = "".join(["%s %s\n" % (digest, path) for path, digest in sorted(manifest.items())])
+    url = initiate_upload(guest_vm, settings.GUEST_TRANSFER_MANIFEST, len(content))
+    request = urllib2.Request(url, data=content)
+    request.get_method = lambda: "PUT"
+    urllib2.urlopen(request).read()
+
+
+def has_file(guest_vm, guest_path, size):
+    try:
+        return [f for f in guest_vm.list_files(guest_path) if f["size"] == size] != []
+    except Exception:
+        return False
+
+
+def exists(guest_vm, guest_path):
+    try:
+        return guest_vm.list_files(guest_path) != []
+    except Exception:
+        return False
+
+
+def upload_files(guest_vm, files, keep_existing=False):
+    # Uploads the (local path, guest path) pairs the guest does not hold
+    # already. The guest must be logged in (login_in_guest()). Returns the
+    # guest paths that were uploaded; the others were up to date. With
+    # 'keep_existing' a file the manifest does not know of (e.g. put there
+    # before the manifest existed) is left alone if the guest has it.
+    manifest = read_manifest(guest_vm)
+    uploaded = []
+    try:
+        for local_path, guest_path in files:
+            size = os.path.getsize(local_path)
+            digest = file_digest(local_path)
+            if guest_path in manifest:
+                if manifest[guest_path] == digest and has_file(guest_vm, guest_path, size):
+                    continue
+            elif keep_existing and exists(guest_vm, guest_path):
+                continue
+            upload_slots.acquire()
+            try:
+                fd = open(local_path, "rb")
+                try:
+                    put(initiate_upload(guest_vm, guest_path, size), fd, size)
+                finally:
+                    fd.close()
+            finally:
+                upload_slots.release()
+            manifest[guest_path] = digest
+            uploaded.append(guest_path)
+    finally:
+        if uploaded:
+            # The files are in place; a manifest that could not be updated
+            # only means they are uploaded again next time.
+            try:
+                write_manifest(guest_vm, manifest)
+            except Exception as e:
+                logging.getLogger(vm_mgmt_log.LOGGER_NAME).warning(
+                    "Could not update %s in the guest: %s" % (settings.GUEST_TRANSFER_MANIFEST, str(e)))
+    return uploaded
+
+
+def upload_file(guest_vm, local_path, guest_path, keep_existing=False):
+    # Returns True if the file was uploaded, False if the guest had it.
+    return upload_files(guest_vm, [(local_path, guest_path)], keep_existing) != []
+
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+# ==============================================================================
+# Name          :   vm_mgmt_workers.py
+#
+# Description   :   A bounded pool of worker threads used to run the same
+#                   operation against many VMs at once, and a reader for the
+#                   manifest files that list those VMs.
+#
+# Version       :   1.0.0
+#
+# Author        :   Santhoshkumar Settipalli
+#
+# Change log    :
+#   17-Oct-2026 :    Santhoshkumar Settipalli (santhosh.settipalli@gmail.com)
+#                    Initial version.
+#
+# ==============================================================================
+
+import Queue
+import threading
+import vm_mgmt_trace
+
+
+def read_manifest(path):
+    # Returns the whitespace separated fields of every line in the manifest.
+    # Empty lines and lines starting with '#' are ignored.
+    entries = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            entries.append(line.split())
+    return entries
+
+
+def run_in_pool(func, items, workers=8):
+    # Calls func(item) for every item using at most 'workers' threads.
+    # Returns a list of (item, result, exception) tuples in the order of
+    # 'items'; exception is None when func returned normally.
+    results = [None] * len(items)
+    pending = Queue.Queue()
+    for index, item in enumerate(items):
+        pending.put((index, item))
+    span = vm_mgmt_trace.current()
+
+    def worker():
+        vm_mgmt_trace.adopt(span)
+        while True:
+            try:
+                index, item = pending.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                results[index] = (item, func(item), None)
+            except (Exception, SystemExit) as e:
+                # sys.exit() in a worker must not silently kill the thread.
+                results[index] = (item, None, e)
+
+    threads = []
+    for i in range(max(1, min(workers, len(items)))):
+        t = threading.Thread(target=worker)
+        t.daemon = True
+        t.start()
+        threads.append(t)
+
+    for t in threads:
+        # join() with a timeout keeps the main thread responsive to Ctrl-C.
+        while t.is_alive():
+            t.join(1)
+
+    return results
+
+
+class WorkerPool(object):
+    # Long-lived counterpart of run_in_pool() for callers that keep handing
+    # out work: submit() queues func(item) and collect() returns the
+    # (item, result, exception) tuples of the calls finished since the last
+    # collect(). on_finished(), if given, is called by the worker after
+    # every call, e.g. to wake up the thread that collects.
+
+    def __init__(self, workers=8, on_finished=None):
+        self._pending = Queue.Queue()
+        self._finished = Queue.Queue()
+        self._on_finished = on_finished
+        self._threads = []
+        for i in range(max(1, workers)):
+            t = threading.Thread(target=self._run)
+            t.daemon = True
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, func, item):
+        self._pending.put((func, item, vm_mgmt_trace.current()))
+
+    def collect(self):
+        finished = []
+        while True:
+            try:
+                finished.append(self._finished.get_nowait())
+            except Queue.Empty:
+                return finished
+
+    def shutdown(self):
+        # Workers exit once the calls queued so far have run.
+        for t in self._threads:
+            self._pending.put(None)
+
+    def _run(self):
+        while True:
+            job = self._pending.get()
+            if job is None:
+                return
+            func, item, span = job
+            vm_mgmt_trace.adopt(span)
+            try:
+                self._finished.put((item, func(item), None))
+            except (Exception, SystemExit) as e:
+                self._finished.put((item, None, e))
+            if self._on_finished:
+                self._on_finished()